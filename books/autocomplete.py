@@ -0,0 +1,99 @@
+import hashlib
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.urls import reverse
+
+from .models import Book
+
+
+def _display(row, field, language):
+    # Tanlangan tildagi qiymat, bo'sh bo'lsa o'zbekchasi
+    return row[f'{field}_{language}'] or row[f'{field}_uz'] or row[f'{field}_ru'] or ''
+
+
+def _rank(label, needle):
+    label = label.lower()
+    # Avval boshidan mos kelganlar, keyin so'z boshidan, keyin qisqaroqlari
+    return (
+        not label.startswith(needle),
+        not any(word.startswith(needle) for word in label.split()),
+        len(label),
+    )
+
+
+def _candidates(field, query):
+    # pg_trgm GIN indekslari ILIKE '%q%' ni tezlashtiradi; saralashsiz LIMIT esa
+    # juda umumiy prefikslarda (masalan, "ki") ham so'rov narxini cheklaydi
+    return (
+        Book.objects
+        .filter(Q(**{f'{field}_uz__icontains': query}) | Q(**{f'{field}_ru__icontains': query}))
+        .order_by()
+        .values('slug', f'{field}_uz', f'{field}_ru')[:settings.AUTOCOMPLETE_CANDIDATES]
+    )
+
+
+def _rank_titles(rows, query, language, limit):
+    needle = query.lower()
+    books = sorted(
+        ((_display(row, 'title', language), row['slug']) for row in rows),
+        key=lambda book: _rank(book[0], needle),
+    )
+    return [
+        {'title': title, 'url': reverse('books:book_detail', args=[slug])}
+        for title, slug in books[:limit]
+    ]
+
+
+def _rank_authors(rows, query, language, limit):
+    needle = query.lower()
+    # Bir muallifning ko'p kitobi bo'lsa ham bitta taklif chiqadi
+    counts = Counter(_display(row, 'author', language) for row in rows)
+    authors = sorted(counts, key=lambda author: (_rank(author, needle), -counts[author]))
+    return authors[:limit]
+
+
+def title_suggestions(query, language, limit):
+    return _rank_titles(_candidates('title', query), query, language, limit)
+
+
+def author_suggestions(query, language, limit):
+    return _rank_authors(_candidates('author', query), query, language, limit)
+
+
+def _normalize(query, language, limit):
+    limit = limit or settings.AUTOCOMPLETE_LIMIT
+    if language not in settings.MODELTRANSLATION_LANGUAGES:
+        language = settings.MODELTRANSLATION_DEFAULT_LANGUAGE
+    query = ' '.join(query.split())
+    digest = hashlib.md5(query.lower().encode('utf-8')).hexdigest()
+    return query, language, limit, f'autocomplete:{language}:{limit}:{digest}'
+
+
+def get_suggestions(query, language, limit=None):
+    query, language, limit, key = _normalize(query, language, limit)
+    suggestions = cache.get(key)
+    if suggestions is None:
+        suggestions = {
+            'titles': title_suggestions(query, language, limit),
+            'authors': author_suggestions(query, language, limit),
+        }
+        cache.set(key, suggestions, settings.AUTOCOMPLETE_CACHE_TIMEOUT)
+    return suggestions
+
+
+async def aget_suggestions(query, language, limit=None):
+    # ASGI yo'li uchun: kesh va ORM so'rovlari event loop'ni bloklamaydi
+    query, language, limit, key = _normalize(query, language, limit)
+    suggestions = await cache.aget(key)
+    if suggestions is None:
+        titles = [row async for row in _candidates('title', query)]
+        authors = [row async for row in _candidates('author', query)]
+        suggestions = {
+            'titles': _rank_titles(titles, query, language, limit),
+            'authors': _rank_authors(authors, query, language, limit),
+        }
+        await cache.aset(key, suggestions, settings.AUTOCOMPLETE_CACHE_TIMEOUT)
+    return suggestions
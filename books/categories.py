@@ -0,0 +1,58 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import translation
+
+from .models import Category
+
+CACHE_KEY = 'books:category_index:{language}'
+
+
+def catalog_language(language=None):
+    language = (language or translation.get_language() or '').split('-')[0]
+    if language not in settings.MODELTRANSLATION_LANGUAGES:
+        language = settings.MODELTRANSLATION_DEFAULT_LANGUAGE
+    return language
+
+
+def build_category_index():
+    categories = [
+        {'id': category.pk, 'name': category.name, 'slug': category.slug, 'book_count': category.book_count}
+        for category in Category.objects.annotate(book_count=Count('books')).order_by('pk')
+    ]
+    return {
+        'categories': categories,
+        'total': sum(c['book_count'] for c in categories),
+        # Sidebar o'zgargan vaqt: ro'yxat sahifalarining ETag/Last-Modified qismi
+        'version': time.time_ns(),
+    }
+
+
+def _cache_timeout():
+    # invalidate_category_index faqat o'z jarayonining LocMem ini tozalaydi: umumiy kesh
+    # bo'lmasa boshqa ishchilardagi sonlar LOCAL_CACHE_MAX_AGE dan ortiq eskirmaydi
+    if settings.CACHE_IS_SHARED:
+        return settings.CATEGORY_INDEX_CACHE_TIMEOUT
+    return settings.LOCAL_CACHE_MAX_AGE
+
+
+def get_category_index(language=None):
+    # Nomlar tarjima qilinadi, shuning uchun har bir til alohida keshlanadi
+    language = catalog_language(language)
+    key = CACHE_KEY.format(language=language)
+    index = cache.get(key)
+    if index is None:
+        with translation.override(language):
+            index = build_category_index()
+        cache.set(key, index, _cache_timeout())
+    return index
+
+
+def find_category(slug, language=None):
+    return next((c for c in get_category_index(language)['categories'] if c['slug'] == slug), None)
+
+
+def invalidate_category_index():
+    cache.delete_many([CACHE_KEY.format(language=language) for language in settings.MODELTRANSLATION_LANGUAGES])
@@ -0,0 +1,43 @@
+import hashlib
+
+from django.contrib import messages
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(request, *parts):
+    # Sahifada foydalanuvchi menyusi va CSRF meta tegi bor, ular ham ETag ga kiradi
+    user = request.user.pk if request.user.is_authenticated else None
+    state = (parts, user, request.META.get('CSRF_COOKIE'))
+    return quote_etag(hashlib.md5(repr(state).encode('utf-8')).hexdigest())
+
+
+def not_modified(request, etag, last_modified=None):
+    # django.views.decorators.http.condition bilan bir xil, lekin holat view ichida
+    # (fragment keshidan) olinadi: 304 da shablon ham, so'rovlar ham ishlamaydi
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    # Navbatdagi flash xabarlar sahifada ko'rsatilishi kerak
+    if list(messages.get_messages(request)):
+        return None
+    if request.user.is_authenticated:
+        last_modified = None
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified) if last_modified is not None else None,
+    )
+
+
+def set_validators(request, response, etag, last_modified=None):
+    if request.method not in ('GET', 'HEAD'):
+        return response
+    response.headers.setdefault('ETag', etag)
+    # Login/logout vaqtni o'zgartirmaydi: shaxsiy sahifalar faqat ETag bilan tekshiriladi
+    if last_modified is not None and not request.user.is_authenticated:
+        response.headers.setdefault('Last-Modified', http_date(int(last_modified)))
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
@@ -0,0 +1,12 @@
+from django.utils.functional import SimpleLazyObject
+
+from .categories import get_category_index
+
+
+def category_index(request):
+    # Kesh faqat shablon kategoriyalarga murojaat qilganda o'qiladi
+    index = SimpleLazyObject(get_category_index)
+    return {
+        'categories': SimpleLazyObject(lambda: index['categories']),
+        'total_books': SimpleLazyObject(lambda: index['total']),
+    }
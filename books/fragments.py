@@ -0,0 +1,119 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .categories import catalog_language
+
+VERSION_KEY = 'books:catalog_version'
+CATEGORY_VERSION_KEY = 'books:catalog_version:category:{category_id}'
+BOOK_VERSION_KEY = 'books:catalog_version:book:{book_id}'
+STATS_KEY = 'books:fragments:stats:{kind}:{outcome}'
+KINDS = ('book_list', 'book_detail')
+
+
+def _version_key(category_id=None):
+    return VERSION_KEY if category_id is None else CATEGORY_VERSION_KEY.format(category_id=category_id)
+
+
+def _version_timeout():
+    # Jarayon ichidagi keshda boshqa ishchining bump'i ko'rinmaydi: versiya tez eskiradi
+    return None if settings.CACHE_IS_SHARED else settings.LOCAL_CACHE_MAX_AGE
+
+
+def _version(key):
+    # Versiya — oxirgi o'zgarish vaqti (ns): Last-Modified sifatida ham ishlatiladi
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        # add: parallel so'rovlar bir-birining versiyasini almashtirib yubormaydi
+        if not cache.add(key, version, _version_timeout()):
+            version = cache.get(key, version)
+    return version
+
+
+def catalog_version(category_id=None):
+    return _version(_version_key(category_id))
+
+
+def book_version(book_id):
+    # Bitta kitob sahifasi uchun: boshqa kitoblarning tahriri unga ta'sir qilmaydi
+    return _version(BOOK_VERSION_KEY.format(book_id=book_id))
+
+
+def bump_catalog_version(category_ids=(), book_ids=()):
+    # Versiya kalitning bir qismi: eski fragmentlar o'qilmay qoladi va muddati tugab o'chadi
+    from .models import Book
+
+    category_ids = set(category_ids)
+    if book_ids:
+        category_ids.update(Book.objects.filter(pk__in=book_ids).values_list('category_id', flat=True))
+    keys = [_version_key(category_id) for category_id in {None, *category_ids}]
+    keys += [BOOK_VERSION_KEY.format(book_id=book_id) for book_id in book_ids]
+    cache.set_many(dict.fromkeys(keys, time.time_ns()), _version_timeout())
+
+
+def bump_category_versions(category_ids):
+    # Kitob sahifalarida kategoriya nomi bor: ularning versiyasi ham yangilanadi
+    from .models import Book
+
+    book_ids = list(Book.objects.filter(category_id__in=category_ids).values_list('pk', flat=True))
+    bump_catalog_version(category_ids=category_ids, book_ids=book_ids)
+
+
+def bump_book_versions(book_ids):
+    # Faqat kitob sahifalari (masalan, tavsiyalar): ro'yxat sahifalari o'zgarmaydi
+    cache.set_many(
+        {BOOK_VERSION_KEY.format(book_id=book_id): time.time_ns() for book_id in book_ids},
+        _version_timeout(),
+    )
+
+
+def fragment_key(kind, *parts, version=None):
+    if version is None:
+        version = catalog_version()
+    digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+    return f'books:fragment:{kind}:{catalog_language()}:{version}:{digest}'
+
+
+def _count(kind, outcome):
+    key = STATS_KEY.format(kind=kind, outcome=outcome)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Kalit add va incr orasida chiqarib yuborilgan
+        cache.set(key, 1, None)
+
+
+def get_fragment(kind, key, is_current=None):
+    # Fragmentlar faqat umumiy keshda: LocMem da bekor qilish boshqa ishchilarga yetib bormaydi
+    if not settings.CACHE_IS_SHARED:
+        return None
+    fragment = cache.get(key)
+    if fragment is not None and is_current is not None and not is_current(fragment):
+        fragment = None
+    _count(kind, 'miss' if fragment is None else 'hit')
+    return fragment
+
+
+def set_fragment(key, fragment):
+    if not settings.CACHE_IS_SHARED:
+        return
+    cache.set(key, fragment, settings.CATALOG_FRAGMENT_CACHE_TIMEOUT)
+
+
+def fragment_stats():
+    values = cache.get_many([STATS_KEY.format(kind=kind, outcome=outcome) for kind in KINDS for outcome in ('hit', 'miss')])
+    stats = {}
+    for kind in KINDS:
+        hits = values.get(STATS_KEY.format(kind=kind, outcome='hit'), 0)
+        misses = values.get(STATS_KEY.format(kind=kind, outcome='miss'), 0)
+        total = hits + misses
+        stats[kind] = {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+    return stats
+
+
+def reset_fragment_stats():
+    cache.delete_many([STATS_KEY.format(kind=kind, outcome=outcome) for kind in KINDS for outcome in ('hit', 'miss')])
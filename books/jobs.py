@@ -0,0 +1,89 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .categories import invalidate_category_index
+from .fragments import bump_catalog_version, bump_category_versions
+from .models import Book, Category, TranslationJob
+from .translator import source_hash
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempts):
+    delay = settings.TRANSLATION_JOB_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.TRANSLATION_JOB_MAX_RETRY_DELAY))
+
+
+def claim_jobs(limit):
+    now = timezone.now()
+    # Ishchi yiqilib qolgan bo'lsa, uzoq "running" holatidagi vazifalar qayta olinadi
+    stale = now - timedelta(seconds=settings.TRANSLATION_JOB_TIMEOUT)
+    with transaction.atomic():
+        jobs = list(
+            TranslationJob.objects
+            .select_for_update(skip_locked=True)
+            .select_related('content_type')
+            .filter(
+                Q(status=TranslationJob.PENDING, run_after__lte=now) |
+                Q(status=TranslationJob.RUNNING, updated_at__lt=stale)
+            )
+            .order_by('run_after', 'id')[:limit]
+        )
+        TranslationJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=TranslationJob.RUNNING, updated_at=now
+        )
+    return jobs
+
+
+def invalidate_translated(model, pks):
+    # update()/bulk_update signal yubormaydi: keshlangan fragmentlar va sidebar shu yerda eskiradi
+    if model is Book:
+        bump_catalog_version(book_ids=pks)
+    elif model is Category:
+        bump_category_versions(pks)
+        # Sidebar da faqat kategoriya nomlari bor
+        invalidate_category_index()
+
+
+def process_job(job, translator):
+    model = job.content_type.model_class()
+    source_field = f'{job.field}_uz'
+    target_field = f'{job.field}_ru'
+
+    source = model.objects.filter(pk=job.object_id).values_list(source_field, flat=True).first()
+    if source is None or source_hash(source) != job.source_hash:
+        # Obyekt o'chirilgan yoki matn o'zgargan: yangi vazifa allaqachon navbatda
+        job.status = TranslationJob.DONE
+        job.save(update_fields=['status', 'updated_at'])
+        return False
+
+    try:
+        translated = translator.translate(source, src='uz', dest='ru')
+    except Exception as e:
+        job.attempts += 1
+        job.last_error = str(e)
+        if job.attempts >= settings.TRANSLATION_JOB_MAX_ATTEMPTS:
+            job.status = TranslationJob.FAILED
+            logger.error("Translation job %s failed: %s", job.pk, e)
+        else:
+            job.status = TranslationJob.PENDING
+            job.run_after = timezone.now() + retry_delay(job.attempts)
+        job.save(update_fields=['status', 'attempts', 'last_error', 'run_after', 'updated_at'])
+        return False
+
+    values = {target_field: translated}
+    if any(f.name == 'updated_at' for f in model._meta.concrete_fields):
+        values['updated_at'] = timezone.now()
+    # Manba matni tarjima davomida o'zgarmagan bo'lsagina yozamiz
+    if model.objects.filter(pk=job.object_id, **{source_field: source}).update(**values):
+        invalidate_translated(model, [job.object_id])
+
+    job.status = TranslationJob.DONE
+    job.last_error = ''
+    job.save(update_fields=['status', 'last_error', 'updated_at'])
+    return True
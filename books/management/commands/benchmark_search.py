@@ -0,0 +1,112 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from books.models import Book, Category
+from books.search import search_books
+
+UZ_SYLLABLES = (
+    "ki", "tob", "ta", "rix", "ro", "man", "hi", "ko", "ya", "sev", "gi", "va", "tan",
+    "yul", "duz", "dar", "yo", "sha", "har", "qish", "loq", "do'st", "sir", "o'g", "il",
+)
+RU_SYLLABLES = (
+    "кни", "га", "ис", "то", "ри", "я", "ро", "ман", "рас", "сказ", "лю", "бовь", "вой",
+    "на", "ро", "ди", "зве", "зда", "ре", "ка", "го", "род", "дру", "тай", "до",
+)
+AUTHORS = (
+    "Abdulla Qodiriy", "Cho'lpon", "Erkin Vohidov", "Abdulla Oripov", "O'tkir Hoshimov",
+    "Said Ahmad", "Tohir Malik", "Xudoyberdi To'xtaboyev", "Pirimqul Qodirov", "Oybek",
+)
+
+
+def make_vocabulary(rng, syllables, size):
+    vocabulary = set()
+    while len(vocabulary) < size:
+        vocabulary.add(''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(vocabulary)
+
+
+def words(rng, vocabulary, count):
+    return ' '.join(rng.choice(vocabulary) for _ in range(count))
+
+
+def percentile(samples, pct):
+    return statistics.quantiles(samples, n=100)[pct - 1] * 1000
+
+
+class Command(BaseCommand):
+    help = "Compares icontains search with the full-text search engine on a synthetic catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--page-size', type=int, default=12)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help='Commit the synthetic catalog instead of rolling back')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        uz_words = make_vocabulary(rng, UZ_SYLLABLES, 5000)
+        ru_words = make_vocabulary(rng, RU_SYLLABLES, 5000)
+        with transaction.atomic():
+            self.populate(rng, options['books'], uz_words, ru_words)
+            vocabulary = uz_words + ru_words + [author.split()[0] for author in AUTHORS]
+            terms = [rng.choice(vocabulary) for _ in range(options['queries'])]
+            size = options['page_size']
+
+            def icontains(term):
+                queryset = Book.objects.filter(
+                    Q(title__icontains=term) | Q(author__icontains=term) | Q(description__icontains=term)
+                ).order_by('-created_at')
+                return queryset.count(), list(queryset[:size])
+
+            def full_text(term):
+                queryset = search_books(Book.objects.all(), term)
+                return queryset.count(), list(queryset[:size])
+
+            for name, run in (('icontains', icontains), ('full-text', full_text)):
+                run(terms[0])  # isitish
+                samples = []
+                for term in terms:
+                    started = time.perf_counter()
+                    run(term)
+                    samples.append(time.perf_counter() - started)
+                self.stdout.write(
+                    f"{name:>10}: p50 {percentile(samples, 50):.1f} ms, p95 {percentile(samples, 95):.1f} ms"
+                )
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+    def populate(self, rng, count, uz_words, ru_words):
+        categories = Category.objects.bulk_create([
+            Category(name_uz=f'Bench {i}', name_ru=f'Бенч {i}', slug=f'bench-category-{i}')
+            for i in range(20)
+        ])
+        batch = []
+        for i in range(count):
+            batch.append(Book(
+                title_uz=words(rng, uz_words, 3).capitalize(),
+                title_ru=words(rng, ru_words, 3).capitalize(),
+                author_uz=rng.choice(AUTHORS),
+                author_ru=rng.choice(AUTHORS),
+                description_uz=words(rng, uz_words, 60),
+                description_ru=words(rng, ru_words, 60),
+                category=rng.choice(categories),
+                price=rng.randint(10, 200) * 1000,
+                cover_type=rng.choice(('hard', 'soft')),
+                pages=rng.randint(50, 900),
+                image='books/bench.jpg',
+                slug=f'bench-book-{i}',
+            ))
+            if len(batch) == 5000:
+                Book.objects.bulk_create(batch)
+                batch = []
+        Book.objects.bulk_create(batch)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE books_book')
+        self.stdout.write(f"{count} ta sintetik kitob yaratildi")
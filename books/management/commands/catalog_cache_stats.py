@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from books.fragments import fragment_stats, reset_fragment_stats
+
+
+class Command(BaseCommand):
+    help = "Shows hit ratios of the catalog fragment cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them')
+
+    def handle(self, *args, **options):
+        if not settings.CACHE_IS_SHARED:
+            # LocMem da hisoblagichlar har bir jarayonda alohida: bu buyruq ularni ko'rmaydi
+            raise CommandError("Fragment keshi va hisoblagichlar uchun umumiy kesh kerak (REDIS_URL)")
+        for kind, stats in fragment_stats().items():
+            self.stdout.write(
+                f"{kind:>12}: {stats['hits']} hit, {stats['misses']} miss, hit ratio {stats['hit_ratio']:.1%}"
+            )
+        if options['reset']:
+            reset_fragment_stats()
+            self.stdout.write(self.style.SUCCESS('Hisoblagichlar tozalandi'))
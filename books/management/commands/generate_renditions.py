@@ -0,0 +1,46 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from books.models import Book, BookImage
+from books.renditions import delete_renditions, missing_sources, render_image, save_renditions
+
+
+class Command(BaseCommand):
+    help = "Backfills WebP/JPEG renditions for existing book images in a process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--chunk-size', type=int, default=200, help='Images per database write')
+        parser.add_argument('--force', action='store_true', help='Regenerate images that already have renditions')
+
+    def handle(self, *args, **options):
+        sources = list(dict.fromkeys(
+            name
+            for model in (Book, BookImage)
+            for name in model.objects.exclude(image='').values_list('image', flat=True).iterator()
+        ))
+        if options['force']:
+            delete_renditions(sources)
+        else:
+            sources = missing_sources(sources)
+
+        started = time.monotonic()
+        # Bolalar jarayonlari bazaga tegmaydi; ulanishlar fork dan oldin yopiladi
+        connections.close_all()
+        rows, done = [], 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for result in pool.map(render_image, sources, chunksize=8):
+                rows.extend(result)
+                done += 1
+                if done % options['chunk_size'] == 0:
+                    save_renditions(rows)
+                    rows = []
+                    self.stdout.write(f"{done}/{len(sources)}")
+        save_renditions(rows)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(sources)} ta rasm uchun nusxalar yaratildi ({time.monotonic() - started:.1f} s)"
+        ))
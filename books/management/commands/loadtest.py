@@ -0,0 +1,137 @@
+import asyncio
+import statistics
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = ('/', '/autocomplete/?q=kit', '/orders/cart/count/')
+
+
+def percentile(samples, pct):
+    return statistics.quantiles(samples, n=100)[pct - 1] * 1000
+
+
+async def read_response(reader):
+    # HTTP/1.1 javobi: Content-Length yoki chunked tana, keep-alive saqlanadi
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Ulanish yopildi')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+class Client:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def get(self, path):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        request = f'GET {path} HTTP/1.1\r\nHost: {self.host}\r\nConnection: keep-alive\r\n\r\n'
+        self.writer.write(request.encode('latin-1'))
+        await self.writer.drain()
+        status, keep_alive = await read_response(self.reader)
+        if not keep_alive:
+            await self.close()
+        return status
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a keep-alive HTTP load test against one or more running servers and compares "
+        "throughput and latency. Example, WSGI vs ASGI with the same number of workers:\n"
+        "  gunicorn root.wsgi -w 4 -b :8001\n"
+        "  uvicorn root.asgi:application --workers 4 --port 8002\n"
+        "  manage.py loadtest --target wsgi=http://127.0.0.1:8001 --target asgi=http://127.0.0.1:8002\n"
+        "Under ASGI every in-flight request holds its own database connection: without PgBouncer "
+        "keep uvicorn --limit-concurrency times --workers below PostgreSQL max_connections. "
+        "Only non-5xx responses count towards throughput and latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, help='NAME=URL, repeatable')
+        parser.add_argument('--path', action='append', help=f"Repeatable, default: {', '.join(DEFAULT_PATHS)}")
+        parser.add_argument('--concurrency', type=int, default=500)
+        parser.add_argument('--duration', type=float, default=30, help='Seconds per target')
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            name, sep, url = target.partition('=')
+            parts = urlsplit(url)
+            if not sep or parts.scheme != 'http' or not parts.hostname:
+                raise CommandError(f"--target NAME=http://host:port ko'rinishida bo'lishi kerak: {target}")
+            targets.append((name, parts.hostname, parts.port or 80))
+        paths = options['path'] or DEFAULT_PATHS
+
+        for name, host, port in targets:
+            result = asyncio.run(self.run(host, port, paths, options['concurrency'], options['duration']))
+            self.report(name, *result)
+
+    async def run(self, host, port, paths, concurrency, duration):
+        # Xato turi bo'yicha: ulanish uzilishi, server rad etishi va 5xx javoblar alohida
+        samples, errors = [], Counter()
+        deadline = time.monotonic() + duration
+
+        async def worker(offset):
+            client = Client(host, port)
+            i = offset
+            while time.monotonic() < deadline:
+                path = paths[i % len(paths)]
+                i += 1
+                started = time.perf_counter()
+                try:
+                    status = await client.get(path)
+                except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+                    errors[type(e).__name__] += 1
+                    await client.close()
+                    continue
+                # Tez qaytgan 503 (masalan, uvicorn --limit-concurrency) o'tkazuvchanlikka kirmaydi
+                if status >= 500:
+                    errors[f'HTTP {status}'] += 1
+                else:
+                    samples.append(time.perf_counter() - started)
+            await client.close()
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        return samples, errors, time.monotonic() - started
+
+    def report(self, name, samples, errors, elapsed):
+        details = ', '.join(f'{kind}: {count}' for kind, count in errors.most_common())
+        summary = f"xatolar: {errors.total()}" + (f" ({details})" if details else '')
+        if len(samples) < 2:
+            self.stdout.write(self.style.ERROR(f"{name}: javoblar yetarli emas, {summary}"))
+            return
+        self.stdout.write(
+            f"{name:>8}: {len(samples) / elapsed:.1f} so'rov/s, p50 {percentile(samples, 50):.1f} ms, "
+            f"p95 {percentile(samples, 95):.1f} ms, p99 {percentile(samples, 99):.1f} ms, {summary}"
+        )
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from books.translation_memory import memory
+
+
+class Command(BaseCommand):
+    help = 'Deletes translation memory entries that have not been used recently'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.TRANSLATION_MEMORY_MAX_AGE_DAYS)
+
+    def handle(self, *args, **options):
+        deleted = memory.prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"{deleted} ta eskirgan tarjima o'chirildi"))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from books.models import Book
+from books.recommendations import refresh_related
+
+
+class Command(BaseCommand):
+    help = "Recomputes precomputed related books for the whole catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        ids = list(Book.objects.order_by('pk').values_list('pk', flat=True))
+        size = options['chunk_size']
+        for i in range(0, len(ids), size):
+            refresh_related(ids[i:i + size])
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(ids)} ta kitob uchun tavsiyalar yangilandi ({time.monotonic() - started:.1f} s)"
+        ))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from books.recommendations import process_refreshes
+
+
+class Command(BaseCommand):
+    help = 'Recomputes related books for books queued by saves and orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        # Kutish davomida bir kitobga tushgan takroriy so'rovlar bitta hisobga birlashadi
+        parser.add_argument('--poll-interval', type=float, default=5.0)
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+
+    def handle(self, *args, **options):
+        refreshed = 0
+        while True:
+            count = process_refreshes(options['batch_size'])
+            if not count:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+            refreshed += count
+            self.stdout.write(f'{count} ta kitob tavsiyalari yangilandi')
+        self.stdout.write(self.style.SUCCESS(f'Jami: {refreshed}'))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from books.renditions import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Generates WebP/JPEG renditions for images queued by book and gallery uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--poll-interval', type=float, default=5.0)
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            count = process_pending(options['batch_size'])
+            if not count:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+            processed += count
+            self.stdout.write(f'{count} ta rasm ishlandi')
+        self.stdout.write(self.style.SUCCESS(f'Jami: {processed}'))
@@ -0,0 +1,52 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from books.jobs import claim_jobs, process_job
+from books.translation_memory import memory
+from books.translator import get_translator
+
+_local = threading.local()
+
+
+def _run_job(job):
+    # Har bir ishchi oqim o'z tarjimon klienti va DB ulanishiga ega
+    if not hasattr(_local, 'translator'):
+        _local.translator = get_translator()
+    close_old_connections()
+    try:
+        return process_job(job, _local.translator)
+    finally:
+        # close_old_connections doimiy ulanishni yopmaydi; oqim ulanishi ochiq qolmasin
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Processes queued uz → ru translation jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--poll-interval', type=float, default=2.0)
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+
+    def handle(self, *args, **options):
+        translated = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                jobs = claim_jobs(options['batch_size'])
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                translated += sum(pool.map(_run_job, jobs))
+                self.stdout.write(f'{len(jobs)} ta vazifa bajarildi')
+        self.stdout.write(self.style.SUCCESS(f'Tarjima qilindi: {translated}'))
+        self.stdout.write(
+            'Tarjima xotirasi: {lru_hits} LRU, {db_hits} DB, {misses} miss'.format(**memory.stats)
+            + f' (hit ratio {memory.hit_ratio():.0%})'
+        )
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_initial'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='Object ID')),
+                ('field', models.CharField(max_length=50, verbose_name='Field')),
+                ('source_hash', models.CharField(max_length=64, verbose_name='Source hash')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Attempts')),
+                ('last_error', models.TextField(blank=True, verbose_name='Last error')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Run after')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype', verbose_name='Model')),
+            ],
+            options={
+                'verbose_name': 'Translation job',
+                'verbose_name_plural': 'Translation jobs',
+                'indexes': [models.Index(fields=['status', 'run_after'], name='books_trans_status_23a5a6_idx'), models.Index(fields=['content_type', 'object_id', 'field'], name='books_trans_content_401a4b_idx')],
+            },
+        ),
+    ]
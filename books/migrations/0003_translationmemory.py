@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_translationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationMemory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('src', models.CharField(max_length=10, verbose_name='Source language')),
+                ('dest', models.CharField(max_length=10, verbose_name='Target language')),
+                ('source_hash', models.CharField(max_length=64, verbose_name='Source hash')),
+                ('source_text', models.TextField(verbose_name='Source text')),
+                ('translated_text', models.TextField(verbose_name='Translated text')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Last used at')),
+            ],
+            options={
+                'verbose_name': 'Translation memory',
+                'verbose_name_plural': 'Translation memory',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='translationmemory',
+            constraint=models.UniqueConstraint(fields=('src', 'dest', 'source_hash'), name='unique_translation_memory'),
+        ),
+    ]
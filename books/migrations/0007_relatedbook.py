@@ -0,0 +1,34 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_book_book_created_id_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedBook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Score')),
+                ('co_purchases', models.PositiveIntegerField(default=0, verbose_name='Bought together')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='books.book', verbose_name='Book')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_in', to='books.book', verbose_name='Related book')),
+            ],
+            options={
+                'verbose_name': 'Related book',
+                'verbose_name_plural': 'Related books',
+                'indexes': [models.Index(fields=['book', '-score'], name='related_book_score_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedbook',
+            constraint=models.UniqueConstraint(fields=('book', 'related'), name='unique_related_book'),
+        ),
+    ]
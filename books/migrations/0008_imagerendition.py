@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_relatedbook'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, verbose_name='Source image')),
+                ('size', models.CharField(max_length=20, verbose_name='Size')),
+                ('format', models.CharField(max_length=10, verbose_name='Format')),
+                ('width', models.PositiveIntegerField(verbose_name='Width')),
+                ('height', models.PositiveIntegerField(verbose_name='Height')),
+                ('file', models.ImageField(max_length=255, upload_to='renditions/', verbose_name='File')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+            ],
+            options={
+                'verbose_name': 'Image rendition',
+                'verbose_name_plural': 'Image renditions',
+                'indexes': [models.Index(fields=['source'], name='image_rendition_source_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='imagerendition',
+            constraint=models.UniqueConstraint(fields=('source', 'size', 'format', 'width'), name='unique_image_rendition'),
+        ),
+    ]
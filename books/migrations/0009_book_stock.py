@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_imagerendition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Stock'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_book_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedBooksRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.PositiveBigIntegerField(db_index=True, verbose_name='Book ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+            ],
+            options={
+                'verbose_name': 'Related books refresh',
+                'verbose_name_plural': 'Related books refreshes',
+            },
+        ),
+    ]
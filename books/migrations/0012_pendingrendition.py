@@ -0,0 +1,25 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_category_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, verbose_name='Source image')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+            ],
+            options={
+                'verbose_name': 'Pending rendition',
+                'verbose_name_plural': 'Pending renditions',
+            },
+        ),
+    ]
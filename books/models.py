@@ -1,12 +1,20 @@
-from django.db import models
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import models, transaction
+from django.db.models.functions import Upper
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from googletrans import Translator
+
+from .translator import source_hash
 
 class Category(models.Model):
     name = models.CharField(_('Name'), max_length=200)
     slug = models.SlugField(_('Slug'), unique=True, max_length=200)
+    # Kitob sahifasida kategoriya nomi bor: uning Last-Modified/ETag iga kiradi
+    updated_at = models.DateTimeField(_('Updated at'), auto_now=True)
     
     class Meta:
         verbose_name = _('Category')
@@ -28,18 +36,61 @@ class Book(models.Model):
     cover_type = models.CharField(_('Cover type'), max_length=4, choices=COVER_CHOICES)
     pages = models.PositiveIntegerField(_('Number of pages'))
     image = models.ImageField(_('Book image'), upload_to='books/')
+    # Bo'sh — zaxira hisoblanmaydi (cheklovsiz sotiladi); orders.inventory orqali kamayadi
+    stock = models.PositiveIntegerField(_('Stock'), null=True, blank=True)
     created_at = models.DateTimeField(_('Created at'), auto_now_add=True)
     updated_at = models.DateTimeField(_('Updated at'), auto_now=True)
     slug = models.SlugField(_('Slug'), unique=True, max_length=200)
+    # To'liq matnli qidiruv: sarlavha > muallif > tavsif, uz va ru ustunlari
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('title_uz', config='simple', weight='A')
+            + SearchVector('title_ru', config='russian', weight='A')
+            + SearchVector('author_uz', 'author_ru', config='simple', weight='B')
+            + SearchVector('description_uz', config='simple', weight='C')
+            + SearchVector('description_ru', config='russian', weight='C')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     class Meta:
         verbose_name = _('Book')
         verbose_name_plural = _('Books')
         ordering = ['-created_at']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='book_search_vector_gin'),
+            # Autocomplete: icontains → UPPER(...) LIKE, pg_trgm bilan indekslanadi
+            GinIndex(OpClass(Upper('title_uz'), name='gin_trgm_ops'), name='book_title_uz_trgm'),
+            GinIndex(OpClass(Upper('title_ru'), name='gin_trgm_ops'), name='book_title_ru_trgm'),
+            GinIndex(OpClass(Upper('author_uz'), name='gin_trgm_ops'), name='book_author_uz_trgm'),
+            GinIndex(OpClass(Upper('author_ru'), name='gin_trgm_ops'), name='book_author_ru_trgm'),
+            # Keyset sahifalash: (created_at, id) kamayish tartibi va kategoriya bo'yicha
+            models.Index(fields=['-created_at', '-id'], name='book_created_id_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='book_category_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Kategoriya almashsa eski kategoriya sahifalari ham yangilanishi kerak
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        # Muallif almashsa tavsiyalar ham qayta hisoblanadi
+        instance._loaded_author_uz = instance.__dict__.get('author_uz')
+        # Rasm almashgandagina nusxalar navbatga qo'yiladi
+        instance._loaded_image = instance.__dict__.get('image')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # post_save signallari eski qiymatni ko'rib bo'ldi
+        self._loaded_category_id = self.category_id
+        self._loaded_author_uz = self.author_uz
+        self._loaded_image = self.image.name
+
 class BookImage(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='images', verbose_name=_('Book'))
     image = models.ImageField(_('Additional image'), upload_to='books/images/')
@@ -52,6 +103,16 @@ class BookImage(models.Model):
     def __str__(self):
         return f"Image for {self.book}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_image = instance.__dict__.get('image')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_image = self.image.name
+
 class BookVideo(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='videos', verbose_name=_('Book'))
     url = models.URLField(_('YouTube URL'), blank=True, null=True)
@@ -64,27 +125,282 @@ class BookVideo(models.Model):
     def __str__(self):
         return f"Video for {self.book}"
 
-@receiver(pre_save, sender=Book)
-def translate_book_fields(sender, instance, **kwargs):
-    try:
-        old = Book.objects.get(pk=instance.pk)
-    except Book.DoesNotExist:
-        old = None
+class ImageRendition(models.Model):
+    source = models.CharField(_('Source image'), max_length=255)
+    size = models.CharField(_('Size'), max_length=20)
+    format = models.CharField(_('Format'), max_length=10)
+    width = models.PositiveIntegerField(_('Width'))
+    height = models.PositiveIntegerField(_('Height'))
+    file = models.ImageField(_('File'), upload_to='renditions/', max_length=255)
+    created_at = models.DateTimeField(_('Created at'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Image rendition')
+        verbose_name_plural = _('Image renditions')
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'size', 'format', 'width'], name='unique_image_rendition'),
+        ]
+        indexes = [
+            models.Index(fields=['source'], name='image_rendition_source_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.source} ({self.size}, {self.format}, {self.width}w)"
+
+class PendingRendition(models.Model):
+    # Nusxalari yaratilishi kerak bo'lgan rasmlar navbati (rendition_worker bajaradi)
+    source = models.CharField(_('Source image'), max_length=255)
+    created_at = models.DateTimeField(_('Created at'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Pending rendition')
+        verbose_name_plural = _('Pending renditions')
+
+    def __str__(self):
+        return self.source
+
+class TranslationJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, _('Pending')),
+        (RUNNING, _('Running')),
+        (DONE, _('Done')),
+        (FAILED, _('Failed')),
+    ]
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, verbose_name=_('Model'))
+    object_id = models.PositiveBigIntegerField(_('Object ID'))
+    field = models.CharField(_('Field'), max_length=50)
+    source_hash = models.CharField(_('Source hash'), max_length=64)
+    status = models.CharField(_('Status'), max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(_('Attempts'), default=0)
+    last_error = models.TextField(_('Last error'), blank=True)
+    run_after = models.DateTimeField(_('Run after'), default=timezone.now)
+    created_at = models.DateTimeField(_('Created at'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('Updated at'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Translation job')
+        verbose_name_plural = _('Translation jobs')
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['content_type', 'object_id', 'field']),
+        ]
+
+    def __str__(self):
+        return f"{self.content_type.model}#{self.object_id}.{self.field}"
+
+
+class TranslationMemory(models.Model):
+    src = models.CharField(_('Source language'), max_length=10)
+    dest = models.CharField(_('Target language'), max_length=10)
+    source_hash = models.CharField(_('Source hash'), max_length=64)
+    source_text = models.TextField(_('Source text'))
+    translated_text = models.TextField(_('Translated text'))
+    created_at = models.DateTimeField(_('Created at'), auto_now_add=True)
+    last_used_at = models.DateTimeField(_('Last used at'), default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = _('Translation memory')
+        verbose_name_plural = _('Translation memory')
+        constraints = [
+            models.UniqueConstraint(fields=['src', 'dest', 'source_hash'], name='unique_translation_memory'),
+        ]
+
+    def __str__(self):
+        return f"{self.src} → {self.dest}: {self.source_text[:50]}"
+
+
+class RelatedBook(models.Model):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='related_entries', verbose_name=_('Book'))
+    related = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='recommended_in', verbose_name=_('Related book'))
+    score = models.FloatField(_('Score'))
+    co_purchases = models.PositiveIntegerField(_('Bought together'), default=0)
+    updated_at = models.DateTimeField(_('Updated at'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Related book')
+        verbose_name_plural = _('Related books')
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'related'], name='unique_related_book'),
+        ]
+        indexes = [
+            models.Index(fields=['book', '-score'], name='related_book_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book} → {self.related}"
+
+
+class RelatedBooksRefresh(models.Model):
+    # Tavsiyalari qayta hisoblanadigan kitoblar navbati (related_books_worker bajaradi).
+    # Tashqi kalit emas: yozuv kitob qatoriga qulf qo'ymaydi, o'chirilgan kitob shunchaki o'tkaziladi
+    book_id = models.PositiveBigIntegerField(_('Book ID'), db_index=True)
+    created_at = models.DateTimeField(_('Created at'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Related books refresh')
+        verbose_name_plural = _('Related books refreshes')
+
+    def __str__(self):
+        return f"#{self.book_id}"
+
+
+# uz → ru avtomatik tarjima qilinadigan maydonlar
+TRANSLATED_FIELDS = {
+    Book: ('title', 'description', 'author'),
+    Category: ('name',),
+}
 
-    translator = Translator()
 
-    if old is None or (instance.title != old.title and instance.title_ru == old.title_ru):
-        instance.title_ru = translator.translate(instance.title, src='uz', dest='ru').text
+def fields_to_translate(instance):
+    fields = TRANSLATED_FIELDS[type(instance)]
+    old = None
+    if instance.pk:
+        columns = [f'{field}_{lang}' for field in fields for lang in ('uz', 'ru')]
+        old = type(instance).objects.filter(pk=instance.pk).values(*columns).first()
 
-    if old is None or (instance.description != old.description and instance.description_ru == old.description_ru):
-        instance.description_ru = translator.translate(instance.description, src='uz', dest='ru').text
+    pending = []
+    for field in fields:
+        source = getattr(instance, f'{field}_uz')
+        translated = getattr(instance, f'{field}_ru')
+        if not source:
+            continue
+        if old is None:
+            # Yangi obyekt: ruscha qo'lda kiritilmagan bo'lsa tarjima qilamiz
+            if not translated:
+                pending.append(field)
+        elif source != old[f'{field}_uz'] and translated == old[f'{field}_ru']:
+            pending.append(field)
+    return pending
 
-    if old is None or (instance.author != old.author and instance.author_ru == old.author_ru):
-        instance.author_ru = translator.translate(instance.author, src='uz', dest='ru').text
 
+def enqueue_translations(instance, fields):
+    content_type = ContentType.objects.get_for_model(instance)
+    # Eskirgan navbatdagi vazifalar o'rniga yangisini qo'yamiz
+    TranslationJob.objects.filter(
+        content_type=content_type,
+        object_id=instance.pk,
+        field__in=fields,
+        status=TranslationJob.PENDING,
+    ).delete()
+    TranslationJob.objects.bulk_create([
+        TranslationJob(
+            content_type=content_type,
+            object_id=instance.pk,
+            field=field,
+            source_hash=source_hash(getattr(instance, f'{field}_uz')),
+        )
+        for field in fields
+    ])
 
+
+@receiver(pre_save, sender=Book)
 @receiver(pre_save, sender=Category)
-def translate_category_fields(sender, instance, **kwargs):
-    translator = Translator()
-    if old is None or (instance.title != old.name and instance.name_ru == old.name_ru):
-        instance.name_ru = translator.translate(instance.title, src='uz', dest='ru').text
\ No newline at end of file
+def collect_translation_fields(sender, instance, raw=False, **kwargs):
+    instance._translation_fields = [] if raw else fields_to_translate(instance)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Category)
+def enqueue_translation_jobs(sender, instance, raw=False, **kwargs):
+    fields = getattr(instance, '_translation_fields', None)
+    if not raw and fields:
+        enqueue_translations(instance, fields)
+        instance._translation_fields = []
+
+
+@receiver(post_save, sender=Book)
+def refresh_book_recommendations(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    from .recommendations import peer_candidates, schedule_refresh
+
+    # Kitobning o'zi va uni tavsiya qilayotgan kitoblar navbatga qo'yiladi (related_books_worker)
+    book_ids = [instance.pk, *RelatedBook.objects.filter(related=instance).values_list('book_id', flat=True)]
+    moved = (
+        instance.category_id != getattr(instance, '_loaded_category_id', instance.category_id)
+        or instance.author_uz != getattr(instance, '_loaded_author_uz', instance.author_uz)
+    )
+    if created or moved:
+        # Yangi yoki ko'chirilgan kitob kategoriya/muallif bo'yicha qo'shnilarining nomzodiga aylanadi
+        book_ids += peer_candidates(instance)
+    schedule_refresh(book_ids)
+
+
+@receiver(post_save, sender='orders.OrderItem')
+def refresh_copurchase_recommendations(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .recommendations import schedule_refresh
+
+    # Buyurtmadagi barcha kitoblarning "birga sotib olingan" hisoblari o'zgaradi
+    schedule_refresh(type(instance).objects.filter(order_id=instance.order_id).values_list('book_id', flat=True))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def refresh_category_index(sender, instance, created=False, **kwargs):
+    from .categories import invalidate_category_index
+
+    # Kitob tahriri sonlarni o'zgartirmaydi: faqat yangi, o'chirilgan yoki ko'chirilgan kitob
+    if (
+        sender is Book and kwargs['signal'] is post_save and not created
+        and instance.category_id == getattr(instance, '_loaded_category_id', instance.category_id)
+    ):
+        return
+    # Commitdan keyin: parallel so'rov eski sonlarni qayta keshlab qo'ymasligi uchun
+    transaction.on_commit(invalidate_category_index)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=BookImage)
+@receiver(post_delete, sender=BookImage)
+@receiver(post_save, sender=BookVideo)
+@receiver(post_delete, sender=BookVideo)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def refresh_catalog_fragments(sender, instance, **kwargs):
+    from .fragments import bump_catalog_version, bump_category_versions
+
+    if sender is Category:
+        transaction.on_commit(lambda: bump_category_versions([instance.pk]))
+        return
+    if sender is Book:
+        changes = {
+            'category_ids': {instance.category_id, getattr(instance, '_loaded_category_id', None)} - {None},
+            'book_ids': [instance.pk],
+        }
+    else:
+        changes = {'book_ids': [instance.book_id]}
+    transaction.on_commit(lambda: bump_catalog_version(**changes))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=BookImage)
+def enqueue_image_renditions(sender, instance, created=False, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    if not created and instance.image.name == getattr(instance, '_loaded_image', None):
+        return
+    from .renditions import enqueue_renditions
+
+    # So'rov ichida Pillow ishlamaydi: yozuv tranzaksiya bilan commit bo'ladi, rendition_worker chizadi
+    enqueue_renditions([instance.image.name])
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=BookImage)
+def delete_image_renditions(sender, instance, **kwargs):
+    if not instance.image:
+        return
+    from .renditions import delete_renditions
+
+    name = instance.image.name
+    transaction.on_commit(lambda: delete_renditions([name]))
@@ -0,0 +1,121 @@
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db import DatabaseError
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+CURSOR_SALT = 'books.pagination.cursor'
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    # (created_at, id) bo'yicha kamayish tartibida keyset sahifalash.
+    # OFFSET ham, COUNT(*) ham yo'q: har bir sahifa narxi faqat sahifa hajmiga bog'liq
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    @staticmethod
+    def encode(obj, direction):
+        return signing.dumps([obj.created_at.isoformat(), obj.pk, direction], salt=CURSOR_SALT)
+
+    @staticmethod
+    def decode(cursor):
+        try:
+            created_at, pk, direction = signing.loads(cursor, salt=CURSOR_SALT)
+            return datetime.fromisoformat(created_at), int(pk), direction
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+
+    def page(self, cursor=None):
+        position = self.decode(cursor) if cursor else None
+        if position is None:
+            rows = list(self.queryset.order_by('-created_at', '-id')[:self.per_page + 1])
+            return self._page(rows, has_more=len(rows) > self.per_page, has_previous=False)
+
+        created_at, pk, direction = position
+        if direction == 'prev':
+            # Orqaga: o'sish tartibida o'qib, natijani teskari aylantiramiz
+            rows = list(
+                self.queryset
+                .filter(created_at__gte=created_at)
+                .filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+                .order_by('created_at', 'id')[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return self._page(rows, has_more=True, has_previous=has_previous)
+
+        # created_at__lte indeks bo'yicha diapazonni boshidan cheklaydi
+        rows = list(
+            self.queryset
+            .filter(created_at__lte=created_at)
+            .filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+            .order_by('-created_at', '-id')[:self.per_page + 1]
+        )
+        return self._page(rows, has_more=len(rows) > self.per_page, has_previous=True)
+
+    def _page(self, rows, has_more, has_previous):
+        rows = rows[:self.per_page]
+        next_cursor = self.encode(rows[-1], 'next') if rows and has_more else None
+        previous_cursor = self.encode(rows[0], 'prev') if rows and has_previous else None
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+
+class CursorPaginationMixin:
+    # ListView uchun: ?cursor= berilganda OFFSET o'rniga keyset sahifalash
+    cursor_kwarg = 'cursor'
+
+    def use_cursor_pagination(self):
+        return self.cursor_kwarg in self.request.GET
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        page = CursorPaginator(queryset, page_size).page(self.request.GET.get(self.cursor_kwarg))
+        return None, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cursor_pagination'] = self.use_cursor_pagination()
+        return context
+
+
+class ApproximateCountPaginator(Paginator):
+    # Katta natijalarda COUNT(*) o'rniga rejalashtiruvchi (EXPLAIN) bahosi.
+    # Baho APPROXIMATE_COUNT_THRESHOLD dan kichik bo'lsa aniq sanaladi
+    @cached_property
+    def count(self):
+        try:
+            plan = self.object_list.order_by().explain(format='json')
+            estimate = int(json.loads(plan)[0]['Plan']['Plan Rows'])
+        except (AttributeError, DatabaseError, KeyError, TypeError, ValueError):
+            return super().count
+        if estimate < settings.APPROXIMATE_COUNT_THRESHOLD:
+            return super().count
+        return estimate
@@ -0,0 +1,131 @@
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+from .fragments import bump_book_versions
+from .models import Book, RelatedBook, RelatedBooksRefresh
+
+# Birga sotib olish eng kuchli signal, keyin muallif, keyin kategoriya
+CO_PURCHASE_WEIGHT = 3.0
+AUTHOR_WEIGHT = 2.0
+CATEGORY_WEIGHT = 1.0
+
+
+def co_purchase_counts(book):
+    # {kitob_id: shu kitob bilan birga olingan buyurtmalar soni}
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    return dict(
+        OrderItem.objects
+        .filter(order__items__book=book)
+        .exclude(book=book)
+        .values_list('book')
+        .annotate(orders=Count('order', distinct=True))
+        .order_by('-orders')[:settings.RELATED_BOOKS_CANDIDATES]
+    )
+
+
+def compute_related(book, limit=None):
+    limit = limit or settings.RELATED_BOOKS_LIMIT
+    co_purchases = co_purchase_counts(book)
+    candidates = list(
+        Book.objects
+        .filter(Q(category_id=book.category_id) | Q(author_uz=book.author_uz) | Q(pk__in=co_purchases))
+        .exclude(pk=book.pk)
+        .order_by('-created_at', '-id')
+        .values_list('pk', 'category_id', 'author_uz')[:settings.RELATED_BOOKS_CANDIDATES + len(co_purchases)]
+    )
+
+    scored = []
+    for pk, category_id, author in candidates:
+        bought = co_purchases.get(pk, 0)
+        score = (
+            CO_PURCHASE_WEIGHT * bought
+            + AUTHOR_WEIGHT * (bool(author) and author == book.author_uz)
+            + CATEGORY_WEIGHT * (category_id == book.category_id)
+        )
+        scored.append((score, bought, pk))
+    # sorted barqaror: teng ballarda yangi kitoblar oldinda qoladi
+    scored.sort(key=lambda item: -item[0])
+    return scored[:limit]
+
+
+def peer_candidates(book):
+    # Kitob tavsiya qilinishi mumkin bo'lgan kitoblar: shu muallifning va shu kategoriyaning
+    # eng yangi RELATED_BOOKS_CANDIDATES tadan kitobi (to'liq qayta hisob — rebuild_related_books)
+    limit = settings.RELATED_BOOKS_CANDIDATES
+    peers = Book.objects.exclude(pk=book.pk).order_by('-created_at', '-id').values_list('pk', flat=True)
+    book_ids = list(peers.filter(category_id=book.category_id)[:limit])
+    if book.author_uz:
+        book_ids += peers.filter(author_uz=book.author_uz)[:limit]
+    return book_ids
+
+
+def refresh_related(book_ids):
+    books = Book.objects.filter(pk__in=set(book_ids)).only('pk', 'category_id', 'author_uz')
+    refreshed = []
+    for book in books:
+        entries = [
+            RelatedBook(book=book, related_id=pk, score=score, co_purchases=bought)
+            for score, bought, pk in compute_related(book)
+        ]
+        with transaction.atomic():
+            # Bir kitobni parallel yangilashlar navbatga turadi (aks holda delete+insert
+            # unique_related_book ga uriladi). Kitob qatori emas, advisory lock: zaxira band qilish kutmaydi
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [book.pk])
+            RelatedBook.objects.filter(book=book).delete()
+            RelatedBook.objects.bulk_create(entries)
+        refreshed.append(book.pk)
+    # Keshlangan kitob sahifalarida eski tavsiyalar qolmasin
+    transaction.on_commit(lambda: bump_book_versions(refreshed))
+    return refreshed
+
+
+def schedule_refresh(book_ids):
+    # Qayta hisob so'rov ichida emas, related_books_worker da. Yozuv joriy tranzaksiya bilan
+    # birga commit yoki rollback bo'ladi; takrorlar ishchida bitta hisobga birlashadi
+    RelatedBooksRefresh.objects.bulk_create([RelatedBooksRefresh(book_id=pk) for pk in set(book_ids)])
+
+
+def claim_refreshes(limit):
+    # Navbatdan limit tagacha kitob olinadi, shu kitoblarning barcha yozuvlari o'chiriladi
+    with transaction.atomic():
+        book_ids = set(
+            RelatedBooksRefresh.objects
+            .select_for_update(skip_locked=True)
+            .order_by('id')
+            .values_list('book_id', flat=True)[:limit]
+        )
+        if book_ids:
+            claimed = list(
+                RelatedBooksRefresh.objects
+                .select_for_update(skip_locked=True)
+                .filter(book_id__in=book_ids)
+                .values_list('pk', flat=True)
+            )
+            RelatedBooksRefresh.objects.filter(pk__in=claimed).delete()
+    return book_ids
+
+
+def process_refreshes(limit):
+    book_ids = claim_refreshes(limit)
+    if not book_ids:
+        return 0
+    try:
+        refresh_related(book_ids)
+    except Exception:
+        # Olingan kitoblar yo'qolmasin: keyingi aylanishda qayta urinadi
+        schedule_refresh(book_ids)
+        raise
+    return len(book_ids)
+
+
+def get_related_books(book, limit=None):
+    limit = limit or settings.RELATED_BOOKS_LIMIT
+    return (
+        Book.objects
+        .filter(recommended_in__book=book)
+        .defer('search_vector')
+        .order_by('-recommended_in__score')[:limit]
+    )
@@ -0,0 +1,146 @@
+import hashlib
+import io
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import ImageRendition, PendingRendition
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+CONTENT_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+def rendition_name(source, size, width, fmt):
+    digest = hashlib.sha1(source.encode('utf-8')).hexdigest()
+    return f'renditions/{digest[:2]}/{digest}/{size}-{width}.{EXTENSIONS[fmt]}'
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.save(buffer, format=fmt.upper(), quality=settings.IMAGE_RENDITION_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def render_image(source):
+    # Faqat fayllar bilan ishlaydi (bazaga tegmaydi): ProcessPool ichida ham xavfsiz
+    try:
+        with default_storage.open(source) as fh:
+            original = ImageOps.exif_transpose(Image.open(fh))
+            original.load()
+    except (OSError, UnidentifiedImageError) as e:
+        logger.warning("Rasm nusxalari yaratilmadi: %s (%s)", source, e)
+        return []
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+
+    rows = []
+    for size, options in settings.IMAGE_RENDITIONS.items():
+        # Kattalashtirmaymiz: asl rasmdan keng nusxalar bitta kenglikka tushadi
+        widths = sorted({min(width, original.width) for width in options['widths']})
+        for width in widths:
+            height = max(1, round(original.height * width / original.width))
+            resized = original if width == original.width else original.resize((width, height), Image.LANCZOS)
+            for fmt in settings.IMAGE_RENDITION_FORMATS:
+                name = rendition_name(source, size, width, fmt)
+                if default_storage.exists(name):
+                    default_storage.delete(name)
+                default_storage.save(name, ContentFile(_encode(resized, fmt)))
+                rows.append({
+                    'source': source, 'size': size, 'format': fmt,
+                    'width': width, 'height': height, 'file': name,
+                })
+    return rows
+
+
+def save_renditions(rows):
+    ImageRendition.objects.bulk_create(
+        [ImageRendition(**row) for row in rows],
+        update_conflicts=True,
+        unique_fields=['source', 'size', 'format', 'width'],
+        update_fields=['height', 'file'],
+    )
+
+
+def generate_renditions(sources):
+    rows = [row for source in sources for row in render_image(source)]
+    save_renditions(rows)
+    return rows
+
+
+def enqueue_renditions(sources):
+    PendingRendition.objects.bulk_create([PendingRendition(source=source) for source in dict.fromkeys(sources) if source])
+
+
+def claim_pending(limit):
+    # Navbatdan limit tagacha rasm olinadi, shu rasmlarning barcha yozuvlari o'chiriladi
+    with transaction.atomic():
+        sources = set(
+            PendingRendition.objects
+            .select_for_update(skip_locked=True)
+            .order_by('id')
+            .values_list('source', flat=True)[:limit]
+        )
+        if sources:
+            claimed = list(
+                PendingRendition.objects
+                .select_for_update(skip_locked=True)
+                .filter(source__in=sources)
+                .values_list('pk', flat=True)
+            )
+            PendingRendition.objects.filter(pk__in=claimed).delete()
+    return sources
+
+
+def process_pending(limit):
+    sources = claim_pending(limit)
+    for source in missing_sources(sources):
+        try:
+            save_renditions(render_image(source))
+        except Exception:
+            # Saqlash xatosi faqat shu rasmni to'xtatadi; generate_renditions buyrug'i keyin to'ldiradi
+            logger.exception("Rasm nusxalari yaratilmadi: %s", source)
+    return len(sources)
+
+
+def missing_sources(sources):
+    done = set(ImageRendition.objects.filter(source__in=sources).values_list('source', flat=True).distinct())
+    return [source for source in dict.fromkeys(sources) if source and source not in done]
+
+
+def delete_renditions(sources):
+    renditions = ImageRendition.objects.filter(source__in=sources)
+    for name in renditions.values_list('file', flat=True):
+        default_storage.delete(name)
+    renditions.delete()
+
+
+def renditions_map(sources):
+    # {manba: {(o'lcham, format): [(kenglik, url), ...]}} — bitta so'rov
+    result = defaultdict(lambda: defaultdict(list))
+    rows = (
+        ImageRendition.objects
+        .filter(source__in=set(sources))
+        .order_by('width')
+        .values_list('source', 'size', 'format', 'width', 'file')
+    )
+    for source, size, fmt, width, name in rows:
+        result[source][(size, fmt)].append((width, default_storage.url(name)))
+    return result
+
+
+def attach_renditions(objects):
+    # Shablon tegi uchun: har bir obyektga (Book yoki BookImage) obj.renditions
+    objects = [obj for obj in objects if obj.image]
+    renditions = renditions_map(obj.image.name for obj in objects)
+    for obj in objects:
+        obj.renditions = renditions.get(obj.image.name, {})
+    return objects
@@ -0,0 +1,33 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+
+SEARCH_CONFIGS = ('simple', 'russian')
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_search_query(query):
+    # Har bir so'z prefiks sifatida qidiriladi: "qod" → "qod:*"
+    terms = _TERM_RE.findall(query.lower())
+    if not terms:
+        return None
+    raw = ' & '.join(f'{term}:*' for term in terms)
+    search_query = None
+    for config in SEARCH_CONFIGS:
+        part = SearchQuery(raw, config=config, search_type='raw')
+        search_query = part if search_query is None else search_query | part
+    return search_query
+
+
+def search_books(queryset, query):
+    search_query = build_search_query(query)
+    if search_query is None:
+        return queryset.none()
+    return (
+        queryset
+        .filter(search_vector=search_query)
+        .annotate(rank=SearchRank(F('search_vector'), search_query))
+        .order_by('-rank', '-created_at')
+    )
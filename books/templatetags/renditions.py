@@ -0,0 +1,53 @@
+from django import template
+from django.conf import settings
+from django.utils.html import format_html, format_html_join
+
+from books.renditions import CONTENT_TYPES, attach_renditions
+
+register = template.Library()
+
+
+def _renditions(obj):
+    if not hasattr(obj, 'renditions'):
+        # Oldindan attach_renditions qilinmagan bo'lsa shu obyekt uchun alohida so'rov
+        attach_renditions([obj])
+    return getattr(obj, 'renditions', {})
+
+
+def _srcset(entries):
+    return ', '.join(f'{url} {width}w' for width, url in entries)
+
+
+@register.simple_tag
+def rendition_url(obj, size, fmt='jpeg'):
+    entries = _renditions(obj).get((size, fmt))
+    return entries[-1][1] if entries else obj.image.url
+
+
+@register.simple_tag
+def rendition_srcset(obj, size, fmt='webp'):
+    return _srcset(_renditions(obj).get((size, fmt), []))
+
+
+@register.simple_tag
+def picture(obj, size, alt='', **attrs):
+    # {% picture book 'card' alt=book.title class="card-img-top" loading="lazy" %}
+    attrs = format_html_join('', ' {}="{}"', ((key.replace('_', '-'), value) for key, value in attrs.items()))
+    renditions = _renditions(obj)
+    fallback = renditions.get((size, 'jpeg'))
+    if not fallback:
+        return format_html('<img src="{}" alt="{}"{}>', obj.image.url, alt, attrs)
+
+    sizes = settings.IMAGE_RENDITIONS[size]['sizes']
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (CONTENT_TYPES[fmt], _srcset(renditions[(size, fmt)]), sizes)
+            for fmt in settings.IMAGE_RENDITION_FORMATS
+            if fmt != 'jpeg' and (size, fmt) in renditions
+        ),
+    )
+    return format_html(
+        '<picture style="display:contents">{}<img src="{}" srcset="{}" sizes="{}" alt="{}"{}></picture>',
+        sources, fallback[0][1], _srcset(fallback), sizes, alt, attrs,
+    )
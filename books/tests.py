@@ -1,3 +1,816 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from .categories import get_category_index, invalidate_category_index
+from .context_processors import category_index
+from .fragments import book_version, catalog_version, fragment_stats
+from .jobs import claim_jobs, process_job
+from .models import (
+    Book, BookImage, BookVideo, Category, ImageRendition, PendingRendition, RelatedBook, RelatedBooksRefresh,
+    TranslationJob, TranslationMemory,
+)
+from .pagination import CursorPaginator
+from .recommendations import get_related_books, process_refreshes, refresh_related
+from .translation_memory import CachedTranslatorBackend, TranslationMemoryCache, memory
+from .translator import GoogleTranslatorBackend, LocalTranslatorBackend
+from .views import BookListView
+
+
+def create_book(category, **kwargs):
+    defaults = {
+        'title_uz': "O'tkan kunlar",
+        'author_uz': "Abdulla Qodiriy",
+        'description_uz': "Tarixiy roman",
+        'price': 50000,
+        'cover_type': 'hard',
+        'pages': 320,
+        'image': 'books/test.jpg',
+    }
+    defaults.update(kwargs)
+    defaults.setdefault('slug', f"book-{Book.objects.count() + 1}")
+    return Book.objects.create(category=category, **defaults)
+
+
+class FailingTranslatorBackend(LocalTranslatorBackend):
+    def translate(self, text, src, dest):
+        raise ConnectionError('translator is down')
+
+
+@override_settings(TRANSLATOR_BACKEND='books.translator.LocalTranslatorBackend')
+class TranslationJobTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name_uz='Roman', slug='roman')
+
+    def test_save_enqueues_jobs_without_translating(self):
+        with mock.patch.object(LocalTranslatorBackend, 'translate') as translate:
+            book = create_book(self.category)
+        translate.assert_not_called()
+        self.assertIsNone(book.title_ru)
+        fields = set(TranslationJob.objects.filter(content_type__model='book', object_id=book.pk).values_list('field', flat=True))
+        self.assertEqual(fields, {'title', 'description', 'author'})
+
+    def test_manual_russian_edit_is_not_overwritten(self):
+        book = create_book(self.category, title_ru="Минувшие дни")
+        self.assertFalse(TranslationJob.objects.filter(content_type__model='book', object_id=book.pk, field='title').exists())
+
+    def test_stale_job_is_skipped(self):
+        book = create_book(self.category)
+        book.title_uz = "Mehrobdan chayon"
+        book.save()
+        self.assertEqual(TranslationJob.objects.filter(content_type__model='book', object_id=book.pk, field='title').count(), 1)
+
+    def test_failed_job_is_retried_with_backoff(self):
+        create_book(self.category)
+        job = claim_jobs(1)[0]
+        process_job(job, FailingTranslatorBackend())
+        job.refresh_from_db()
+        self.assertEqual(job.status, TranslationJob.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_after, job.updated_at)
+        self.assertEqual(len(claim_jobs(10)), 3)
+
+    def test_translated_values_invalidate_caches(self):
+        book = create_book(self.category)
+        version = book_version(book.pk)
+        stale = get_category_index('ru')['categories'][0]['name']
+        for job in claim_jobs(10):
+            process_job(job, LocalTranslatorBackend())
+        self.assertNotEqual(book_version(book.pk), version)
+        self.assertEqual(stale, 'Roman')
+        self.assertEqual(get_category_index('ru')['categories'][0]['name'], '[ru] Roman')
+
+    def test_category_translation_invalidates_its_books(self):
+        book = create_book(self.category)
+        version = book_version(book.pk)
+        # Faqat kategoriya nomi tarjima qilinadi: kitob sahifasidagi category.name_ru eskiradi
+        for job in claim_jobs(10):
+            if job.content_type.model == 'category':
+                process_job(job, LocalTranslatorBackend())
+        self.assertNotEqual(book_version(book.pk), version)
+
+
+class TranslationMemoryTest(TestCase):
+    def test_repeated_text_is_translated_once(self):
+        backend = LocalTranslatorBackend()
+        cache = TranslationMemoryCache(maxsize=10)
+        with mock.patch.object(backend, 'translate', wraps=backend.translate) as translate:
+            translator = CachedTranslatorBackend(backend, cache)
+            for _ in range(3):
+                self.assertEqual(translator.translate('Abdulla Qodiriy', 'uz', 'ru'), '[ru] Abdulla Qodiriy')
+        self.assertEqual(translate.call_count, 1)
+        self.assertEqual(cache.stats, {'lru_hits': 2, 'db_hits': 0, 'misses': 1})
+
+    def test_table_is_consulted_after_lru_eviction(self):
+        translator = CachedTranslatorBackend(LocalTranslatorBackend(), TranslationMemoryCache(maxsize=1))
+        translator.translate('Roman', 'uz', 'ru')
+        translator.translate('Hikoya', 'uz', 'ru')
+        translator.translate('Roman', 'uz', 'ru')
+        self.assertEqual(translator.cache.stats['db_hits'], 1)
+        self.assertEqual(TranslationMemory.objects.count(), 2)
+
+
+@override_settings(TRANSLATOR_BACKEND='books.translator.LocalTranslatorBackend')
+class TranslationWorkerTest(TransactionTestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name_uz='Roman', slug='roman')
+
+    def test_worker_fills_russian_fields(self):
+        book = create_book(self.category)
+        call_command('translation_worker', once=True, workers=2, stdout=mock.MagicMock())
+        book.refresh_from_db()
+        self.category.refresh_from_db()
+        self.assertEqual(book.title_ru, "[ru] O'tkan kunlar")
+        self.assertEqual(book.author_ru, "[ru] Abdulla Qodiriy")
+        self.assertEqual(self.category.name_ru, '[ru] Roman')
+        self.assertFalse(TranslationJob.objects.exclude(status=TranslationJob.DONE).exists())
+
+
+class GoogleTranslatorBackendTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch('googletrans.Translator')
+        self.translate = patcher.start().return_value.translate
+        self.addCleanup(patcher.stop)
+        self.translate.side_effect = lambda text, src, dest: mock.Mock(text=text.upper())
+
+    def test_single_line_texts_share_one_call(self):
+        backend = GoogleTranslatorBackend()
+        texts = ['kitob', 'muallif', 'kitob', 'birinchi\nikkinchi']
+        self.assertEqual(backend.translate_batch(texts, 'uz', 'ru'), ['KITOB', 'MUALLIF', 'KITOB', 'BIRINCHI\nIKKINCHI'])
+        self.assertEqual(
+            [call.args[0] for call in self.translate.call_args_list], ['kitob\nmuallif', 'birinchi\nikkinchi'],
+        )
+
+    def test_line_mismatch_falls_back_to_one_call_per_text(self):
+        self.translate.side_effect = lambda text, src, dest: mock.Mock(text=text.replace('\n', ' ').upper())
+        backend = GoogleTranslatorBackend()
+        self.assertEqual(backend.translate_batch(['a', 'b'], 'uz', 'ru'), ['A', 'B'])
+        self.assertEqual(self.translate.call_count, 3)
+
+
+@override_settings(TRANSLATOR_BACKEND='books.translator.LocalTranslatorBackend')
+class TranslateCatalogCommandTest(TransactionTestCase):
+    def setUp(self):
+        category = Category.objects.create(name_uz='Roman', slug='roman')
+        for i in range(5):
+            create_book(category, title_uz=f'Kitob {i}', slug=f'kitob-{i}')
+        memory.clear()
+
+    def test_batches_and_writes_back(self):
+        out = io.StringIO()
+        with mock.patch.object(LocalTranslatorBackend, 'translate_batch', autospec=True,
+                               side_effect=LocalTranslatorBackend.translate_batch) as translate_batch:
+            call_command('translate_catalog', batch_size=4, chunk_size=2, stdout=out)
+        self.assertFalse(Book.objects.filter(title_ru__isnull=True).exists())
+        self.assertEqual(Book.objects.filter(author_ru='[ru] Abdulla Qodiriy').count(), 5)
+        # Kategoriya uchun 1 ta, kitoblarning 3 ta chunki uchun 1 tadan paket
+        self.assertEqual(translate_batch.call_count, 4)
+
+    def test_chunks_invalidate_cached_catalog(self):
+        version = catalog_version()
+        call_command('translate_catalog', stdout=io.StringIO())
+        self.assertNotEqual(catalog_version(), version)
+
+    def test_dry_run_and_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint = Path(tmp) / 'checkpoint.json'
+            call_command('translate_catalog', dry_run=True, stdout=io.StringIO())
+            self.assertTrue(Book.objects.filter(title_ru__isnull=True).exists())
+
+            call_command('translate_catalog', models='book', chunk_size=2, checkpoint=str(checkpoint),
+                         stdout=io.StringIO())
+            self.assertEqual(json.loads(checkpoint.read_text())['book'], Book.objects.latest('pk').pk)
+
+
+class BookSearchTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name_uz='Roman', slug='roman')
+        create_book(category, title_uz='Sariq devni minib', author_uz="Xudoyberdi To'xtaboyev",
+                    description_uz='Sarguzasht', slug='sariq-devni-minib')
+        create_book(category, title_uz="O'tkan kunlar", title_ru='Минувшие дни', slug='otkan-kunlar')
+        create_book(category, title_uz='Mehrobdan chayon', description_uz="Sariq qog'ozdagi xat",
+                    slug='mehrobdan-chayon')
+
+    def test_title_match_ranks_above_description(self):
+        response = self.client.get(reverse('books:book_list'), {'q': 'sariq'})
+        slugs = [book.slug for book in response.context['books']]
+        self.assertEqual(slugs, ['sariq-devni-minib', 'mehrobdan-chayon'])
+
+    def test_russian_columns_and_prefixes_are_searched(self):
+        response = self.client.get(reverse('books:book_list'), {'q': 'минувш'})
+        self.assertEqual([book.slug for book in response.context['books']], ['otkan-kunlar'])
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name_uz='Roman', slug='roman')
+        create_book(category, title_uz="O'tkan kunlar", title_ru='Минувшие дни', slug='otkan-kunlar')
+        create_book(category, title_uz='Mehrobdan chayon', slug='mehrobdan-chayon')
+        create_book(category, title_uz='Kecha va kunduz', author_uz="Cho'lpon", slug='kecha-va-kunduz')
+
+    def test_titles_and_deduplicated_authors(self):
+        response = self.client.get(reverse('books:autocomplete'), {'q': 'kun'})
+        data = response.json()
+        self.assertEqual({item['title'] for item in data['titles']}, {"O'tkan kunlar", 'Kecha va kunduz'})
+
+        data = self.client.get(reverse('books:autocomplete'), {'q': 'qodir'}).json()
+        self.assertEqual(data['authors'], ['Abdulla Qodiriy'])
+
+    def test_russian_title_is_shown_for_russian_language(self):
+        response = self.client.get(reverse('books:autocomplete'), {'q': 'минув'}, HTTP_ACCEPT_LANGUAGE='ru')
+        self.assertEqual(response.json()['titles'][0]['title'], 'Минувшие дни')
+
+    def test_short_query_returns_nothing(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('books:autocomplete'), {'q': 'k'})
+        self.assertEqual(response.json(), {'titles': [], 'authors': []})
+
+    async def test_async_client_gets_same_suggestions(self):
+        response = await self.async_client.get(reverse('books:autocomplete'), {'q': 'kun'})
+        self.assertEqual(
+            {item['title'] for item in response.json()['titles']}, {"O'tkan kunlar", 'Kecha va kunduz'},
+        )
+
+
+class BookListQueryCountTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name_uz='Roman', slug='roman')
+        Category.objects.create(name_uz='Hikoya', slug='hikoya')
+        for i in range(3):
+            create_book(self.category, title_uz=f'Roman {i}', slug=f'roman-{i}')
+        cache.clear()
+        get_category_index()
+
+    # COUNT, kitoblar, barcha kartochkalar rasmlari va ularning nusxalari; kategoriyalar keshdan
+    def test_list_page(self):
+        with self.assertNumQueries(4):
+            self.client.get(reverse('books:book_list'))
+
+    def test_category_page(self):
+        with self.assertNumQueries(4):
+            self.client.get(reverse('books:book_list_by_category', args=['roman']))
+
+    def test_search_page(self):
+        with self.assertNumQueries(4):
+            self.client.get(reverse('books:book_list'), {'q': 'roman'})
+
+    def test_query_count_independent_of_page_size_and_images(self):
+        for i in range(3, 20):
+            book = create_book(self.category, title_uz=f'Roman {i}', slug=f'roman-{i}')
+            for n in range(i % 4):
+                BookImage.objects.create(book=book, image=f'books/images/{i}-{n}.jpg')
+        for page_size in (2, 12, 20):
+            with self.subTest(page_size=page_size), mock.patch.object(BookListView, 'paginate_by', page_size):
+                with self.assertNumQueries(4):
+                    response = self.client.get(reverse('books:book_list'))
+                self.assertEqual(len(response.context['books']), page_size)
+
+    def test_gallery_is_ordered(self):
+        book = Book.objects.get(slug='roman-0')
+        second = BookImage.objects.create(book=book, image='books/images/b.jpg')
+        first = BookImage.objects.create(book=book, image='books/images/a.jpg')
+        BookImage.objects.filter(pk=first.pk).update(uploaded_at=second.uploaded_at.replace(year=2000))
+        response = self.client.get(reverse('books:book_list'))
+        card = next(b for b in response.context['books'] if b.pk == book.pk)
+        self.assertEqual([image.pk for image in card.gallery], [first.pk, second.pk])
+
+    def test_out_of_range_page_shows_last_page(self):
+        response = self.client.get(reverse('books:book_list'), {'page': 99})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+
+class CursorPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name_uz='Roman', slug='roman')
+        self.books = [
+            create_book(self.category, title_uz=f'Roman {i}', slug=f'roman-{i}') for i in range(5)
+        ]
+        # Bir xil created_at: tartibni id hal qiladi
+        Book.objects.update(created_at=self.books[0].created_at)
+
+    def slugs(self, page):
+        return [book.slug for book in page]
+
+    def test_next_and_previous_pages(self):
+        paginator = CursorPaginator(Book.objects.all(), per_page=2)
+        first = paginator.page()
+        self.assertEqual(self.slugs(first), ['roman-4', 'roman-3'])
+        self.assertIsNone(first.previous_cursor)
+
+        second = paginator.page(first.next_cursor)
+        self.assertEqual(self.slugs(second), ['roman-2', 'roman-1'])
+        third = paginator.page(second.next_cursor)
+        self.assertEqual(self.slugs(third), ['roman-0'])
+        self.assertIsNone(third.next_cursor)
+
+        back = paginator.page(third.previous_cursor)
+        self.assertEqual(self.slugs(back), ['roman-2', 'roman-1'])
+        self.assertEqual(self.slugs(paginator.page(back.previous_cursor)), ['roman-4', 'roman-3'])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        page = CursorPaginator(Book.objects.all(), per_page=2).page('buzilgan')
+        self.assertEqual(self.slugs(page), ['roman-4', 'roman-3'])
+
+    @mock.patch.object(BookListView, 'paginate_by', 2)
+    def test_list_view_load_more(self):
+        response = self.client.get(reverse('books:book_list'))
+        cursor = response.context['next_cursor']
+        with self.assertNumQueries(3):  # kitoblar, rasmlar, nusxalar; COUNT ham, OFFSET ham yo'q
+            response = self.client.get(
+                reverse('books:book_list'), {'cursor': cursor}, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+            )
+        data = response.json()
+        self.assertIn('roman-2', data['html'])
+        self.assertNotIn('roman-4', data['html'])
+        self.assertIsNotNone(data['next'])
+
+
+class RelatedBooksTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.roman = Category.objects.create(name_uz='Roman', slug='roman')
+        self.she_r = Category.objects.create(name_uz="She'riyat", slug='sheriyat')
+        self.book = create_book(self.roman, slug='otkan-kunlar')
+        self.same_category = create_book(self.roman, author_uz='Oybek', slug='navoiy')
+        self.same_author = create_book(self.she_r, slug='mehrobdan-chayon')
+        self.bought_together = create_book(self.she_r, author_uz="Cho'lpon", slug='kecha-va-kunduz')
+        self.unrelated = create_book(self.she_r, author_uz='Oybek', slug='qutlug-qon')
+
+    def place_order(self, *books):
+        from orders.models import Order, OrderItem
+        from users.models import CustomUser
+
+        user = CustomUser.objects.create_user(phone=f'+99890{Order.objects.count():07d}', password='x')
+        order = Order.objects.create(user=user, total_amount=0, address='Toshkent', landmark='Chorsu')
+        with self.captureOnCommitCallbacks(execute=True):
+            for book in books:
+                OrderItem.objects.create(order=order, book=book, price=book.price)
+
+    def test_scores_blend_co_purchases_author_and_category(self):
+        self.place_order(self.book, self.bought_together)
+        refresh_related([self.book.pk])
+        related = list(get_related_books(self.book))
+        self.assertEqual(related, [self.bought_together, self.same_author, self.same_category])
+
+    def drain_queue(self):
+        call_command('related_books_worker', '--once', stdout=io.StringIO())
+        self.assertFalse(RelatedBooksRefresh.objects.exists())
+
+    def test_order_items_refresh_incrementally(self):
+        RelatedBooksRefresh.objects.all().delete()
+        self.place_order(self.book, self.unrelated)
+        # Buyurtma so'rovida hisoblanmaydi, faqat navbatga yoziladi
+        self.assertFalse(RelatedBook.objects.exists())
+        self.assertEqual(
+            set(RelatedBooksRefresh.objects.values_list('book_id', flat=True)),
+            {self.book.pk, self.unrelated.pk},
+        )
+        self.drain_queue()
+        entry = RelatedBook.objects.get(book=self.unrelated, related=self.book)
+        self.assertEqual(entry.co_purchases, 1)
+
+    def test_rolled_back_changes_are_not_queued(self):
+        RelatedBooksRefresh.objects.all().delete()
+        with transaction.atomic():
+            create_book(self.roman, slug='bekor')
+            transaction.set_rollback(True)
+        self.assertFalse(RelatedBooksRefresh.objects.exists())
+
+    def test_duplicates_are_refreshed_once(self):
+        RelatedBooksRefresh.objects.all().delete()
+        RelatedBooksRefresh.objects.bulk_create([RelatedBooksRefresh(book_id=self.book.pk) for _ in range(3)])
+        with mock.patch('books.recommendations.refresh_related') as refresh:
+            self.assertEqual(process_refreshes(1), 1)
+        refresh.assert_called_once_with({self.book.pk})
+        self.assertFalse(RelatedBooksRefresh.objects.exists())
+
+    def test_failed_refresh_is_requeued(self):
+        RelatedBooksRefresh.objects.all().delete()
+        RelatedBooksRefresh.objects.create(book_id=self.book.pk)
+        with mock.patch('books.recommendations.compute_related', side_effect=ConnectionError), \
+                self.assertRaises(ConnectionError):
+            process_refreshes(10)
+        self.assertEqual(list(RelatedBooksRefresh.objects.values_list('book_id', flat=True)), [self.book.pk])
+
+    def test_refresh_bumps_book_version(self):
+        version = book_version(self.book.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_related([self.book.pk])
+        self.assertNotEqual(book_version(self.book.pk), version)
+
+    def test_new_and_moved_books_reach_their_peers(self):
+        refresh_related(Book.objects.values_list('pk', flat=True))
+        new_book = create_book(self.she_r, author_uz='Oybek', slug='navoiy-2')
+        self.drain_queue()
+        self.assertIn(new_book, get_related_books(self.same_category))
+        self.assertIn(new_book, get_related_books(self.unrelated))
+
+        self.book.category = self.she_r
+        self.book.save()
+        self.drain_queue()
+        self.assertIn(self.book, get_related_books(self.bought_together))
+        self.assertNotIn(self.book, get_related_books(self.same_category))
+
+    def test_detail_page_reads_related_in_one_query(self):
+        refresh_related([self.book.pk])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('books:book_detail', args=[self.book.slug]))
+        related_queries = [q['sql'] for q in queries if 'JOIN "books_relatedbook"' in q['sql']]
+        self.assertEqual(len(related_queries), 1)
+        self.assertEqual(list(response.context['related_books']), [self.same_author, self.same_category])
+
+
+class CategoryIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.roman = Category.objects.create(name_uz='Roman', name_ru='Роман', slug='roman')
+        self.hikoya = Category.objects.create(name_uz='Hikoya', name_ru='Рассказ', slug='hikoya')
+        create_book(self.roman, slug='roman-1')
+        create_book(self.roman, slug='roman-2')
+
+    def test_counts_per_language(self):
+        index = get_category_index('ru')
+        self.assertEqual(index['total'], 2)
+        self.assertEqual(
+            [(c['name'], c['book_count']) for c in index['categories']],
+            [('Роман', 2), ('Рассказ', 0)],
+        )
+        self.assertEqual(get_category_index('uz')['categories'][0]['name'], 'Roman')
+
+    def test_steady_state_sidebar_costs_no_queries(self):
+        get_category_index()
+        with self.assertNumQueries(0):
+            categories = list(category_index(None)['categories'])
+        self.assertEqual(len(categories), 2)
+
+    def test_book_changes_invalidate_counts(self):
+        get_category_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            create_book(self.hikoya, slug='hikoya-1')
+        self.assertEqual([c['book_count'] for c in get_category_index()['categories']], [2, 1])
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.get(slug='roman-1').delete()
+        self.assertEqual(get_category_index()['total'], 2)
+
+    def test_long_ttl_needs_shared_cache(self):
+        for shared, timeout in ((False, 60), (True, 60 * 60 * 24)):
+            invalidate_category_index()
+            with override_settings(CACHE_IS_SHARED=shared), mock.patch.object(cache, 'set') as cache_set:
+                get_category_index()
+            self.assertEqual(cache_set.call_args.args[2], timeout)
+
+    def test_unknown_category_is_404(self):
+        response = self.client.get(reverse('books:book_list_by_category', args=['yoq']))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHE_IS_SHARED=True)
+class CatalogFragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name_uz='Roman', name_ru='Роман', slug='roman')
+        self.book = create_book(self.category, title_uz='Kecha va kunduz', title_ru='Ночь и день', slug='kecha-va-kunduz')
+
+    def test_list_and_detail_hits_skip_queries(self):
+        for url in (reverse('books:book_list'), reverse('books:book_detail', args=[self.book.slug])):
+            with self.subTest(url=url):
+                self.client.get(url)
+                with self.assertNumQueries(0):
+                    response = self.client.get(url)
+                self.assertContains(response, 'Kecha va kunduz')
+        stats = fragment_stats()
+        self.assertEqual((stats['book_list']['hits'], stats['book_list']['misses']), (1, 1))
+        self.assertEqual(stats['book_detail']['hit_ratio'], 0.5)
+
+    def test_fragments_vary_by_language(self):
+        url = reverse('books:book_detail', args=[self.book.slug])
+        self.assertContains(self.client.get(url, HTTP_ACCEPT_LANGUAGE='uz'), 'Kecha va kunduz')
+        self.assertContains(self.client.get(url, HTTP_ACCEPT_LANGUAGE='ru'), 'Ночь и день')
+
+    def test_book_changes_invalidate_fragments(self):
+        url = reverse('books:book_detail', args=[self.book.slug])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            BookImage.objects.create(book=self.book, image='books/images/yangi.jpg')
+        self.assertContains(self.client.get(url), 'books/images/yangi.jpg')
+
+    def test_other_books_keep_their_detail_fragment(self):
+        url = reverse('books:book_detail', args=[self.book.slug])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_book(self.category, title_uz='Boshqa kitob', slug='boshqa')
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name_uz = 'Tarixiy roman'
+            self.category.save()
+        self.assertContains(self.client.get(url), 'Tarixiy roman')
+
+    def test_csrf_token_is_not_cached(self):
+        self.client.get(reverse('books:book_list'))
+        response = self.client.get(reverse('books:book_list'))
+        # Kartochkadagi forma bo'sh joy qoldiradi, token har so'rovda meta tegida beriladi
+        self.assertContains(response, 'name="csrfmiddlewaretoken" value=""')
+        self.assertContains(response, f'<meta name="csrf-token" content="{response.context["csrf_token"]}">')
+
+    def test_stats_command(self):
+        self.client.get(reverse('books:book_list'))
+        out = io.StringIO()
+        call_command('catalog_cache_stats', '--reset', stdout=out)
+        self.assertIn('book_list: 0 hit, 1 miss', out.getvalue())
+        self.assertEqual(fragment_stats()['book_list']['misses'], 0)
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_fragments_need_shared_cache(self):
+        url = reverse('books:book_list')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertTrue(queries)
+        with self.assertRaises(CommandError):
+            call_command('catalog_cache_stats', stdout=io.StringIO())
+
+
+@override_settings(CACHE_IS_SHARED=True)
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.roman = Category.objects.create(name_uz='Roman', slug='roman')
+        self.hikoya = Category.objects.create(name_uz='Hikoya', slug='hikoya')
+        self.book = create_book(self.roman, slug='otkan-kunlar')
+        self.other = create_book(self.hikoya, slug='anor')
+
+    def get(self, url):
+        # Birinchi javob CSRF cookie ni o'rnatadi, u ham ETag ning bir qismi
+        self.client.get(url)
+        return self.client.get(url)
+
+    def test_detail_not_modified(self):
+        url = reverse('books:book_detail', args=[self.book.slug])
+        response = self.get(url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_detail_changes_with_media(self):
+        url = reverse('books:book_detail', args=[self.book.slug])
+        first = self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            BookVideo.objects.create(book=self.book, url='https://youtu.be/abc')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_detail_ignores_other_books(self):
+        url = reverse('books:book_detail', args=[self.book.slug])
+        first = self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_book(self.roman, slug='yangi-roman')
+            self.other.title_uz = 'Anor (2-nashr)'
+            self.other.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+    def test_detail_etag_depends_on_language(self):
+        url = reverse('books:book_detail', args=[self.book.slug])
+        uz = self.get(url)
+        # Til cookie da saqlanadi, URL o'zgarmaydi
+        self.client.cookies[settings.LANGUAGE_COOKIE_NAME] = 'ru'
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=uz['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], uz['ETag'])
+
+    def test_detail_changes_with_category_and_recommendations(self):
+        url = reverse('books:book_detail', args=[self.book.slug])
+        first = self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.roman.name_uz = 'Romanlar'
+            self.roman.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertContains(response, 'Romanlar')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_related([self.book.pk])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'anor')
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_detail_not_modified_without_fragment_cache(self):
+        url = reverse('books:book_detail', args=[self.book.slug])
+        first = self.get(url)
+        # Faqat kitob va uning vaqtlari o'qiladi: tavsiyalar va galereya so'ralmaydi
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_category_page_ignores_other_categories(self):
+        url = reverse('books:book_list_by_category', args=['roman'])
+        first = self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.title_uz = 'Anor (2-nashr)'
+            self.other.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title_uz = "O'tkan kunlar (2-nashr)"
+            self.book.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        from users.models import CustomUser
+
+        url = reverse('books:book_list')
+        anonymous = self.get(url)
+        self.client.force_login(CustomUser.objects.create_user(phone='+998901112233', password='x'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=anonymous['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertIn('private', response['Cache-Control'])
+
+
+def make_image(name='books/asl.jpg', size=(500, 750)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'teal').save(buffer, format='JPEG')
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+class ImageRenditionTest(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        cache.clear()
+        self.category = Category.objects.create(name_uz='Roman', slug='roman')
+
+    def drain_queue(self):
+        call_command('rendition_worker', '--once', stdout=io.StringIO())
+        self.assertFalse(PendingRendition.objects.exists())
+
+    def test_upload_generates_renditions(self):
+        book = create_book(self.category, image=make_image())
+        # Saqlash so'rovida chizilmaydi, faqat navbatga yoziladi
+        self.assertFalse(ImageRendition.objects.exists())
+        self.drain_queue()
+        renditions = ImageRendition.objects.filter(source=book.image.name)
+        # 500px dan kengi kattalashtirilmaydi: card 300/500, detail 320/500, thumb 60/120
+        self.assertEqual(
+            sorted(set(renditions.values_list('size', 'width'))),
+            [('card', 300), ('card', 500), ('detail', 320), ('detail', 500), ('thumb', 60), ('thumb', 120)],
+        )
+        self.assertEqual(set(renditions.values_list('format', flat=True)), {'webp', 'jpeg'})
+        card = renditions.get(size='card', width=300, format='webp')
+        self.assertEqual(card.height, 450)
+        self.assertTrue(default_storage.exists(card.file.name))
+
+    def test_only_image_changes_are_queued(self):
+        book = create_book(self.category, image=make_image())
+        image = BookImage.objects.create(book=book, image=make_image('books/images/1.jpg'))
+        self.assertEqual(PendingRendition.objects.count(), 2)
+        PendingRendition.objects.all().delete()
+
+        book = Book.objects.get(pk=book.pk)
+        book.price = 60000
+        book.save()
+        image = BookImage.objects.get(pk=image.pk)
+        image.save()
+        self.assertFalse(PendingRendition.objects.exists())
+
+        book.image = make_image('books/yangi.jpg')
+        book.save()
+        self.assertEqual(list(PendingRendition.objects.values_list('source', flat=True)), [book.image.name])
+
+    def test_storage_errors_are_logged(self):
+        create_book(self.category, image=make_image())
+        create_book(self.category, image=make_image('books/ikkinchi.jpg'), slug='ikkinchi')
+        save = default_storage.save
+        failures = [OSError('disk full')]
+
+        def flaky_save(name, content, **kwargs):
+            # Birinchi nusxa saqlanmaydi
+            if failures:
+                raise failures.pop()
+            return save(name, content, **kwargs)
+
+        with mock.patch.object(default_storage, 'save', flaky_save), self.assertLogs('books.renditions', 'ERROR'):
+            self.drain_queue()
+        # Bitta rasm xatosi qolganlarini to'xtatmaydi
+        self.assertEqual(ImageRendition.objects.values('source').distinct().count(), 1)
+
+    def test_list_page_serves_srcset(self):
+        create_book(self.category, image=make_image())
+        self.drain_queue()
+        response = self.client.get(reverse('books:book_list'))
+        self.assertContains(response, '<source type="image/webp" srcset="')
+        self.assertContains(response, '-300.webp 300w')
+
+    def test_missing_renditions_fall_back_to_original(self):
+        book = create_book(self.category, image=make_image())
+        html = Template("{% load renditions %}{% picture book 'card' alt='x' %}").render(Context({'book': book}))
+        self.assertEqual(html, f'<img src="{book.image.url}" alt="x">')
+
+    def test_delete_removes_renditions(self):
+        book = create_book(self.category, image=make_image())
+        self.drain_queue()
+        name = ImageRendition.objects.filter(source=book.image.name).first().file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        self.assertFalse(ImageRendition.objects.exists())
+        self.assertFalse(default_storage.exists(name))
+
+
+class GenerateRenditionsCommandTest(TransactionTestCase):
+    def test_backfill(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            category = Category.objects.create(name_uz='Roman', slug='roman')
+            Book.objects.bulk_create([
+                Book(category=category, title_uz=f'Kitob {i}', author_uz='Oybek', description_uz='-',
+                     price=1000, cover_type='soft', pages=10, image=make_image(f'books/{i}.jpg'), slug=f'kitob-{i}')
+                for i in range(3)
+            ])
+            out = io.StringIO()
+            call_command('generate_renditions', '--workers', '2', stdout=out)
+            self.assertEqual(ImageRendition.objects.values('source').distinct().count(), 3)
+            call_command('generate_renditions', stdout=out)
+            self.assertIn('0 ta rasm', out.getvalue())
+
+
+class DatabaseMiddlewareTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name_uz='Roman', slug='roman')
+        create_book(category, slug='vaqt')
+
+    @override_settings(DEBUG=True)
+    def test_server_timing_reports_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('books:book_list'))
+        self.assertRegex(response['Server-Timing'], rf'^db;dur=[\d.]+;desc="{len(queries)} queries"')
+
+    def test_server_timing_only_for_staff(self):
+        self.assertFalse(self.client.get(reverse('books:book_list')).has_header('Server-Timing'))
+        staff = get_user_model().objects.create_user(phone='+998900000001', password='x', is_staff=True)
+        self.client.force_login(staff)
+        self.assertTrue(self.client.get(reverse('books:book_list')).has_header('Server-Timing'))
+
+    @override_settings(DEBUG=True)
+    async def test_async_requests_stay_on_event_loop(self):
+        with mock.patch('root.db.sync_to_async', side_effect=AssertionError('thread hop')):
+            response = await self.async_client.get(reverse('books:autocomplete'), {'q': 'kun'})
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries"')
+
+
+class AdminStatementTimeoutTest(TransactionTestCase):
+    def statement_timeout(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW statement_timeout')
+            return cursor.fetchone()[0]
+
+    @override_settings(DB_ADMIN_STATEMENT_TIMEOUT=45000)
+    def test_admin_timeout_is_local_to_request_transaction(self):
+        default = self.statement_timeout()
+        admin = get_user_model().objects.create_superuser(phone='+998900000000', password='testpass')
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('admin:index'))
+        sql = [query['sql'] for query in queries]
+        self.assertEqual(sql[:2], ['BEGIN', 'SET LOCAL statement_timeout = 45000'])
+        self.assertNotIn('RESET statement_timeout', sql)
+        self.assertEqual(self.statement_timeout(), default)
+
+    @override_settings(DB_ADMIN_STATEMENT_TIMEOUT=45000)
+    async def test_async_admin_request_runs_in_transaction(self):
+        from django.contrib.admin import site
+
+        admin = await get_user_model().objects.acreate(phone='+998900000000', is_staff=True, is_superuser=True)
+        await self.async_client.aforce_login(admin)
+        seen = []
+        each_context = site.each_context
+
+        def context(request):
+            # View ning o'z ulanishida admin chegarasi amal qiladi
+            seen.append(self.statement_timeout())
+            return each_context(request)
+
+        with mock.patch.object(site, 'each_context', context):
+            response = await self.async_client.get(reverse('admin:index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(seen, ['45s'])
 
-# Create your tests here.
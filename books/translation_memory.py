@@ -0,0 +1,159 @@
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import TranslationMemory
+from .translator import BaseTranslatorBackend, source_hash
+
+# last_used_at har o'qishda emas, shu oraliqda bir marta yangilanadi
+TOUCH_INTERVAL = timedelta(days=1)
+
+
+# TranslationMemory jadvali oldidagi jarayon ichidagi LRU
+class TranslationMemoryCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {'lru_hits': 0, 'db_hits': 0, 'misses': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _remember(self, key, translated):
+        with self._lock:
+            self._lru[key] = translated
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+
+    def get(self, text, src, dest):
+        key = (src, dest, source_hash(text))
+        with self._lock:
+            translated = self._lru.get(key)
+            if translated is not None:
+                self._lru.move_to_end(key)
+                self.stats['lru_hits'] += 1
+                return translated
+
+        entry = (
+            TranslationMemory.objects
+            .filter(src=src, dest=dest, source_hash=key[2])
+            .only('pk', 'translated_text', 'last_used_at')
+            .first()
+        )
+        if entry is None:
+            self._count('misses')
+            return None
+
+        now = timezone.now()
+        if entry.last_used_at < now - TOUCH_INTERVAL:
+            TranslationMemory.objects.filter(pk=entry.pk).update(last_used_at=now)
+        self._count('db_hits')
+        self._remember(key, entry.translated_text)
+        return entry.translated_text
+
+    def get_many(self, texts, src, dest):
+        found = {}
+        missing = {}
+        with self._lock:
+            for text in set(texts):
+                key = (src, dest, source_hash(text))
+                translated = self._lru.get(key)
+                if translated is None:
+                    missing[key[2]] = text
+                    continue
+                self._lru.move_to_end(key)
+                found[text] = translated
+            self.stats['lru_hits'] += len(found)
+
+        if missing:
+            entries = TranslationMemory.objects.filter(
+                src=src, dest=dest, source_hash__in=missing
+            ).values_list('source_hash', 'translated_text')
+            db_hits = 0
+            for hash_, translated in entries:
+                found[missing[hash_]] = translated
+                self._remember((src, dest, hash_), translated)
+                db_hits += 1
+            now = timezone.now()
+            TranslationMemory.objects.filter(
+                src=src, dest=dest, source_hash__in=missing, last_used_at__lt=now - TOUCH_INTERVAL
+            ).update(last_used_at=now)
+            with self._lock:
+                self.stats['db_hits'] += db_hits
+                self.stats['misses'] += len(missing) - db_hits
+        return found
+
+    def set(self, text, src, dest, translated):
+        key = (src, dest, source_hash(text))
+        TranslationMemory.objects.update_or_create(
+            src=src, dest=dest, source_hash=key[2],
+            defaults={'source_text': text, 'translated_text': translated, 'last_used_at': timezone.now()},
+        )
+        self._remember(key, translated)
+
+    def set_many(self, translations, src, dest):
+        now = timezone.now()
+        entries = [
+            TranslationMemory(
+                src=src, dest=dest, source_hash=source_hash(text),
+                source_text=text, translated_text=translated, last_used_at=now,
+            )
+            for text, translated in translations.items()
+        ]
+        TranslationMemory.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=['src', 'dest', 'source_hash'],
+            update_fields=['translated_text', 'last_used_at'],
+        )
+        for entry in entries:
+            self._remember((src, dest, entry.source_hash), entry.translated_text)
+
+    def prune(self, max_age_days):
+        cutoff = timezone.now() - timedelta(days=max_age_days)
+        deleted, _ = TranslationMemory.objects.filter(last_used_at__lt=cutoff).delete()
+        self.clear()
+        return deleted
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+
+    def hit_ratio(self):
+        hits = self.stats['lru_hits'] + self.stats['db_hits']
+        total = hits + self.stats['misses']
+        return hits / total if total else 0.0
+
+
+memory = TranslationMemoryCache(settings.TRANSLATION_MEMORY_LRU_SIZE)
+
+
+class CachedTranslatorBackend(BaseTranslatorBackend):
+    def __init__(self, backend, cache=None):
+        self.backend = backend
+        self.cache = cache or memory
+
+    def translate(self, text, src, dest):
+        translated = self.cache.get(text, src, dest)
+        if translated is None:
+            translated = self.backend.translate(text, src, dest)
+            self.cache.set(text, src, dest, translated)
+        return translated
+
+    def translate_batch(self, texts, src, dest):
+        results = self.cache.get_many(texts, src, dest)
+        missing = list(dict.fromkeys(text for text in texts if text not in results))
+        if missing:
+            translated = dict(zip(missing, self.backend.translate_batch(missing, src, dest)))
+            self.cache.set_many(translated, src, dest)
+            results.update(translated)
+        return [results[text] for text in texts]
@@ -0,0 +1,54 @@
+import hashlib
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def source_hash(text):
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+class BaseTranslatorBackend:
+    def translate(self, text, src, dest):
+        raise NotImplementedError
+
+    def translate_batch(self, texts, src, dest):
+        return [self.translate(text, src, dest) for text in texts]
+
+
+class GoogleTranslatorBackend(BaseTranslatorBackend):
+    def __init__(self):
+        from googletrans import Translator
+        self.translator = Translator()
+
+    def translate(self, text, src, dest):
+        return self.translator.translate(text, src=src, dest=dest).text
+
+    def translate_batch(self, texts, src, dest):
+        # googletrans 4.0.0-rc1 ro'yxat qabul qilmaydi. Bir qatorli matnlar (nom, muallif)
+        # qator bo'yicha birlashtirilib bitta so'rovda yuboriladi va javob qatorlarga bo'linadi;
+        # ko'p qatorli matnlar va qatorlar soni mos kelmagan paket bittadan tarjima qilinadi
+        translations = {'': ''}
+        lines = list(dict.fromkeys(text for text in texts if text and '\n' not in text))
+        if len(lines) > 1:
+            result = self.translate('\n'.join(lines), src, dest).split('\n')
+            if len(result) == len(lines):
+                translations.update(zip(lines, (line.strip() for line in result)))
+        for text in texts:
+            if text not in translations:
+                translations[text] = self.translate(text, src, dest)
+        return [translations[text] for text in texts]
+
+
+class LocalTranslatorBackend(BaseTranslatorBackend):
+    # Tarmoqqa chiqmaydi: testlar va lokal ishlab chiqish uchun
+    def translate(self, text, src, dest):
+        return f'[{dest}] {text}'
+
+
+def get_translator():
+    backend = import_string(settings.TRANSLATOR_BACKEND)()
+    if settings.TRANSLATION_MEMORY_ENABLED:
+        from .translation_memory import CachedTranslatorBackend
+        backend = CachedTranslatorBackend(backend)
+    return backend
@@ -6,5 +6,6 @@ app_name = 'books'
 urlpatterns = [
     path('', views.BookListView.as_view(), name='book_list'),
     path('category/<slug:category_slug>/', views.BookListView.as_view(), name='book_list_by_category'),
+    path('autocomplete/', views.autocomplete_view, name='autocomplete'),
     path('<slug:slug>/', views.BookDetailView.as_view(), name='book_detail'),
 ] 
\ No newline at end of file
@@ -1,75 +1,212 @@
+from django.conf import settings
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
 from django.shortcuts import render, get_object_or_404
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_GET
 from django.views.generic import ListView, DetailView
+from django.views.generic.list import MultipleObjectMixin
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.contrib import messages
-from .models import Category, Book
+from .models import Category, Book, BookImage, BookVideo, RelatedBook
+from .autocomplete import aget_suggestions
+from .categories import catalog_language, find_category, get_category_index
+from .conditional import make_etag, not_modified, set_validators
+from .fragments import book_version, catalog_version, fragment_key, get_fragment, set_fragment
+from .pagination import CursorPaginationMixin, CursorPaginator
+from .recommendations import get_related_books
+from .renditions import attach_renditions
+from .search import search_books
 
-class BookListView(ListView):
+def latest_upload(model):
+    return Subquery(model.objects.filter(book=OuterRef('pk')).order_by('-uploaded_at').values('uploaded_at')[:1])
+
+class BookListView(CursorPaginationMixin, ListView):
     model = Book
     template_name = 'books/book/list.html'
     context_object_name = 'books'
     paginate_by = 12  # Har bir sahifada 12 ta kitob
 
-    def get_queryset(self):
-        queryset = Book.objects.select_related('category').all()
-        category_slug = self.kwargs.get('category_slug')
-        search_query = self.request.GET.get('q')
-    
+    def get(self, request, *args, **kwargs):
+        category_slug = kwargs.get('category_slug')
+        self.category = None
         if category_slug:
-            self.category = get_object_or_404(Category, slug=category_slug)
-            queryset = queryset.filter(category=self.category)
-
-        if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(author__icontains=search_query) |
-                Q(description__icontains=search_query)
-            )
-            # messages.info(self.request, f"'{search_query}' uchun qidiruv natijalari")
+            # Kategoriya keshlangan indeksdan olinadi: alohida so'rov kerak emas
+            self.category = find_category(category_slug)
+            if self.category is None:
+                raise Http404
+        self.search_query = request.GET.get('q', '')
+
+        # Kategoriya sahifasi faqat o'z kategoriyasi o'zgarganda yangilanadi
+        version = catalog_version(self.category['id'] if self.category else None)
+        self.fragment_key = fragment_key(
+            'book_list',
+            self.category and self.category['slug'],
+            self.search_query,
+            request.GET.get(self.page_kwarg),
+            request.GET.get(self.cursor_kwarg),
+            self.get_paginate_by(None),
+            version=version,
+        )
+        sidebar_version = get_category_index()['version']
+        etag = make_etag(request, self.fragment_key, sidebar_version)
+        last_modified = max(version, sidebar_version) / 1e9
+        response = not_modified(request, etag, last_modified) or super().get(request, *args, **kwargs)
+        return set_validators(request, response, etag, last_modified)
+
+    def get_queryset(self):
+        # Kartochka galereyasi bitta so'rovda: book.gallery — tartiblangan ro'yxat
+        gallery = Prefetch('images', queryset=BookImage.objects.order_by('uploaded_at', 'id'), to_attr='gallery')
+        queryset = Book.objects.select_related('category').prefetch_related(gallery).defer('search_vector')
+
+        if self.category:
+            queryset = queryset.filter(category_id=self.category['id'])
+
+        if self.search_query:
+            # messages.info(self.request, f"'{self.search_query}' uchun qidiruv natijalari")
+            return search_books(queryset, self.search_query)
+
+        return queryset.order_by('-created_at', '-id')
+
+    def use_cursor_pagination(self):
+        # Qidiruv natijalari rank bo'yicha saralanadi, ular uchun OFFSET qoladi
+        return not self.search_query and super().use_cursor_pagination()
 
-        return queryset.order_by('-created_at')
+    def paginate_queryset(self, queryset, page_size):
+        if self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        # Noto'g'ri yoki chegaradan tashqari sahifa raqamida 404 o'rniga
+        # birinchi/oxirgi sahifa ko'rsatiladi
+        paginator = self.get_paginator(queryset, page_size, allow_empty_first_page=self.get_allow_empty())
+        page = paginator.get_page(self.request.GET.get(self.page_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
 
     def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
-        context['current_category'] = getattr(self, 'category', None)
-        context['search_query'] = self.request.GET.get('q', '')
-        
-        # Pagination
-        paginator = Paginator(self.get_queryset(), self.paginate_by)
-        page = self.request.GET.get('page')
-        try:
-            books = paginator.page(page)
-        except PageNotAnInteger:
-            books = paginator.page(1)
-        except EmptyPage:
-            books = paginator.page(paginator.num_pages)
-        
-        context['books'] = books
+        fragment = get_fragment('book_list', self.fragment_key)
+        if fragment is None:
+            context = super().get_context_data(**kwargs)
+            fragment = self.get_cards_fragment(context)
+            set_fragment(self.fragment_key, fragment)
+        else:
+            # Keshdan: queryset baholanmaydi, COUNT ham bajarilmaydi
+            context = super(MultipleObjectMixin, self).get_context_data(**kwargs)
+            context['cursor_pagination'] = self.use_cursor_pagination()
+
+        context['current_category'] = self.category
+        context['search_query'] = self.search_query
+        context['cards_html'] = mark_safe(fragment['cards'])
+        context['has_books'] = fragment['has_books']
+        context['next_cursor'] = fragment['next_cursor']
+        context['previous_cursor'] = fragment['previous_cursor']
         return context
 
+    def get_cards_fragment(self, context):
+        # Kartochkalarda foydalanuvchiga xos narsa yo'q: CSRF tokeni base.html dan JS bilan qo'yiladi
+        page = context['page_obj']
+        books = list(context['books'])
+        # Kartochkadagi barcha rasmlar nusxalari bitta so'rovda
+        attach_renditions([*books, *(image for book in books for image in book.gallery)])
+        cards = render_to_string('books/book/_book_cards.html', {'books': books})
+        next_cursor = previous_cursor = None
+        if context['cursor_pagination']:
+            next_cursor, previous_cursor = page.next_cursor, page.previous_cursor
+        elif page is not None and page.has_next() and not self.search_query:
+            # Oddiy sahifadan ham "Yana ko'rsatish" keyset rejimida davom etadi
+            next_cursor = CursorPaginator.encode(books[-1], 'next')
+        return {
+            'cards': cards,
+            'has_books': bool(books),
+            'next_cursor': next_cursor,
+            'previous_cursor': previous_cursor,
+        }
+
+    def render_to_response(self, context, **response_kwargs):
+        # Cheksiz aylantirish: keyingi kartochkalar va kursor JSON ko'rinishida
+        if context['cursor_pagination'] and self.request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            return JsonResponse({
+                'html': context['cards_html'],
+                'next': context['next_cursor'],
+                'previous': context['previous_cursor'],
+            })
+        return super().render_to_response(context, **response_kwargs)
+
 class BookDetailView(DetailView):
     model = Book
     template_name = 'books/book/detail.html'
     context_object_name = 'book'
     slug_url_kwarg = 'slug'
 
+    def get(self, request, *args, **kwargs):
+        slug = kwargs.get(self.slug_url_kwarg)
+        # Katalog versiyasiga bog'lanmagan: fragment o'z kitobining versiyasi bilan tekshiriladi
+        key = fragment_key('book_detail', slug, version='book')
+        fragment = get_fragment(
+            'book_detail', key, is_current=lambda cached: cached['version'] == book_version(cached['book_id']),
+        )
+        if fragment is None:
+            self.object = self.get_object()
+            changed_at = self.changed_at(self.object)
+        else:
+            changed_at = fragment['changed_at']
+
+        # Validatorlar faqat shu kitob, kategoriyasi, rasm, video va tavsiyalari vaqtidan: boshqa
+        # kitoblar tahriri bu sahifaning ETag ini o'zgartirmaydi. 304 da shablon ishlamaydi.
+        # Til cookie da, URL bir xil: til almashganda eski tildagi sahifa 304 bilan qolmasin
+        last_modified = max(changed for changed in changed_at if changed is not None)
+        etag = make_etag(request, slug, catalog_language(), changed_at)
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            if fragment is None:
+                fragment = self.get_fragment(key, changed_at)
+            response = self.render_to_response({
+                'view': self,
+                'book_title': fragment['title'],
+                'detail_html': mark_safe(fragment['body']),
+            })
+        return set_validators(request, response, etag, last_modified)
+
+    @staticmethod
+    def changed_at(book):
+        return tuple(
+            changed.timestamp() if changed else None
+            for changed in (
+                book.updated_at, book.category.updated_at,
+                book.images_changed_at, book.videos_changed_at, book.related_changed_at,
+            )
+        )
+
+    def get_fragment(self, key, changed_at):
+        # Render'dan oldin o'qiladi: render paytidagi o'zgarish keyingi so'rovda qayta quradi
+        version = book_version(self.object.pk)
+        context = self.get_context_data(object=self.object)
+        fragment = {
+            'book_id': self.object.pk,
+            'version': version,
+            'changed_at': changed_at,
+            'title': self.object.title,
+            'body': render_to_string('books/book/_detail_body.html', context),
+        }
+        set_fragment(key, fragment)
+        return fragment
+
     def get_queryset(self):
-        return Book.objects.select_related('category')
+        # Last-Modified uchun rasm/videolar va tavsiyalarning oxirgi o'zgarishi shu so'rovning o'zida
+        related_changed_at = RelatedBook.objects.filter(book=OuterRef('pk')).order_by('-updated_at')
+        return Book.objects.select_related('category').annotate(
+            images_changed_at=latest_upload(BookImage),
+            videos_changed_at=latest_upload(BookVideo),
+            related_changed_at=Subquery(related_changed_at.values('updated_at')[:1]),
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        book = self.get_object()
-        
-        # Tegishli kitoblarni qo'shamiz
-        context['related_books'] = Book.objects.filter(
-            category=book.category
-        ).exclude(
-            id=book.id
-        )[:4]  # Bir xil kategoriyadan 4 ta kitob
-        
+        # Oldindan hisoblangan tavsiyalar: (book, -score) indeksi bo'yicha bitta so'rov
+        context['related_books'] = get_related_books(self.object)
+        context['gallery'] = list(self.object.images.order_by('uploaded_at', 'id'))
+        attach_renditions([self.object, *context['gallery']])
         return context
 
 class CategoryListView(ListView):
@@ -79,5 +216,13 @@ class CategoryListView(ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['total_books'] = Book.objects.count()
+        context['total_books'] = get_category_index()['total']
         return context
+
+@require_GET
+@cache_control(max_age=60)
+async def autocomplete_view(request):
+    query = request.GET.get('q', '').strip()
+    if len(query) < settings.AUTOCOMPLETE_MIN_LENGTH:
+        return JsonResponse({'titles': [], 'authors': []})
+    return JsonResponse(await aget_suggestions(query[:100], get_language()))
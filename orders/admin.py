@@ -1,7 +1,14 @@
-from django.contrib import admin
+import re
+
+from django.conf import settings
+from django.contrib import admin, messages
 from django.utils.html import format_html
 from django.urls import reverse
-from .models import Order, OrderItem, PaymentSettings
+from books.pagination import ApproximateCountPaginator
+from users.models import CustomUser
+from .exports import create_export_job, export_response
+from .models import ExportJob, Order, OrderItem, OrderStatusLog, PaymentSettings
+from .transitions import transition
 
 
 @admin.register(PaymentSettings)
@@ -17,16 +24,57 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ('book', 'quantity', 'price')
     can_delete = False
 
+class OrderStatusLogInline(admin.TabularInline):
+    model = OrderStatusLog
+    fields = ('created_at', 'from_status', 'to_status', 'changed_by')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+# "+998 90 123-45", "90123" kabi qidiruvlar telefon bo'lagi sifatida qaraladi
+PHONE_SEARCH_RE = re.compile(r'^\+?[\d\s()-]{3,}$')
+
+
+class PaymentScreenshotFilter(admin.SimpleListFilter):
+    # Maydon bo'yicha standart filtr barcha fayl nomlarini DISTINCT bilan o'qiydi;
+    # bu yerda faqat bor/yo'q, "bor" holati qisman indeksdan foydalanadi
+    title = "To'lov skrini"
+    parameter_name = 'screenshot'
+
+    def lookups(self, request, model_admin):
+        return (('yes', 'Bor'), ('no', "Yo'q"))
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.filter(payment_screenshot__gt='')
+        if self.value() == 'no':
+            return queryset.exclude(payment_screenshot__gt='')
+        return queryset
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'user_info', 'status_badge', 'total_amount', 'address', 'landmark',
         'payment_screenshot_icon', 'created_at', 'action_buttons'
     )
-    list_filter = ('status', 'created_at', 'payment_screenshot')
-    search_fields = ('user__phone', 'user__first_name', 'user__last_name', 'address', 'landmark')
-    inlines = [OrderItemInline]
-    date_hierarchy = 'created_at'
+    list_filter = ('status', 'created_at', PaymentScreenshotFilter)
+    list_select_related = ('user',)
+    # Telefon bo'yicha qidiruv get_search_results da alohida (user_phone_trgm indeksi)
+    search_fields = ('address', 'landmark', 'user__first_name', 'user__last_name')
+    search_help_text = "Manzil, mo'ljal, ism yoki telefon raqami; #123 — buyurtma raqami"
+    ordering = ('-created_at', '-id')
+    # Millionlab buyurtmada COUNT(*) o'rniga baho; umumiy son alohida sanalmaydi.
+    # date_hierarchy yo'q: u har safar barcha sanalarni DISTINCT bilan o'qiydi
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    inlines = [OrderItemInline, OrderStatusLogInline]
     readonly_fields = (
         'user', 'status', 'total_amount', 'address', 'landmark',
         'payment_screenshot_display', 'created_at', 'updated_at'
@@ -37,6 +85,9 @@ class OrderAdmin(admin.ModelAdmin):
         'mark_as_delivered',
         'mark_as_cancelled',
         'export_as_csv',
+        'export_items_as_csv',
+        'export_as_xlsx',
+        'export_items_as_xlsx',
     ]
     fieldsets = (
         ('Buyurtma maʼlumotlari', {
@@ -47,6 +98,16 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if term.startswith('#') and term[1:].isdigit():
+            return queryset.filter(pk=int(term[1:])), False
+        if PHONE_SEARCH_RE.match(term):
+            digits = re.sub(r'\D', '', term)
+            users = CustomUser.objects.filter(phone__icontains=digits).values('pk')
+            return queryset.filter(user__in=users), False
+        return super().get_search_results(request, queryset, search_term)
+
     def user_info(self, obj):
         return format_html(
             '<b>{}</b><br><span class="text-muted">{}</span>',
@@ -70,39 +131,40 @@ class OrderAdmin(admin.ModelAdmin):
 
     def payment_screenshot_icon(self, obj):
         if obj.payment_screenshot:
+            # Modal kichik nusxani ochadi, asl fayl faqat "katta" ko'rinishda
+            preview = obj.payment_screenshot_preview or obj.payment_screenshot
             return format_html(
                 '<a href="#" onclick="return showScreenshot(\'{}\')">'
                 '<i class="fas fa-image fa-lg text-success"></i>'
                 '</a>',
-                obj.payment_screenshot.url
+                preview.url
             )
         return format_html('<span class="text-muted">Yoʻq</span>')
     payment_screenshot_icon.short_description = "To'lov skrini"
 
     def payment_screenshot_display(self, obj):
         if obj.payment_screenshot:
-            return format_html('<img src="{}" width="300" />', obj.payment_screenshot.url)
+            preview = obj.payment_screenshot_preview or obj.payment_screenshot
+            return format_html(
+                '<a href="{}" target="_blank"><img src="{}" width="300" /></a>',
+                obj.payment_screenshot.url, preview.url
+            )
         return format_html('<span class="text-muted">Yoʻq</span>')
     payment_screenshot_display.short_description = "To'lov skrini (katta)"
 
     def action_buttons(self, obj):
+        # Tugmalar ro'yxat formasi ichida: formaction bilan uning CSRF tokeni POST qilinadi
+        button = '<button type="submit" formaction="{}" class="btn btn-{} btn-sm me-1">{}</button>'
         if obj.status == 'awaiting_confirmation':
             return format_html(
-                '<a href="{}" class="btn btn-success btn-sm me-1">Tasdiqlash</a>'
-                '<a href="{}" class="btn btn-danger btn-sm">Bekor qilish</a>',
-                reverse('orders:order_confirm', args=[obj.id]),
-                reverse('orders:order_cancel', args=[obj.id])
+                button + button,
+                reverse('orders:order_confirm', args=[obj.id]), 'success', 'Tasdiqlash',
+                reverse('orders:order_cancel', args=[obj.id]), 'danger', 'Bekor qilish',
             )
         elif obj.status == 'confirmed_preparing':
-            return format_html(
-                '<a href="{}" class="btn btn-info btn-sm">Yetkazib berishga tayyor</a>',
-                reverse('orders:order_awaiting_delivery', args=[obj.id])
-            )
+            return format_html(button, reverse('orders:order_awaiting_delivery', args=[obj.id]), 'info', 'Yetkazib berishga tayyor')
         elif obj.status == 'awaiting_delivery':
-            return format_html(
-                '<a href="{}" class="btn btn-primary btn-sm">Yetkazib berilgan</a>',
-                reverse('orders:order_delivered', args=[obj.id])
-            )
+            return format_html(button, reverse('orders:order_delivered', args=[obj.id]), 'primary', 'Yetkazib berilgan')
         elif obj.status == 'delivered':
             return format_html('<span class="badge bg-success">Yetkazib berilgan</span>')
         elif obj.status == 'cancelled':
@@ -110,47 +172,56 @@ class OrderAdmin(admin.ModelAdmin):
         return ''
     action_buttons.short_description = "Amallar"
 
+    def _transition(self, request, queryset, to_status, label):
+        # Bitta shartli UPDATE; ruxsat etilmagan holatdagilar o'zgarmaydi
+        selected = queryset.count()
+        updated = len(transition(queryset, to_status, request.user))
+        self.message_user(request, f"{updated} ta buyurtma '{label}' holatiga o'tkazildi.")
+        if updated < selected:
+            self.message_user(
+                request, f"{selected - updated} ta buyurtma holati bu o'tishga ruxsat bermaydi.", messages.WARNING,
+            )
+
     def mark_as_confirmed_preparing(self, request, queryset):
-        updated = queryset.update(status='confirmed_preparing')
-        self.message_user(request, f"{updated} ta buyurtma 'Tasdiqlangan, yetkazib berishga tayyorlanmoqda' holatiga o'tkazildi.")
+        self._transition(request, queryset, 'confirmed_preparing', 'Tasdiqlangan, yetkazib berishga tayyorlanmoqda')
     mark_as_confirmed_preparing.short_description = "Tasdiqlangan, yetkazib berishga tayyorlanmoqda"
 
     def mark_as_awaiting_delivery(self, request, queryset):
-        updated = queryset.update(status='awaiting_delivery')
-        self.message_user(request, f"{updated} ta buyurtma 'Yetkazib berilishi kutilmoqda' holatiga o'tkazildi.")
+        self._transition(request, queryset, 'awaiting_delivery', 'Yetkazib berilishi kutilmoqda')
     mark_as_awaiting_delivery.short_description = "Yetkazib berilishi kutilmoqda"
 
     def mark_as_delivered(self, request, queryset):
-        updated = queryset.update(status='delivered')
-        self.message_user(request, f"{updated} ta buyurtma 'Yetkazib berilgan' holatiga o'tkazildi.")
+        self._transition(request, queryset, 'delivered', 'Yetkazib berilgan')
     mark_as_delivered.short_description = "Yetkazib berilgan"
 
     def mark_as_cancelled(self, request, queryset):
-        updated = queryset.update(status='cancelled')
-        self.message_user(request, f"{updated} ta buyurtma 'Bekor qilindi' holatiga o'tkazildi.")
+        self._transition(request, queryset, 'cancelled', 'Bekor qilindi')
     mark_as_cancelled.short_description = "Bekor qilish"
 
+    def _export(self, request, queryset, fmt, with_items=False):
+        # Katta tanlovlar so'rov ichida emas, export_worker buyrug'ida tayyorlanadi
+        if queryset.count() > settings.ORDER_EXPORT_ASYNC_THRESHOLD:
+            job = create_export_job(queryset, request.user, fmt, with_items)
+            self.message_user(request, f"Eksport #{job.pk} navbatga qo'yildi. Tayyor bo'lgach 'Eksportlar' bo'limidan yuklab oling.")
+            return None
+        return export_response(queryset, fmt, with_items)
+
     def export_as_csv(self, request, queryset):
-        import csv
-        from django.http import HttpResponse
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename=buyurtmalar.csv'
-        writer = csv.writer(response)
-        writer.writerow(['ID', 'Foydalanuvchi', 'Telefon', 'Holat', 'Jami summa', 'Manzil', "Mo'ljal", 'Yaratilgan'])
-        for order in queryset:
-            writer.writerow([
-                order.id,
-                order.user.first_name,
-                order.user.phone,
-                order.get_status_display(),
-                order.total_amount,
-                order.address,
-                order.landmark,
-                order.created_at.strftime('%Y-%m-%d %H:%M'),
-            ])
-        return response
+        return self._export(request, queryset, 'csv')
     export_as_csv.short_description = "Tanlanganlarni CSVga eksport qilish"
 
+    def export_items_as_csv(self, request, queryset):
+        return self._export(request, queryset, 'csv', with_items=True)
+    export_items_as_csv.short_description = "Tanlanganlarni kitoblari bilan CSVga eksport qilish"
+
+    def export_as_xlsx(self, request, queryset):
+        return self._export(request, queryset, 'xlsx')
+    export_as_xlsx.short_description = "Tanlanganlarni XLSXga eksport qilish"
+
+    def export_items_as_xlsx(self, request, queryset):
+        return self._export(request, queryset, 'xlsx', with_items=True)
+    export_items_as_xlsx.short_description = "Tanlanganlarni kitoblari bilan XLSXga eksport qilish"
+
     class Media:
         css = {
             'all': (
@@ -200,3 +271,27 @@ class OrderAdmin(admin.ModelAdmin):
             </script>
         """
         return super().changelist_view(request, extra_context=extra_context)
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'format', 'with_items', 'status', 'row_count', 'created_at', 'finished_at', 'download_link')
+    list_filter = ('status', 'format')
+    list_select_related = ('user',)
+    readonly_fields = (
+        'user', 'format', 'with_items', 'status', 'selected_count', 'row_count', 'file', 'error', 'created_at', 'finished_at',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def selected_count(self, obj):
+        # Tanlov o'zi emas, faqat soni: katta eksportda ro'yxat sahifaga sig'maydi
+        return obj.entries.count()
+    selected_count.short_description = "Tanlangan buyurtmalar"
+
+    def download_link(self, obj):
+        if obj.file:
+            return format_html('<a href="{}" class="btn btn-success btn-sm">Yuklab olish</a>', obj.file.url)
+        return format_html('<span class="text-muted">{}</span>', obj.get_status_display())
+    download_link.short_description = "Fayl"
@@ -1,69 +1,245 @@
-from decimal import Decimal
+import logging
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from django.utils.functional import cached_property
+
 from books.models import Book
-import logging
+from . import metrics
+from .models import CartLine, ShoppingCart
 
 logger = logging.getLogger(__name__)
 
+
 class Cart:
-    def __init__(self, request):
+    """
+    Savat bazada saqlanadi (ShoppingCart/CartLine). Sessiyada faqat mehmon savatining tokeni
+    turadi va u birinchi qo'shishda bir marta yoziladi: savatni o'qish sessiyani o'zgartirmaydi.
+    """
+
+    def __init__(self, request, user=None):
+        self.request = request
         self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
-        logger.debug(f"Cart initialized: {self.cart}")
+        if user is None:
+            user = getattr(request, 'user', None)
+        self.user = user if user is not None and user.is_authenticated else None
+        if self._needs_merge():
+            # Kirishdan oldingi (yoki eski formatdagi) savat foydalanuvchinikiga qo'shiladi
+            merge_session_cart(self.session, self.user)
+
+    @classmethod
+    async def aload(cls, request):
+        # ASGI view lar uchun. auser() sessiyani ham yuklaydi, keyingi o'qishlar xotiradan
+        cart = cls.__new__(cls)
+        cart.request = request
+        cart.session = request.session
+        user = await request.auser()
+        cart.user = user if user.is_authenticated else None
+        if cart._needs_merge():
+            await sync_to_async(merge_session_cart)(cart.session, cart.user)
+        return cart
+
+    def _needs_merge(self):
+        return self.user is not None and settings.CART_SESSION_ID in self.session
+
+    def _token(self):
+        token = self.session.get(settings.CART_SESSION_ID)
+        if isinstance(token, dict):
+            token = import_legacy_cart(self.session, token)
+        return token
+
+    async def _atoken(self):
+        token = self.session.get(settings.CART_SESSION_ID)
+        if isinstance(token, dict):
+            token = await sync_to_async(import_legacy_cart)(self.session, token)
+        return token
+
+    def _lines(self, token=None):
+        if self.user is not None:
+            return CartLine.objects.filter(cart__user=self.user)
+        token = token or self._token()
+        if not token:
+            return CartLine.objects.none()
+        return CartLine.objects.filter(cart__token=token, cart__user=None)
+
+    async def _alines(self):
+        if self.user is not None:
+            return self._lines()
+        return self._lines(await self._atoken())
+
+    def _store(self):
+        # Faqat yozishda: savat hali yo'q bo'lsa yaratiladi
+        if self.user is not None:
+            return ShoppingCart.objects.get_or_create(user=self.user)[0]
+        token = self._token()
+        store = ShoppingCart.objects.filter(token=token, user=None).first() if token else None
+        if store is None:
+            store = ShoppingCart.objects.create()
+            self.session[settings.CART_SESSION_ID] = str(store.token)
+        return store
+
+    async def _astore(self):
+        if self.user is not None:
+            return (await ShoppingCart.objects.aget_or_create(user=self.user))[0]
+        token = await self._atoken()
+        store = await ShoppingCart.objects.filter(token=token, user=None).afirst() if token else None
+        if store is None:
+            store = await ShoppingCart.objects.acreate()
+            self.session[settings.CART_SESSION_ID] = str(store.token)
+        return store
+
+    def _changed(self):
+        self.__dict__.pop('_quantities', None)
+        self.__dict__.pop('_items', None)
+        # CartCountCookieMiddleware javobga yangi sonni cookie sifatida yozadi
+        self.request.cart_count = len(self)
+
+    async def _achanged(self):
+        self.__dict__.pop('_quantities', None)
+        self.__dict__.pop('_items', None)
+        self.request.cart_count = await self.acount()
+
+    @cached_property
+    def _quantities(self):
+        return dict(self._lines().values_list('book_id', 'quantity'))
+
+    @cached_property
+    def _items(self):
+        items = []
+        for line in self._lines().select_related('book').order_by('pk'):
+            price = line.book.price
+            items.append({
+                'book': line.book,
+                'quantity': line.quantity,
+                'price': price,
+                'total_price': price * line.quantity,
+            })
+        return items
 
     def add(self, book, quantity=1, update_quantity=False):
-        book_id = str(book.id)
-        logger.debug(f"Adding book {book_id} with quantity {quantity}")
-        
-        if book_id not in self.cart:
-            self.cart[book_id] = {
-                'quantity': 0,
-                'price': str(book.price)
-            }
-        
+        store = self._store()
+        lines = CartLine.objects.filter(cart=store, book=book)
         if update_quantity:
-            self.cart[book_id]['quantity'] = quantity
-        else:
-            self.cart[book_id]['quantity'] += quantity
-            
-        logger.debug(f"Cart after adding: {self.cart}")
-        self.save()
-
-    def save(self):
-        logger.debug(f"Saving cart: {self.cart}")
-        self.session[settings.CART_SESSION_ID] = self.cart
-        self.session.modified = True
-        logger.debug(f"Session after save: {self.session.get(settings.CART_SESSION_ID)}")
+            CartLine.objects.update_or_create(cart=store, book=book, defaults={'quantity': quantity})
+        elif not lines.update(quantity=F('quantity') + quantity):
+            try:
+                with transaction.atomic():
+                    CartLine.objects.create(cart=store, book=book, quantity=quantity)
+            except IntegrityError:
+                # Parallel so'rov qatorni birinchi bo'lib yaratgan
+                lines.update(quantity=F('quantity') + quantity)
+        # Eskirgan mehmon savatlarini tozalash (clear_stale_carts) uchun
+        ShoppingCart.objects.filter(pk=store.pk).update(updated_at=timezone.now())
+        self._changed()
+        logger.debug("Savatga qo'shildi: savat=%s kitob=%s soni=%s", store.pk, book.pk, quantity)
+        metrics.record('add', size=self._size)
+
+    async def aadd(self, book, quantity=1):
+        # add() bilan bir xil; async ORM da tranzaksiya yo'q, autocommit da savepoint kerak emas
+        store = await self._astore()
+        lines = CartLine.objects.filter(cart=store, book=book)
+        if not await lines.aupdate(quantity=F('quantity') + quantity):
+            try:
+                await CartLine.objects.acreate(cart=store, book=book, quantity=quantity)
+            except IntegrityError:
+                await lines.aupdate(quantity=F('quantity') + quantity)
+        await ShoppingCart.objects.filter(pk=store.pk).aupdate(updated_at=timezone.now())
+        await self._achanged()
+        logger.debug("Savatga qo'shildi: savat=%s kitob=%s soni=%s", store.pk, book.pk, quantity)
+        await metrics.arecord('add', size=self._asize)
 
     def remove(self, book):
-        book_id = str(book.id)
-        if book_id in self.cart:
-            del self.cart[book_id]
-            self.save()
+        self._lines().filter(book=book).delete()
+        self._changed()
+        logger.debug("Savatdan olindi: kitob=%s", book.pk)
+        metrics.record('remove', size=self._size)
+
+    def _size(self):
+        # Turli kitoblar soni
+        return len(self._quantities)
+
+    async def _asize(self):
+        return await (await self._alines()).acount()
+
+    def clear(self):
+        self._lines().delete()
+        self._changed()
+
+    def quantities(self):
+        return dict(self._quantities)
 
     def __iter__(self):
-        book_ids = self.cart.keys()
-        logger.debug(f"Iterating cart with book_ids: {book_ids}")
-        books = Book.objects.filter(id__in=book_ids)
-        cart = self.cart.copy()
-        
-        for book in books:
-            cart[str(book.id)]['book'] = book
-            
-        for item in cart.values():
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+        return iter(self._items)
 
     def __len__(self):
-        return sum(item['quantity'] for item in self.cart.values())
+        return sum(self._quantities.values())
+
+    async def acount(self):
+        lines = await self._alines()
+        return (await lines.aaggregate(total=Sum('quantity')))['total'] or 0
 
     def get_total_price(self):
-        return sum(Decimal(item['price']) * item['quantity'] for item in self.cart.values())
+        return sum(item['total_price'] for item in self._items)
 
-    def clear(self):
-        del self.session[settings.CART_SESSION_ID]
-        self.session.modified = True 
\ No newline at end of file
+
+def _valid_quantities(quantities):
+    # Eski sessiya savatlarida o'chirilgan kitoblar bo'lishi mumkin
+    existing = set(Book.objects.filter(pk__in=quantities).values_list('pk', flat=True))
+    return {book_id: quantity for book_id, quantity in quantities.items() if book_id in existing and quantity > 0}
+
+
+def _legacy_quantities(data):
+    # Eski format: {"<book_id>": {"quantity": n, "price": "..."}}
+    quantities = {}
+    for book_id, item in data.items():
+        try:
+            quantities[int(book_id)] = int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return _valid_quantities(quantities)
+
+
+def import_legacy_cart(session, data):
+    # Sessiyadagi eski lug'at bazaga bir marta ko'chiriladi, o'rniga token yoziladi
+    quantities = _legacy_quantities(data)
+    if not quantities:
+        del session[settings.CART_SESSION_ID]
+        return None
+    store = ShoppingCart.objects.create()
+    CartLine.objects.bulk_create([
+        CartLine(cart=store, book_id=book_id, quantity=quantity) for book_id, quantity in quantities.items()
+    ])
+    session[settings.CART_SESSION_ID] = str(store.token)
+    return session[settings.CART_SESSION_ID]
+
+
+def merge_session_cart(session, user):
+    value = session.pop(settings.CART_SESSION_ID, None)
+    guest = None
+    if isinstance(value, dict):
+        quantities = _legacy_quantities(value)
+    elif value:
+        guest = ShoppingCart.objects.filter(token=value, user=None).first()
+        quantities = dict(guest.lines.values_list('book_id', 'quantity')) if guest else {}
+    else:
+        quantities = {}
+
+    if quantities:
+        with transaction.atomic():
+            store = ShoppingCart.objects.get_or_create(user=user)[0]
+            existing = dict(store.lines.filter(book_id__in=quantities).values_list('book_id', 'quantity'))
+            # Bitta INSERT ... ON CONFLICT: mavjud qatorlar soni qo'shib yangilanadi
+            CartLine.objects.bulk_create(
+                [
+                    CartLine(cart=store, book_id=book_id, quantity=quantity + existing.get(book_id, 0))
+                    for book_id, quantity in quantities.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['cart', 'book'],
+                update_fields=['quantity'],
+            )
+    if guest is not None:
+        guest.delete()
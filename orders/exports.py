@@ -0,0 +1,177 @@
+import csv
+import io
+import itertools
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import Max, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .models import ExportJob, ExportJobOrder, Order, OrderItem
+
+ORDER_HEADER = ['ID', 'Foydalanuvchi', 'Telefon', 'Holat', 'Jami summa', 'Manzil', "Mo'ljal", 'Yaratilgan']
+ITEM_HEADER = ['Kitob', 'Soni', 'Narxi']
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def _prepare(queryset, with_items):
+    queryset = queryset.select_related('user').only(
+        'id', 'status', 'total_amount', 'address', 'landmark', 'created_at', 'user__first_name', 'user__phone',
+    )
+    if with_items:
+        # iterator() bilan prefetch har bir chunk uchun bitta so'rov bajaradi
+        queryset = queryset.prefetch_related(Prefetch('items', queryset=OrderItem.objects.select_related('book')))
+    return queryset
+
+
+def _rows(order, with_items):
+    row = [
+        order.id,
+        order.user.first_name,
+        str(order.user.phone),
+        order.get_status_display(),
+        order.total_amount,
+        order.address,
+        order.landmark,
+        order.created_at.strftime('%Y-%m-%d %H:%M'),
+    ]
+    if not with_items:
+        yield row
+        return
+    items = order.items.all()
+    if not items:
+        yield row + ['', '', '']
+    for item in items:
+        yield row + [item.book.title, item.quantity, item.price]
+
+
+def order_rows(queryset, with_items=False):
+    # Server tomonidagi kursor: xotira buyurtmalar soniga emas, chunk_size ga bog'liq
+    yield ORDER_HEADER + (ITEM_HEADER if with_items else [])
+    for order in _prepare(queryset, with_items).iterator(chunk_size=settings.ORDER_EXPORT_CHUNK_SIZE):
+        yield from _rows(order, with_items)
+
+
+def job_rows(job):
+    # Har bir bo'lak alohida kichik so'rov: xotira ham, so'rov hajmi ham tanlov soniga bog'liq emas
+    yield ORDER_HEADER + (ITEM_HEADER if job.with_items else [])
+    last = job.entries.aggregate(last=Max('position'))['last'] or 0
+    size = settings.ORDER_EXPORT_CHUNK_SIZE
+    for start in range(0, last, size):
+        chunk = Order.objects.filter(
+            export_entries__job=job,
+            export_entries__position__gt=start,
+            export_entries__position__lte=start + size,
+        ).order_by('export_entries__position')
+        for order in _prepare(chunk, job.with_items):
+            yield from _rows(order, job.with_items)
+
+
+class _Echo:
+    # csv.writer uchun: yozilgan qatorni o'zi qaytaradi, bufer yo'q
+    def write(self, value):
+        return value
+
+
+def csv_chunks(rows):
+    writer = csv.writer(_Echo())
+    # BOM: Excel kirill va lotin harflarini to'g'ri ochadi
+    return itertools.chain(['\ufeff'], (writer.writerow(row) for row in rows))
+
+
+def write_xlsx(rows, fh):
+    from openpyxl import Workbook
+
+    # write_only: qatorlar diskka yoziladi, xotirada saqlanmaydi
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Buyurtmalar')
+    for row in rows:
+        sheet.append(row)
+    workbook.save(fh)
+
+
+def export_response(queryset, fmt, with_items=False):
+    filename = f"buyurtmalar{'-kitoblar' if with_items else ''}.{fmt}"
+    rows = order_rows(queryset, with_items)
+    if fmt == 'csv':
+        response = StreamingHttpResponse(csv_chunks(rows), content_type=CONTENT_TYPES['csv'])
+        response['Content-Disposition'] = f'attachment; filename={filename}'
+        return response
+    # ZIP oxirida yoziladi: fayl vaqtinchalik diskda yig'iladi va oqim bilan beriladi
+    fh = tempfile.TemporaryFile()
+    write_xlsx(rows, fh)
+    fh.seek(0)
+    return FileResponse(fh, as_attachment=True, filename=filename, content_type=CONTENT_TYPES['xlsx'])
+
+
+def create_export_job(queryset, user, fmt, with_items=False):
+    # Tanlov navbatga qo'yilgan paytdagi holati va tartibi bilan bazaning o'zida saqlanadi:
+    # id lar Python ga yuklanmaydi. Ifodali saralashlar tashlanadi
+    ordering = [field for field in queryset.query.order_by if isinstance(field, str)] or list(Order._meta.ordering)
+    selection = queryset.order_by().annotate(
+        export_position=Window(RowNumber(), order_by=[*ordering, 'pk']),
+    ).values_list('pk', 'export_position')
+    sql, params = selection.query.sql_with_params()
+    with transaction.atomic():
+        job = ExportJob.objects.create(user=user, format=fmt, with_items=with_items)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {ExportJobOrder._meta.db_table} (job_id, order_id, position) '
+                f'SELECT %s, selection.* FROM ({sql}) AS selection',
+                [job.pk, *params],
+            )
+    return job
+
+
+def claim_export_job():
+    with transaction.atomic():
+        job = (
+            ExportJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ExportJob.PENDING)
+            .order_by('created_at')
+            .first()
+        )
+        if job is not None:
+            job.status = ExportJob.RUNNING
+            job.save(update_fields=['status'])
+    return job
+
+
+def run_export_job(job):
+    counted = {'rows': 0}
+
+    def rows():
+        for row in job_rows(job):
+            counted['rows'] += 1
+            yield row
+
+    try:
+        with tempfile.TemporaryFile() as fh:
+            if job.format == 'csv':
+                text = io.TextIOWrapper(fh, encoding='utf-8', newline='')
+                text.writelines(csv_chunks(rows()))
+                text.flush()
+                text.detach()
+            else:
+                write_xlsx(rows(), fh)
+            fh.seek(0)
+            stamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+            job.file.save(f'buyurtmalar-{job.pk}-{stamp}.{job.format}', File(fh), save=False)
+    except Exception as e:
+        job.status = ExportJob.FAILED
+        job.error = str(e)
+    else:
+        job.status = ExportJob.DONE
+        job.row_count = counted['rows'] - 1  # sarlavha qatori hisobga olinmaydi
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'row_count', 'file', 'finished_at'])
+    # Tanlov faqat eksport davomida kerak
+    job.entries.all().delete()
+    return job
@@ -0,0 +1,54 @@
+from django.db.models import Case, F, Sum, Value, When
+
+from books.models import Book
+from .models import OrderItem
+
+
+class OutOfStock(ValueError):
+    def __init__(self, book_ids):
+        super().__init__(f"Zaxira yetarli emas: {sorted(book_ids)}")
+        self.book_ids = book_ids
+
+
+def _lock_books(book_ids):
+    # Har doim id tartibida qulflanadi: ikki kitobli parallel buyurtmalar deadlockga tushmaydi.
+    # Faqat stock o'zgaradi: NO KEY UPDATE kitobga ishora qiluvchi qatorlar qo'shilishini to'smaydi
+    return list(
+        Book.objects
+        .filter(pk__in=book_ids)
+        .order_by('pk')
+        .select_for_update(no_key=True)
+        .values_list('pk', 'price', 'stock')
+    )
+
+
+def _shift_stock(deltas):
+    # {kitob_id: +/- soni} bitta UPDATE bilan: stock = stock + CASE id WHEN ... END
+    if deltas:
+        Book.objects.filter(pk__in=deltas, stock__isnull=False).update(
+            stock=F('stock') + Case(*(When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()))
+        )
+
+
+def reserve(quantities):
+    """
+    Tranzaksiya ichida chaqiriladi. Kitoblarni qulflab {id: (narx, zaxiradan_ayirildimi)} qaytaradi;
+    birorta kitob yetmasa OutOfStock — hech narsa o'zgarmaydi.
+    """
+    rows = _lock_books(quantities)
+    short = [pk for pk, _, stock in rows if stock is not None and stock < quantities[pk]]
+    if short:
+        raise OutOfStock(short)
+    _shift_stock({pk: -quantities[pk] for pk, _, stock in rows if stock is not None})
+    return {pk: (price, stock is not None) for pk, price, stock in rows}
+
+
+def release(order_ids):
+    # Bekor qilingan buyurtmalar zaxirasini qaytaradi; har bir qator faqat bir marta
+    items = OrderItem.objects.filter(order_id__in=order_ids, reserved=True)
+    deltas = dict(items.order_by('book_id').values_list('book_id').annotate(total=Sum('quantity')))
+    if not deltas:
+        return
+    _lock_books(deltas)
+    _shift_stock(deltas)
+    items.update(reserved=False)
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.metrics import cart_metrics, reset_cart_metrics
+
+
+class Command(BaseCommand):
+    help = "Shows sampled cart counters (adds, removes, cart size histogram)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them')
+
+    def handle(self, *args, **options):
+        if not settings.CACHE_IS_SHARED:
+            raise CommandError("Savat hisoblagichlari uchun umumiy kesh kerak (REDIS_URL)")
+        metrics = cart_metrics()
+        self.stdout.write(f"tanlanma: {metrics['sample_rate']:.0%}")
+        for event, count in metrics['events'].items():
+            self.stdout.write(f"{event:>8}: ~{count}")
+        for bucket, count in metrics['size_histogram'].items():
+            self.stdout.write(f"{bucket:>8}: ~{count}")
+        if options['reset']:
+            reset_cart_metrics()
+            self.stdout.write(self.style.SUCCESS('Hisoblagichlar tozalandi'))
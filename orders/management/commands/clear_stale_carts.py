@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.models import ShoppingCart
+
+
+class Command(BaseCommand):
+    help = "Deletes guest carts that have not changed for STALE_CART_DAYS days"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Override STALE_CART_DAYS')
+
+    def handle(self, *args, **options):
+        days = options['days'] or settings.STALE_CART_DAYS
+        deleted, _ = (
+            ShoppingCart.objects
+            .filter(user=None, updated_at__lt=timezone.now() - timedelta(days=days))
+            .delete()
+        )
+        self.stdout.write(self.style.SUCCESS(f"{deleted} ta yozuv o'chirildi"))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from orders.exports import claim_export_job, run_export_job
+
+
+class Command(BaseCommand):
+    help = "Runs queued order exports (ExportJob) created from the admin for large selections"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the queue and exit instead of polling')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_export_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                # Uzoq ishlaydigan jarayon: uzilgan yoki eskirgan ulanishlarni yangilaymiz
+                close_old_connections()
+                continue
+            job = run_export_job(job)
+            if job.status == job.DONE:
+                self.stdout.write(self.style.SUCCESS(f"#{job.pk}: {job.row_count} qator, {job.file.name}"))
+            else:
+                self.stderr.write(f"#{job.pk}: {job.error}")
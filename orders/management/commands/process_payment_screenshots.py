@@ -0,0 +1,44 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from orders.models import Order
+from orders.screenshots import InvalidScreenshot, store_screenshot
+
+
+class Command(BaseCommand):
+    help = "Re-encodes existing payment screenshots into content-addressed files with previews"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-originals', action='store_true', help="Don't delete replaced files")
+
+    def handle(self, *args, **options):
+        orders = list(
+            Order.objects
+            .exclude(payment_screenshot='').exclude(payment_screenshot__isnull=True)
+            .filter(payment_screenshot_preview__in=['', None])
+            .only('pk', 'payment_screenshot', 'payment_screenshot_preview')
+        )
+        replaced, failed = set(), 0
+        for order in orders:
+            old_name = order.payment_screenshot.name
+            try:
+                with default_storage.open(old_name) as fh:
+                    order.payment_screenshot.name, order.payment_screenshot_preview.name = store_screenshot(fh)
+            except (OSError, InvalidScreenshot) as e:
+                failed += 1
+                self.stderr.write(f"#{order.pk}: {old_name} ({e})")
+                continue
+            if old_name != order.payment_screenshot.name:
+                replaced.add(old_name)
+
+        Order.objects.bulk_update(
+            [order for order in orders if order.payment_screenshot_preview],
+            ['payment_screenshot', 'payment_screenshot_preview'],
+            batch_size=500,
+        )
+        if not options['keep_originals']:
+            for name in replaced:
+                default_storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(orders) - failed} ta skrinshot qayta ishlandi, {len(replaced)} ta eski fayl, {failed} ta xato"
+        ))
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.models import Order
+from orders.transitions import transition
+
+
+class Command(BaseCommand):
+    help = "Cancels pending orders whose payment timed out and returns their reserved stock"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=None, help='Override ORDER_PAYMENT_TIMEOUT_MINUTES')
+
+    def handle(self, *args, **options):
+        minutes = options['minutes'] or settings.ORDER_PAYMENT_TIMEOUT_MINUTES
+        expired = Order.objects.filter(status='pending', created_at__lt=timezone.now() - timedelta(minutes=minutes))
+        cancelled = transition(expired, 'cancelled')
+        self.stdout.write(self.style.SUCCESS(f"{len(cancelled)} ta muddati o'tgan buyurtma bekor qilindi"))
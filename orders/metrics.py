@@ -0,0 +1,82 @@
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+
+COUNTER_KEY = 'orders:cart_metrics:{name}'
+EVENTS = ('add', 'remove')
+# Savatdagi kitoblar soni bo'yicha gistogramma: yuqori chegaralar, oxirgisi "dan ko'p"
+SIZE_BUCKETS = (1, 2, 3, 5, 10, 20)
+
+
+def _bucket(size):
+    for bound in SIZE_BUCKETS:
+        if size <= bound:
+            return f'le_{bound}'
+    return f'gt_{SIZE_BUCKETS[-1]}'
+
+
+def _bucket_names():
+    return [f'le_{bound}' for bound in SIZE_BUCKETS] + [f'gt_{SIZE_BUCKETS[-1]}']
+
+
+def _incr(name):
+    key = COUNTER_KEY.format(name=name)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Kalit add va incr orasida chiqarib yuborilgan
+        cache.set(key, 1, None)
+
+
+async def _aincr(name):
+    key = COUNTER_KEY.format(name=name)
+    await cache.aadd(key, 0, None)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aset(key, 1, None)
+
+
+def record(event, size=None):
+    """
+    Savat hodisasini CART_METRICS_SAMPLE_RATE ehtimol bilan hisobga oladi.
+    Hisoblagichlar faqat umumiy keshda yuritiladi: LocMem da ular jarayonlar bo'ylab bo'linib ketadi.
+    size — savat hajmini qaytaruvchi funksiya: faqat tanlangan hodisada chaqiriladi.
+    """
+    if not settings.CACHE_IS_SHARED or random.random() >= settings.CART_METRICS_SAMPLE_RATE:
+        return
+    _incr(event)
+    if size is not None:
+        _incr(f'size:{_bucket(size())}')
+
+
+async def arecord(event, size=None):
+    # record() ning async varianti: size — korutina funksiya
+    if not settings.CACHE_IS_SHARED or random.random() >= settings.CART_METRICS_SAMPLE_RATE:
+        return
+    await _aincr(event)
+    if size is not None:
+        await _aincr(f'size:{_bucket(await size())}')
+
+
+def cart_metrics():
+    # Tanlanma ulushiga bo'lingan taxminiy qiymatlar
+    names = list(EVENTS) + [f'size:{bucket}' for bucket in _bucket_names()]
+    values = cache.get_many([COUNTER_KEY.format(name=name) for name in names])
+    rate = settings.CART_METRICS_SAMPLE_RATE or 1
+
+    def estimate(name):
+        return round(values.get(COUNTER_KEY.format(name=name), 0) / rate)
+
+    return {
+        'events': {event: estimate(event) for event in EVENTS},
+        'size_histogram': {bucket: estimate(f'size:{bucket}') for bucket in _bucket_names()},
+        'sample_rate': settings.CART_METRICS_SAMPLE_RATE,
+    }
+
+
+def reset_cart_metrics():
+    names = list(EVENTS) + [f'size:{bucket}' for bucket in _bucket_names()]
+    cache.delete_many([COUNTER_KEY.format(name=name) for name in names])
@@ -0,0 +1,54 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .cart import Cart
+
+CART_COUNT_SALT = 'orders.cart_count'
+
+
+class CartCountCookieMiddleware:
+    """
+    Savatdagi kitoblar sonini imzolangan cookie da saqlaydi: base.html nishonchani undan
+    to'ldiradi, har bir sahifada cart_items_count ga alohida so'rov yuborilmaydi.
+    Cookie faqat son o'zgarganda yoziladi. ASGI da async zanjirni thread'ga o'tkazmaydi.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        current = request.get_signed_cookie(settings.CART_COUNT_COOKIE, default=None, salt=CART_COUNT_SALT)
+        count = getattr(request, 'cart_count', None)
+        if count is None and self.is_stale(request, current):
+            count = len(Cart(request))
+        self.set_cookie(response, current, count)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        current = request.get_signed_cookie(settings.CART_COUNT_COOKIE, default=None, salt=CART_COUNT_SALT)
+        count = getattr(request, 'cart_count', None)
+        if count is None and self.is_stale(request, current):
+            count = await (await Cart.aload(request)).acount()
+        self.set_cookie(response, current, count)
+        return response
+
+    def set_cookie(self, response, current, count):
+        if count is not None and str(count) != current:
+            response.set_signed_cookie(
+                settings.CART_COUNT_COOKIE, count, salt=CART_COUNT_SALT,
+                max_age=settings.SESSION_COOKIE_AGE, samesite='Lax', secure=settings.SESSION_COOKIE_SECURE,
+            )
+
+    def is_stale(self, request, current):
+        if getattr(request, 'cart_count_stale', False):
+            return True
+        # Sessiyasiz mehmonning savati yo'q: cookie siz ham son 0
+        return current is None and settings.SESSION_COOKIE_NAME in request.COOKIES
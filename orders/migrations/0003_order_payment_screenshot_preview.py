@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_order_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='payment_screenshot_preview',
+            field=models.ImageField(blank=True, null=True, upload_to='payment_screenshots/previews/', verbose_name="To'lov skrini (kichik)"),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_payment_screenshot_preview'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(choices=[('csv', 'CSV'), ('xlsx', 'XLSX')], max_length=4, verbose_name='Format')),
+                ('with_items', models.BooleanField(default=False, verbose_name='Kitoblar bilan')),
+                ('query', models.BinaryField(verbose_name="So'rov")),
+                ('status', models.CharField(choices=[('pending', 'Navbatda'), ('running', 'Bajarilmoqda'), ('done', 'Tayyor'), ('failed', 'Xato')], default='pending', max_length=10, verbose_name='Holat')),
+                ('row_count', models.PositiveIntegerField(default=0, verbose_name='Qatorlar soni')),
+                ('file', models.FileField(blank=True, upload_to='exports/', verbose_name='Fayl')),
+                ('error', models.TextField(blank=True, verbose_name='Xato')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='export_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Foydalanuvchi')),
+            ],
+            options={
+                'verbose_name': 'Eksport',
+                'verbose_name_plural': 'Eksportlar',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='export_job_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_order_created_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(choices=[('pending', 'Kutilmoqda'), ('awaiting_confirmation', 'Tasdiqlanishi kutilmoqda'), ('confirmed_preparing', 'Tasdiqlangan, yetkazib berishga tayyorlanmoqda'), ('awaiting_delivery', 'Yetkazib berilishi kutilmoqda'), ('delivered', 'Yetkazib berilgan'), ('cancelled', 'Bekor qilindi')], max_length=30, verbose_name='Oldingi holat')),
+                ('to_status', models.CharField(choices=[('pending', 'Kutilmoqda'), ('awaiting_confirmation', 'Tasdiqlanishi kutilmoqda'), ('confirmed_preparing', 'Tasdiqlangan, yetkazib berishga tayyorlanmoqda'), ('awaiting_delivery', 'Yetkazib berilishi kutilmoqda'), ('delivered', 'Yetkazib berilgan'), ('cancelled', 'Bekor qilindi')], max_length=30, verbose_name='Yangi holat')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name="Kim o'zgartirdi")),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_logs', to='orders.order', verbose_name='Buyurtma')),
+            ],
+            options={
+                'verbose_name': "Holat o'zgarishi",
+                'verbose_name_plural': "Holat o'zgarishlari",
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['order', '-created_at'], name='order_status_log_order_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_order_client_token_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='reserved',
+            field=models.BooleanField(default=False, verbose_name='Zaxiradan ayirilgan'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:42
+
+import pickle
+
+from django.db import migrations, models
+
+
+def convert_queued_jobs(apps, schema_editor):
+    # Navbatdagi vazifalarning pickle qilingan so'rovi hozirgi Django versiyasida
+    # oxirgi marta ochiladi va id lar ro'yxatiga aylantiriladi
+    from orders.models import Order
+
+    ExportJob = apps.get_model('orders', 'ExportJob')
+    for job in ExportJob.objects.filter(status__in=['pending', 'running']):
+        try:
+            queryset = Order.objects.all()
+            queryset.query = pickle.loads(bytes(job.query))
+            job.ordering = [field for field in queryset.query.order_by if isinstance(field, str)]
+            job.order_ids = list(queryset.order_by().values_list('pk', flat=True))
+        except Exception as e:
+            job.status = 'failed'
+            job.error = f"Eski formatdagi so'rov ochilmadi, eksportni qayta boshlang: {e}"
+        job.save(update_fields=['order_ids', 'ordering', 'status', 'error'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_shoppingcart_cartline_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='order_ids',
+            field=models.JSONField(default=list, verbose_name='Buyurtmalar'),
+        ),
+        migrations.AddField(
+            model_name='exportjob',
+            name='ordering',
+            field=models.JSONField(default=list, verbose_name='Saralash'),
+        ),
+        migrations.RunPython(convert_queued_jobs, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='exportjob',
+            name='query',
+        ),
+    ]
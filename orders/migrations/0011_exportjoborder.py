@@ -0,0 +1,64 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.expressions import RawSQL
+
+
+def move_selected_orders(apps, schema_editor):
+    # Navbatdagi vazifalarning id lar ro'yxati saqlangan tartibi bilan yangi jadvalga o'tkaziladi,
+    # ro'yxat bazadan chiqmaydi (jsonb_array_elements_text)
+    ExportJob = apps.get_model('orders', 'ExportJob')
+    ExportJobOrder = apps.get_model('orders', 'ExportJobOrder')
+    Order = apps.get_model('orders', 'Order')
+    for job in ExportJob.objects.filter(status__in=['pending', 'running']):
+        ids = RawSQL(
+            f'SELECT jsonb_array_elements_text(order_ids)::bigint FROM {ExportJob._meta.db_table} WHERE id = %s',
+            [job.pk],
+        )
+        selection = Order.objects.filter(pk__in=ids).annotate(
+            export_position=models.Window(models.functions.RowNumber(), order_by=[*job.ordering, 'pk']),
+        ).values_list('pk', 'export_position')
+        sql, params = selection.query.sql_with_params()
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {ExportJobOrder._meta.db_table} (job_id, order_id, position) '
+                f'SELECT %s, selection.* FROM ({sql}) AS selection',
+                [job.pk, *params],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_exportjob_order_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJobOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(verbose_name='Tartib')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='orders.exportjob', verbose_name='Eksport')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_entries', to='orders.order', verbose_name='Buyurtma')),
+            ],
+            options={
+                'verbose_name': 'Eksport buyurtmasi',
+                'verbose_name_plural': 'Eksport buyurtmalari',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='exportjoborder',
+            constraint=models.UniqueConstraint(fields=('job', 'position'), name='unique_export_job_position'),
+        ),
+        migrations.RunPython(move_selected_orders, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='exportjob',
+            name='order_ids',
+        ),
+        migrations.RemoveField(
+            model_name='exportjob',
+            name='ordering',
+        ),
+    ]
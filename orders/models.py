@@ -1,4 +1,12 @@
-from django.db import models
+import uuid
+
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.functions import Upper
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.translation.trans_null import gettext_lazy as _
 
 from users.models import CustomUser
@@ -29,31 +37,52 @@ class Order(models.Model):
     status = models.CharField(max_length=30, choices=STATUS_CHOICES, default='pending', verbose_name="Holat")
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Jami summa")
     payment_screenshot = models.ImageField(upload_to='payment_screenshots/', blank=True, null=True, verbose_name="To'lov skrini")
+    payment_screenshot_preview = models.ImageField(upload_to='payment_screenshots/previews/', blank=True, null=True, verbose_name="To'lov skrini (kichik)")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     address = models.CharField(max_length=255, verbose_name="Manzil")
     landmark = models.CharField(max_length=255, verbose_name="Mo'ljal")
+    # Formadagi bir martalik token: qayta yuborilgan forma yangi buyurtma yaratmaydi
+    client_token = models.UUIDField(null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name = _("Buyurtma")
         verbose_name_plural = _("Buyurtmalar")
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            # Admin ro'yxati: standart tartib, holat filtri va "skrin bor" filtri
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='order_status_created_idx'),
+            models.Index(
+                fields=['-created_at', '-id'], condition=Q(payment_screenshot__gt=''), name='order_with_screenshot_idx',
+            ),
+            # Admin qidiruvi: icontains → UPPER(...) LIKE, pg_trgm bilan indekslanadi
+            GinIndex(OpClass(Upper('address'), name='gin_trgm_ops'), name='order_address_trgm'),
+            GinIndex(OpClass(Upper('landmark'), name='gin_trgm_ops'), name='order_landmark_trgm'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'client_token'], name='order_user_client_token_uniq'),
+        ]
 
     def __str__(self):
         return f"{_('Buyurtma')} #{self.id} - {self.user.get_full_name()}"
 
     @property
     def card_number(self):
-        try:
-            return PaymentSettings.objects.filter(is_active=True).first().card_number
-        except:
-            return "Karta raqami kiritilmagan"
+        from .registry import get_payment_settings
+
+        # So'rovsiz: faol sozlama jarayon xotirasi va keshdan olinadi
+        payment_settings = get_payment_settings()
+        return payment_settings.card_number if payment_settings else "Karta raqami kiritilmagan"
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items', verbose_name="Buyurtma")
     book = models.ForeignKey(Book, on_delete=models.CASCADE, verbose_name="Kitob")
     quantity = models.PositiveIntegerField(default=1, verbose_name="Soni")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Narxi")
+    # Kitob zaxirasidan ayirilgan (bekor qilinganda qaytariladi)
+    reserved = models.BooleanField(default=False, verbose_name="Zaxiradan ayirilgan")
 
     class Meta:
         verbose_name = _("Buyurtma elementi")
@@ -61,3 +90,130 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.book.title} x {self.quantity}"
+
+class ShoppingCart(models.Model):
+    # Foydalanuvchi savati user bo'yicha, mehmonniki sessiyadagi token bo'yicha topiladi
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, null=True, blank=True, related_name='shopping_cart', verbose_name="Foydalanuvchi")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Savat")
+        verbose_name_plural = _("Savatlar")
+        indexes = [
+            models.Index(fields=['updated_at'], name='shopping_cart_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{_('Savat')} #{self.id}"
+
+class CartLine(models.Model):
+    cart = models.ForeignKey(ShoppingCart, on_delete=models.CASCADE, related_name='lines', verbose_name="Savat")
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, verbose_name="Kitob")
+    quantity = models.PositiveIntegerField(default=1, verbose_name="Soni")
+
+    class Meta:
+        verbose_name = _("Savat qatori")
+        verbose_name_plural = _("Savat qatorlari")
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'book'], name='cart_line_unique_book'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} x {self.quantity}"
+
+class OrderStatusLog(models.Model):
+    # Faqat qo'shiladi (orders.transitions), tahrirlanmaydi va o'chirilmaydi
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_logs', verbose_name="Buyurtma")
+    from_status = models.CharField(max_length=30, choices=Order.STATUS_CHOICES, verbose_name="Oldingi holat")
+    to_status = models.CharField(max_length=30, choices=Order.STATUS_CHOICES, verbose_name="Yangi holat")
+    changed_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Kim o'zgartirdi")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Holat o'zgarishi")
+        verbose_name_plural = _("Holat o'zgarishlari")
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['order', '-created_at'], name='order_status_log_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.order_id}: {self.from_status} → {self.to_status}"
+
+class ExportJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Navbatda'),
+        (RUNNING, 'Bajarilmoqda'),
+        (DONE, 'Tayyor'),
+        (FAILED, 'Xato'),
+    ]
+    FORMAT_CHOICES = [('csv', 'CSV'), ('xlsx', 'XLSX')]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, related_name='export_jobs', verbose_name="Foydalanuvchi")
+    format = models.CharField(max_length=4, choices=FORMAT_CHOICES, verbose_name="Format")
+    with_items = models.BooleanField(default=False, verbose_name="Kitoblar bilan")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name="Holat")
+    row_count = models.PositiveIntegerField(default=0, verbose_name="Qatorlar soni")
+    file = models.FileField(upload_to='exports/', blank=True, verbose_name="Fayl")
+    error = models.TextField(blank=True, verbose_name="Xato")
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Eksport")
+        verbose_name_plural = _("Eksportlar")
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='export_job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{_('Eksport')} #{self.id} ({self.format})"
+
+
+class ExportJobOrder(models.Model):
+    # Navbatga qo'yilgan paytdagi tanlov va uning tartibi (position): bazada INSERT ... SELECT
+    # bilan yoziladi, export_worker position oralig'i bo'yicha bo'laklab o'qiydi
+    job = models.ForeignKey(ExportJob, on_delete=models.CASCADE, related_name='entries', verbose_name="Eksport")
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='export_entries', verbose_name="Buyurtma")
+    position = models.PositiveIntegerField(verbose_name="Tartib")
+
+    class Meta:
+        verbose_name = _("Eksport buyurtmasi")
+        verbose_name_plural = _("Eksport buyurtmalari")
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'position'], name='unique_export_job_position'),
+        ]
+
+    def __str__(self):
+        return f"#{self.job_id}: {self.order_id}"
+
+
+@receiver(post_save, sender=PaymentSettings)
+@receiver(post_delete, sender=PaymentSettings)
+def refresh_payment_settings(sender, instance, **kwargs):
+    from .registry import invalidate_payment_settings
+
+    transaction.on_commit(invalidate_payment_settings)
+
+
+@receiver(user_logged_in)
+def merge_session_cart(sender, request, user, **kwargs):
+    from .cart import merge_session_cart
+
+    if request is not None and hasattr(request, 'session'):
+        merge_session_cart(request.session, user)
+        # Birlashgan savat soni javobda qayta hisoblanadi (CartCountCookieMiddleware)
+        request.cart_count_stale = True
+
+
+@receiver(user_logged_out)
+def reset_cart_count(sender, request, **kwargs):
+    if request is not None:
+        request.cart_count = 0
@@ -0,0 +1,48 @@
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import PaymentSettings
+
+CACHE_KEY = 'orders:payment_settings'
+
+# Jarayon xotirasi: so'rov boshiga umumiy keshga ham bormaslik uchun.
+# Boshqa jarayonlar o'zgarishni PAYMENT_SETTINGS_LOCAL_TIMEOUT soniya ichida ko'radi
+_local = {'value': None, 'expires': 0.0}
+
+
+@dataclass(frozen=True)
+class ActivePaymentSettings:
+    card_number: str
+
+
+def _load():
+    row = PaymentSettings.objects.filter(is_active=True).order_by('pk').values('card_number').first()
+    return ActivePaymentSettings(**row) if row else None
+
+
+def _cache_timeout():
+    # Jarayon ichidagi keshda uzoq TTL boshqa ishchilarda eski karta raqamini qoldiradi
+    if settings.CACHE_IS_SHARED:
+        return settings.PAYMENT_SETTINGS_CACHE_TIMEOUT
+    return settings.PAYMENT_SETTINGS_LOCAL_TIMEOUT
+
+
+def get_payment_settings() -> ActivePaymentSettings | None:
+    now = time.monotonic()
+    if now < _local['expires']:
+        return _local['value']
+    # Ro'yxatga o'ralgan: faol sozlama yo'qligi (None) ham keshlanadi
+    entry = cache.get(CACHE_KEY)
+    if entry is None:
+        entry = [_load()]
+        cache.set(CACHE_KEY, entry, _cache_timeout())
+    _local.update(value=entry[0], expires=now + settings.PAYMENT_SETTINGS_LOCAL_TIMEOUT)
+    return entry[0]
+
+
+def invalidate_payment_settings():
+    _local['expires'] = 0.0
+    cache.delete(CACHE_KEY)
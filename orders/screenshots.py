@@ -0,0 +1,72 @@
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+class InvalidScreenshot(ValueError):
+    pass
+
+
+def _read(uploaded):
+    uploaded.seek(0)
+    data = uploaded.read()
+    uploaded.seek(0)
+    return data
+
+
+def _open(data, max_size):
+    try:
+        image = Image.open(io.BytesIO(data))
+        # JPEG larni dekodlashda darhol kichraytirish: 4K rasmda xotira va vaqt tejaladi
+        image.draft('RGB', max_size)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise InvalidScreenshot(str(e)) from e
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # Shaffof PNG skrinshotlar oq fon ustiga
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def _encode(image, max_size, quality):
+    image = image.copy()
+    image.thumbnail(max_size, Image.LANCZOS)
+    buffer = io.BytesIO()
+    # exif berilmaydi: metama'lumotlar (GPS, qurilma) saqlanmaydi
+    image.save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def store_screenshot(uploaded):
+    """Skrinshotni kichraytirib, JPEG ga o'tkazib, hash bo'yicha saqlaydi.
+
+    Bir xil fayl ikkinchi marta yuklansa qayta ishlanmaydi va o'sha fayl
+    ishlatiladi. (asosiy fayl nomi, preview nomi) qaytaradi.
+    """
+    data = _read(uploaded)
+    digest = hashlib.sha256(data).hexdigest()
+    name = f'payment_screenshots/{digest[:2]}/{digest}.jpg'
+    preview_name = f'payment_screenshots/previews/{digest[:2]}/{digest}.jpg'
+    if default_storage.exists(name) and default_storage.exists(preview_name):
+        return name, preview_name
+
+    image = _open(data, settings.PAYMENT_SCREENSHOT_MAX_SIZE)
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(
+            _encode(image, settings.PAYMENT_SCREENSHOT_MAX_SIZE, settings.PAYMENT_SCREENSHOT_QUALITY)
+        ))
+    if not default_storage.exists(preview_name):
+        default_storage.save(preview_name, ContentFile(
+            _encode(image, settings.PAYMENT_SCREENSHOT_PREVIEW_SIZE, settings.PAYMENT_SCREENSHOT_PREVIEW_QUALITY)
+        ))
+    return name, preview_name
@@ -0,0 +1,60 @@
+from django.db import IntegrityError, transaction
+
+from books.recommendations import schedule_refresh
+from .inventory import reserve
+from .models import Order, OrderItem
+
+
+class EmptyCart(ValueError):
+    pass
+
+
+def place_order(user, quantities, address, landmark, client_token=None):
+    """
+    Savatdagi {book_id: soni} dan buyurtma yaratadi va (order, created) qaytaradi.
+    Narxlar bazadan olinadi; buyurtma, barcha qatorlari va zaxira kamayishi bitta tranzaksiyada.
+    Zaxira yetmasa orders.inventory.OutOfStock.
+    Bir xil client_token bilan qayta chaqirilsa avvalgi buyurtma qaytariladi.
+    """
+    if client_token:
+        existing = Order.objects.filter(user=user, client_token=client_token).first()
+        if existing is not None:
+            return existing, False
+
+    quantities = {book_id: quantity for book_id, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        raise EmptyCart
+
+    with transaction.atomic():
+        books = reserve(quantities)
+        if not books:
+            raise EmptyCart
+        items = [
+            OrderItem(book_id=book_id, quantity=quantities[book_id], price=price, reserved=reserved)
+            for book_id, (price, reserved) in books.items()
+        ]
+        try:
+            # Savepoint: parallel ikkinchi yuborish unique cheklovga uriladi
+            with transaction.atomic():
+                order = Order.objects.create(
+                    user=user,
+                    total_amount=sum(item.price * item.quantity for item in items),
+                    address=address,
+                    landmark=landmark,
+                    client_token=client_token,
+                )
+        except IntegrityError:
+            if not client_token:
+                raise
+            # Zaxiradan ayirilgani ham bekor bo'ladi
+            transaction.set_rollback(True)
+            order = None
+        else:
+            for item in items:
+                item.order = order
+            OrderItem.objects.bulk_create(items)
+            # bulk_create post_save yubormaydi: "birga sotib olingan" tavsiyalari shu yerda navbatga qo'yiladi
+            schedule_refresh(books)
+    if order is None:
+        return Order.objects.get(user=user, client_token=client_token), False
+    return order, True
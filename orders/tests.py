@@ -1,6 +1,38 @@
-from django.test import TestCase
+import csv
+import io
+import logging
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth import get_user_model
-from .models import Order
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.urls import reverse
+from openpyxl import load_workbook
+from PIL import Image
+
+from books.models import Book, Category
+from books.pagination import ApproximateCountPaginator
+from .exports import create_export_job, export_response, job_rows
+from .models import CartLine, ExportJob, Order, OrderItem, OrderStatusLog, PaymentSettings, ShoppingCart
+from .registry import get_payment_settings, invalidate_payment_settings
+from root.log import QueueStreamHandler
+from .inventory import OutOfStock
+from .metrics import cart_metrics
+from .services import EmptyCart, place_order
+from .transitions import InvalidTransition, transition, transition_order
 
 # Create your tests here.
 
@@ -10,3 +42,609 @@ class OrderModelTest(TestCase):
         order = Order.objects.create(user=user, total_amount=10000, address='Toshkent, Chilonzor', landmark='Chilonzor metro')
         self.assertEqual(order.address, 'Toshkent, Chilonzor')
         self.assertEqual(order.landmark, 'Chilonzor metro')
+
+
+class CartCountConditionalTest(TestCase):
+    def test_cart_count_not_modified(self):
+        url = reverse('orders:cart_items_count')
+        response = self.client.get(url)
+        self.assertEqual(response.json(), {'count': 0})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+def make_upload(name='photo_15.png', size=(3840, 2160), fmt='PNG', **save_kwargs):
+    buffer = io.BytesIO()
+    Image.new('RGBA' if fmt == 'PNG' else 'RGB', size, (30, 120, 200, 255) if fmt == 'PNG' else 'navy').save(
+        buffer, format=fmt, **save_kwargs
+    )
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class PaymentScreenshotTest(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.user = get_user_model().objects.create_user(phone='+998901234567', password='testpass')
+        self.client.force_login(self.user)
+
+    def upload(self, file):
+        order = Order.objects.create(user=self.user, total_amount=10000, address='Toshkent', landmark='Chorsu')
+        self.client.post(reverse('orders:payment_process'), {'payment_screenshot': file})
+        order.refresh_from_db()
+        return order
+
+    def test_screenshot_is_downsized_and_stripped(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Telefon'  # Make
+        order = self.upload(make_upload('photo.jpg', fmt='JPEG', exif=exif.tobytes()))
+        self.assertEqual(order.status, 'awaiting_confirmation')
+        with Image.open(order.payment_screenshot.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertLessEqual(max(image.size), 1600)
+            self.assertNotIn('exif', image.info)
+        with Image.open(order.payment_screenshot_preview.path) as preview:
+            self.assertLessEqual(max(preview.size), 800)
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.upload(make_upload())
+        second = self.upload(make_upload('photo_15_jmJFVsI.png'))
+        self.assertEqual(first.payment_screenshot.name, second.payment_screenshot.name)
+        self.assertEqual(len(default_storage.listdir(Path(first.payment_screenshot.name).parent)[1]), 1)
+
+    def test_non_image_is_rejected(self):
+        order = self.upload(SimpleUploadedFile('chek.pdf', b'%PDF-1.4 not an image'))
+        self.assertEqual(order.status, 'pending')
+        self.assertFalse(order.payment_screenshot)
+
+
+class OrderExportTest(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.admin = get_user_model().objects.create_superuser(phone='+998900000000', password='testpass')
+        self.client.force_login(self.admin)
+        category = Category.objects.create(name='Roman', slug='roman')
+        self.book = Book.objects.create(
+            title='Kecha va kunduz', author="Cho'lpon", category=category, price=40000,
+            description='Roman', cover_type='hard', pages=320, image='books/test.jpg', slug='kecha-va-kunduz',
+        )
+
+    def create_orders(self, count):
+        user = get_user_model().objects.create_user(phone=f'+99890123{count:04d}', password='testpass', first_name='Ali')
+        for i in range(count):
+            order = Order.objects.create(user=user, total_amount=80000, address='Toshkent', landmark='Chorsu')
+            OrderItem.objects.create(order=order, book=self.book, quantity=2, price=40000)
+
+    def export(self, action):
+        return self.client.post(reverse('admin:orders_order_changelist'), {
+            'action': action,
+            '_selected_action': list(Order.objects.values_list('pk', flat=True)),
+        })
+
+    def read_csv(self, response):
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        return list(csv.reader(io.StringIO(content[1:])))
+
+    def test_csv_is_streamed(self):
+        self.create_orders(3)
+        response = self.export('export_as_csv')
+        self.assertTrue(response.streaming)
+        rows = self.read_csv(response)
+        self.assertEqual(rows[0][0], 'ID')
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][1], 'Ali')
+
+    def test_items_csv_has_row_per_item(self):
+        self.create_orders(2)
+        rows = self.read_csv(self.export('export_items_as_csv'))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1][-3:], ['Kecha va kunduz', '2', '40000.00'])
+
+    def test_query_count_does_not_grow_with_orders(self):
+        self.create_orders(5)
+        # Buyurtmalar + ularning kitoblari: chunk boshiga 2 ta so'rov
+        with self.assertNumQueries(2):
+            list(export_response(Order.objects.all(), 'csv', with_items=True).streaming_content)
+        self.create_orders(10)
+        with self.assertNumQueries(2):
+            list(export_response(Order.objects.all(), 'csv', with_items=True).streaming_content)
+
+    def test_xlsx_export(self):
+        self.create_orders(2)
+        response = self.export('export_as_xlsx')
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        rows = list(workbook.active.values)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0][0], 'ID')
+
+    @override_settings(ORDER_EXPORT_ASYNC_THRESHOLD=2)
+    def test_large_selection_is_queued_for_worker(self):
+        self.create_orders(3)
+        response = self.export('export_items_as_csv')
+        self.assertEqual(response.status_code, 302)
+        job = ExportJob.objects.get()
+        self.assertEqual(job.status, ExportJob.PENDING)
+        # Tanlov changelist tartibida (-created_at) saqlanadi
+        self.assertEqual(
+            list(job.entries.order_by('position').values_list('order_id', flat=True)),
+            list(Order.objects.order_by('-created_at', '-pk').values_list('pk', flat=True)),
+        )
+        # Navbatga qo'yilgandan keyingi buyurtmalar eksportga tushmaydi
+        self.create_orders(1)
+
+        call_command('export_worker', once=True, stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.DONE)
+        self.assertEqual(job.row_count, 3)
+        self.assertFalse(job.entries.exists())
+        with job.file.open('rb') as fh:
+            self.assertEqual(len(fh.read().decode('utf-8-sig').splitlines()), 4)
+
+    def test_job_change_page_shows_selection_count(self):
+        self.create_orders(3)
+        job = create_export_job(Order.objects.all(), None, 'csv')
+        response = self.client.get(reverse('admin:orders_exportjob_change', args=[job.pk]))
+        self.assertContains(response, 'Tanlangan buyurtmalar')
+        self.assertNotContains(response, '<textarea')
+
+    @override_settings(ORDER_EXPORT_ASYNC_THRESHOLD=2, ORDER_EXPORT_CHUNK_SIZE=2)
+    def test_worker_reads_selection_in_chunks(self):
+        self.create_orders(5)
+        job = create_export_job(Order.objects.order_by('pk'), None, 'csv', with_items=True)
+        # Bo'lak boshiga: buyurtmalar + kitoblari; oldidan oxirgi position
+        with self.assertNumQueries(1 + 3 * 2):
+            rows = list(job_rows(job))
+        self.assertEqual([row[0] for row in rows[1:]], list(Order.objects.order_by('pk').values_list('pk', flat=True)))
+
+
+class OrderChangelistTest(TestCase):
+    def setUp(self):
+        admin = get_user_model().objects.create_superuser(phone='+998900000000', password='testpass')
+        self.client.force_login(admin)
+        self.url = reverse('admin:orders_order_changelist')
+
+    def create_orders(self, count, phone='+998901234567', **kwargs):
+        user = get_user_model().objects.create_user(phone=phone, password='testpass', first_name='Ali')
+        for i in range(count):
+            Order.objects.create(user=user, total_amount=10000, address='Toshkent, Yunusobod', landmark='Bozor', **kwargs)
+
+    def changelist(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_budget_does_not_grow_with_rows(self):
+        self.create_orders(3)
+        self.changelist()
+        with CaptureQueriesContext(connection) as small:
+            self.changelist()
+        self.create_orders(20, phone='+998907654321')
+        with CaptureQueriesContext(connection) as large:
+            self.changelist()
+        self.assertEqual(len(small), len(large))
+        self.assertFalse(any('DISTINCT' in query['sql'] for query in large))
+
+    def test_search_by_phone_fragment_and_address(self):
+        self.create_orders(2)
+        self.create_orders(1, phone='+998935550000')
+        self.assertEqual(self.changelist(q='90 123').context['cl'].result_count, 2)
+        self.assertEqual(self.changelist(q='yunusobod').context['cl'].result_count, 3)
+        order = Order.objects.first()
+        self.assertEqual(list(self.changelist(q=f'#{order.pk}').context['cl'].result_list), [order])
+
+    def test_screenshot_filter(self):
+        self.create_orders(2)
+        self.create_orders(1, phone='+998935550000', payment_screenshot='payment_screenshots/ab/chek.jpg')
+        self.assertEqual(self.changelist(screenshot='yes').context['cl'].result_count, 1)
+        self.assertEqual(self.changelist(screenshot='no').context['cl'].result_count, 2)
+
+    def test_paginator_uses_estimate_for_large_results(self):
+        self.create_orders(3)
+        with override_settings(APPROXIMATE_COUNT_THRESHOLD=10**9):
+            self.assertEqual(ApproximateCountPaginator(Order.objects.all(), 10).count, 3)
+        with override_settings(APPROXIMATE_COUNT_THRESHOLD=0), CaptureQueriesContext(connection) as queries:
+            ApproximateCountPaginator(Order.objects.all(), 10).count
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0]['sql'].startswith('EXPLAIN'))
+
+
+class OrderTransitionTest(TestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_superuser(phone='+998900000000', password='testpass')
+        self.customer = get_user_model().objects.create_user(phone='+998901234567', password='testpass')
+
+    def create_orders(self, count, status):
+        return [
+            Order.objects.create(user=self.customer, total_amount=10000, address='Toshkent', landmark='Chorsu', status=status)
+            for _ in range(count)
+        ]
+
+    def test_bulk_transition_skips_illegal_sources(self):
+        waiting = self.create_orders(3, 'awaiting_confirmation')
+        self.create_orders(2, 'delivered')
+        ids = transition(Order.objects.all(), 'confirmed_preparing', self.staff)
+        self.assertEqual(sorted(ids), sorted(order.pk for order in waiting))
+        self.assertEqual(Order.objects.filter(status='confirmed_preparing').count(), 3)
+        self.assertEqual(Order.objects.filter(status='delivered').count(), 2)
+        logs = OrderStatusLog.objects.all()
+        self.assertEqual(len(logs), 3)
+        self.assertTrue(all(log.from_status == 'awaiting_confirmation' and log.changed_by == self.staff for log in logs))
+
+    def test_statement_count_does_not_grow_with_selection(self):
+        self.create_orders(2, 'awaiting_delivery')
+        with CaptureQueriesContext(connection) as small:
+            transition(Order.objects.all(), 'delivered')
+        self.create_orders(50, 'awaiting_delivery')
+        with CaptureQueriesContext(connection) as large:
+            transition(Order.objects.all(), 'delivered')
+        self.assertEqual(len(small), len(large))
+
+    def test_single_order_transition(self):
+        order, = self.create_orders(1, 'delivered')
+        with self.assertRaises(InvalidTransition):
+            transition_order(order, 'cancelled')
+        with self.assertRaises(InvalidTransition):
+            transition(Order.objects.all(), 'pending')
+
+    def test_staff_buttons_post_only(self):
+        order, = self.create_orders(1, 'awaiting_confirmation')
+        self.client.force_login(self.staff)
+        url = reverse('orders:order_confirm', args=[order.pk])
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.client.post(url)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'confirmed_preparing')
+        # Ikkinchi bosish holatni o'zgartirmaydi va log yozmaydi
+        self.client.post(reverse('orders:order_awaiting_delivery', args=[order.pk]))
+        self.client.post(reverse('orders:order_cancel', args=[order.pk]))
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'awaiting_delivery')
+        self.assertEqual(order.status_logs.count(), 2)
+
+    def test_admin_action_uses_transitions(self):
+        self.create_orders(2, 'awaiting_delivery')
+        self.create_orders(1, 'pending')
+        self.client.force_login(self.staff)
+        self.client.post(reverse('admin:orders_order_changelist'), {
+            'action': 'mark_as_delivered',
+            '_selected_action': list(Order.objects.values_list('pk', flat=True)),
+        })
+        self.assertEqual(Order.objects.filter(status='delivered').count(), 2)
+        self.assertEqual(Order.objects.filter(status='pending').count(), 1)
+
+
+class PlaceOrderTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(phone='+998901234567', password='testpass')
+        category = Category.objects.create(name='Roman', slug='roman')
+        self.books = [
+            Book.objects.create(
+                title=f'Kitob {i}', author='Muallif', category=category, price=10000 * (i + 1),
+                description='Tavsif', cover_type='soft', pages=100, image='books/test.jpg', slug=f'kitob-{i}',
+            )
+            for i in range(30)
+        ]
+
+    def test_items_are_repriced_and_inserted_in_bulk(self):
+        quantities = {book.pk: 2 for book in self.books}
+        with CaptureQueriesContext(connection) as queries:
+            order, created = place_order(self.user, quantities, 'Toshkent', 'Chorsu')
+        self.assertTrue(created)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "orders_orderitem"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(order.items.count(), 30)
+        self.assertEqual(order.total_amount, sum(book.price * 2 for book in self.books))
+
+    def test_same_client_token_returns_existing_order(self):
+        token = uuid.uuid4()
+        first, created = place_order(self.user, {self.books[0].pk: 1}, 'Toshkent', 'Chorsu', token)
+        second, created_again = place_order(self.user, {}, 'Toshkent', 'Chorsu', token)
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(first, second)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_empty_cart(self):
+        with self.assertRaises(EmptyCart):
+            place_order(self.user, {}, 'Toshkent', 'Chorsu')
+        self.assertFalse(Order.objects.exists())
+
+    def test_double_submit_through_view(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('orders:cart_add', args=[self.books[0].pk]), {'quantity': 3})
+        form = self.client.get(reverse('orders:order_create')).context['form']
+        data = {'address': 'Toshkent', 'landmark': 'Chorsu', 'client_token': form.initial['client_token']}
+        for _ in range(2):
+            response = self.client.post(reverse('orders:order_create'), data)
+            self.assertRedirects(response, reverse('orders:payment_process'), fetch_redirect_response=False)
+        order = Order.objects.get()
+        self.assertEqual(order.total_amount, self.books[0].price * 3)
+
+
+def make_book(slug, stock=None, price=10000):
+    category, _ = Category.objects.get_or_create(slug='roman', defaults={'name': 'Roman'})
+    return Book.objects.create(
+        title=slug, author='Muallif', category=category, price=price, description='Tavsif',
+        cover_type='soft', pages=100, image='books/test.jpg', slug=slug, stock=stock,
+    )
+
+
+class StockReservationTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(phone='+998901234567', password='testpass')
+
+    def test_checkout_reserves_and_cancel_releases(self):
+        book = make_book('zaxira', stock=5)
+        unlimited = make_book('cheklovsiz')
+        order, _ = place_order(self.user, {book.pk: 3, unlimited.pk: 10}, 'Toshkent', 'Chorsu')
+        book.refresh_from_db()
+        unlimited.refresh_from_db()
+        self.assertEqual(book.stock, 2)
+        self.assertIsNone(unlimited.stock)
+
+        with self.assertRaises(OutOfStock):
+            place_order(self.user, {book.pk: 3, unlimited.pk: 1}, 'Toshkent', 'Chorsu')
+        self.assertEqual(Order.objects.count(), 1)
+
+        transition(Order.objects.filter(pk=order.pk), 'cancelled')
+        transition(Order.objects.filter(pk=order.pk), 'cancelled')  # ikkinchi marta qaytarilmaydi
+        book.refresh_from_db()
+        self.assertEqual(book.stock, 5)
+
+    def test_expired_pending_orders_are_released(self):
+        book = make_book('zaxira', stock=1)
+        order, _ = place_order(self.user, {book.pk: 1}, 'Toshkent', 'Chorsu')
+        Order.objects.filter(pk=order.pk).update(created_at=order.created_at - timedelta(hours=2))
+        call_command('release_expired_orders', stdout=io.StringIO())
+        order.refresh_from_db()
+        book.refresh_from_db()
+        self.assertEqual(order.status, 'cancelled')
+        self.assertEqual(book.stock, 1)
+
+
+class StockContentionTest(TransactionTestCase):
+    # Haqiqiy parallel tranzaksiyalar: har bir oqim o'z ulanishida
+    checkouts = 200
+    workers = 16
+
+    def test_parallel_checkouts_do_not_oversell_or_deadlock(self):
+        user = get_user_model().objects.create_user(phone='+998901234567', password='testpass')
+        first, second = make_book('aksiya-1', stock=50), make_book('aksiya-2', stock=50)
+
+        def checkout(i):
+            # Qatorlar har xil tartibda: qulflash tartibi baribir bir xil bo'lishi kerak
+            quantities = {first.pk: 1, second.pk: 1} if i % 2 else {second.pk: 1, first.pk: 1}
+            try:
+                place_order(user, quantities, 'Toshkent', 'Chorsu')
+                return 'ok'
+            except OutOfStock:
+                return 'out'
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(checkout, range(self.checkouts)))
+
+        self.assertEqual(results.count('ok'), 50)
+        self.assertEqual(results.count('out'), self.checkouts - 50)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.stock, second.stock), (0, 0))
+        self.assertEqual(OrderItem.objects.filter(book=first).count(), 50)
+
+
+class PaymentSettingsRegistryTest(TestCase):
+    def setUp(self):
+        invalidate_payment_settings()
+        self.addCleanup(invalidate_payment_settings)
+        self.user = get_user_model().objects.create_user(phone='+998901234567', password='testpass')
+
+    def test_active_settings_are_loaded_once(self):
+        PaymentSettings.objects.create(card_number='8600 1234 5678 9012')
+        orders = [
+            Order.objects.create(user=self.user, total_amount=10000, address='Toshkent', landmark='Chorsu')
+            for _ in range(5)
+        ]
+        with self.assertNumQueries(1):
+            numbers = {order.card_number for order in orders}
+        self.assertEqual(numbers, {'8600 1234 5678 9012'})
+        with self.assertNumQueries(0):
+            self.assertEqual(get_payment_settings().card_number, '8600 1234 5678 9012')
+
+    def test_save_and_delete_invalidate(self):
+        order = Order.objects.create(user=self.user, total_amount=10000, address='Toshkent', landmark='Chorsu')
+        self.assertEqual(order.card_number, 'Karta raqami kiritilmagan')
+        with self.captureOnCommitCallbacks(execute=True):
+            payment_settings = PaymentSettings.objects.create(card_number='9860 0000 0000 0001')
+        self.assertEqual(order.card_number, '9860 0000 0000 0001')
+        with self.captureOnCommitCallbacks(execute=True):
+            payment_settings.delete()
+        self.assertIsNone(get_payment_settings())
+
+    def test_long_ttl_needs_shared_cache(self):
+        for shared, timeout in ((False, 30), (True, 60 * 60 * 24)):
+            invalidate_payment_settings()
+            with override_settings(CACHE_IS_SHARED=shared), mock.patch.object(cache, 'set') as cache_set:
+                get_payment_settings()
+            self.assertEqual(cache_set.call_args.args[2], timeout)
+
+
+class CartStoreTest(TestCase):
+    def setUp(self):
+        self.book = make_book('savat-1')
+        self.other = make_book('savat-2')
+
+    def add(self, book, quantity=1):
+        return self.client.post(reverse('orders:cart_add', args=[book.pk]), {'quantity': quantity})
+
+    def test_browsing_does_not_write_sessions(self):
+        self.client.get(reverse('orders:cart_detail'))
+        self.client.get(reverse('orders:cart_items_count'))
+        self.assertFalse(Session.objects.exists())
+
+    def test_add_writes_token_once_and_lines_in_table(self):
+        self.add(self.book, 2)
+        session_data = Session.objects.get().get_decoded()
+        self.add(self.book, 3)
+        self.add(self.other)
+        self.assertEqual(Session.objects.get().get_decoded(), session_data)
+        self.assertEqual(session_data['cart'], str(ShoppingCart.objects.get().token))
+        self.assertEqual(
+            dict(CartLine.objects.values_list('book_id', 'quantity')), {self.book.pk: 5, self.other.pk: 1},
+        )
+        self.assertEqual(self.client.get(reverse('orders:cart_items_count')).json(), {'count': 6})
+
+    def test_guest_cart_merges_on_login(self):
+        user = get_user_model().objects.create_user(phone='+998901234567', password='testpass')
+        ShoppingCart.objects.create(user=user).lines.create(book=self.book, quantity=1)
+        self.add(self.book, 2)
+        self.add(self.other)
+        self.client.login(phone='+998901234567', password='testpass')
+        self.assertEqual(ShoppingCart.objects.count(), 1)
+        self.assertEqual(
+            dict(user.shopping_cart.lines.values_list('book_id', 'quantity')), {self.book.pk: 3, self.other.pk: 1},
+        )
+        response = self.client.get(reverse('orders:cart_detail'))
+        self.assertEqual(response.context['total'], self.book.price * 3 + self.other.price)
+
+    def test_legacy_session_cart_is_imported(self):
+        session = self.client.session
+        session['cart'] = {str(self.book.pk): {'quantity': 2, 'price': '1.00'}, '999999': {'quantity': 1, 'price': '1'}}
+        session.save()
+        self.assertEqual(self.client.get(reverse('orders:cart_items_count')).json(), {'count': 2})
+        self.assertEqual(self.client.session['cart'], str(ShoppingCart.objects.get().token))
+
+
+@override_settings(CART_METRICS_SAMPLE_RATE=1.0, CACHE_IS_SHARED=True)
+class CartInstrumentationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.books = [make_book(f'metrika-{i}') for i in range(3)]
+
+    def test_adds_removes_and_size_histogram(self):
+        for book in self.books:
+            self.client.post(reverse('orders:cart_add', args=[book.pk]))
+        self.client.post(reverse('orders:cart_remove', args=[self.books[0].pk]))
+        metrics = cart_metrics()
+        self.assertEqual(metrics['events'], {'add': 3, 'remove': 1})
+        self.assertEqual(metrics['size_histogram']['le_1'], 1)
+        self.assertEqual(metrics['size_histogram']['le_2'], 2)
+        self.assertEqual(metrics['size_histogram']['le_3'], 1)
+
+    @override_settings(CART_METRICS_SAMPLE_RATE=0.0)
+    def test_unsampled_events_cost_nothing(self):
+        self.client.post(reverse('orders:cart_add', args=[self.books[0].pk]))
+        self.assertEqual(cart_metrics()['events'], {'add': 0, 'remove': 0})
+
+    def test_queue_handler_writes_from_listener_thread(self):
+        stream = io.StringIO()
+        handler = QueueStreamHandler(stream)
+        logger = logging.getLogger('orders.tests.queue')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        logger.warning("savat=%s", 7)
+        handler.close()
+        self.assertEqual(stream.getvalue(), 'savat=7\n')
+
+    def test_formatter_runs_in_listener_thread(self):
+        threads = []
+
+        class RecordingFormatter(logging.Formatter):
+            def format(self, record):
+                threads.append(threading.current_thread())
+                return super().format(record)
+
+        stream = io.StringIO()
+        handler = QueueStreamHandler(stream)
+        handler.setFormatter(RecordingFormatter('%(levelname)s %(message)s'))
+        logger = logging.getLogger('orders.tests.queue_format')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        items = ['a']
+        logger.warning("savat=%s", items)
+        items.append('b')
+        handler.close()
+        self.assertEqual(stream.getvalue(), "WARNING savat=['a']\n")
+        self.assertNotIn(threading.current_thread(), threads)
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_metrics_need_shared_cache(self):
+        self.client.post(reverse('orders:cart_add', args=[self.books[0].pk]))
+        self.assertEqual(cart_metrics()['events'], {'add': 0, 'remove': 0})
+        with self.assertRaises(CommandError):
+            call_command('cart_metrics', stdout=io.StringIO())
+
+
+class CartCountCookieTest(TestCase):
+    def setUp(self):
+        self.book = make_book('nishoncha')
+
+    def badge(self):
+        cookie = self.client.cookies.get('cart_count')
+        return cookie.value.split(':')[0] if cookie else None
+
+    def test_pages_render_without_count_request(self):
+        response = self.client.get(reverse('orders:cart_detail'))
+        self.assertNotContains(response, reverse('orders:cart_items_count'))
+        self.assertNotIn('cart_count', response.cookies)
+
+    def test_cookie_follows_cart_changes(self):
+        response = self.client.post(
+            reverse('orders:cart_add', args=[self.book.pk]), {'quantity': 2}, HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(self.badge(), '2')
+        # Son o'zgarmagan so'rovlarda cookie qayta yozilmaydi
+        self.assertNotIn('cart_count', self.client.get(reverse('orders:cart_detail')).cookies)
+        self.client.post(reverse('orders:cart_remove', args=[self.book.pk]))
+        self.assertEqual(self.badge(), '0')
+
+    def test_tampered_cookie_is_recomputed(self):
+        self.client.post(reverse('orders:cart_add', args=[self.book.pk]))
+        self.client.cookies['cart_count'] = '99'
+        self.client.get(reverse('orders:cart_detail'))
+        self.assertEqual(self.badge(), '1')
+
+    def test_login_and_logout_refresh_count(self):
+        user = get_user_model().objects.create_user(phone='+998901234567', password='testpass')
+        ShoppingCart.objects.create(user=user).lines.create(book=self.book, quantity=4)
+        self.client.post(reverse('orders:cart_add', args=[self.book.pk]))
+        self.client.post(reverse('users:login'), {'phone': '+998901234567', 'password': 'testpass'})
+        self.assertEqual(self.badge(), '5')
+        self.client.post(reverse('users:logout'))
+        self.assertEqual(self.badge(), '0')
+
+    def test_count_endpoint_etag(self):
+        self.client.post(reverse('orders:cart_add', args=[self.book.pk]))
+        url = reverse('orders:cart_items_count')
+        response = self.client.get(url)
+        self.assertEqual(response.json(), {'count': 1})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+class AsyncCartEndpointTest(TestCase):
+    def setUp(self):
+        self.book = make_book('async-savat')
+
+    async def test_ajax_add_and_count_through_async_views(self):
+        url = reverse('orders:cart_add', args=[self.book.pk])
+        response = await self.async_client.post(url, {'quantity': 2}, headers={'x-requested-with': 'XMLHttpRequest'})
+        self.assertEqual(response.json()['count'], 2)
+        response = await self.async_client.post(url, headers={'x-requested-with': 'XMLHttpRequest'})
+        self.assertEqual(response.json()['count'], 3)
+        self.assertEqual(response.cookies['cart_count'].value.split(':')[0], '3')
+        self.assertEqual((await CartLine.objects.aget(book=self.book)).quantity, 3)
+
+        count_url = reverse('orders:cart_items_count')
+        response = await self.async_client.get(count_url)
+        self.assertEqual(response.json(), {'count': 3})
+        response = await self.async_client.get(count_url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_missing_book_is_404(self):
+        response = await self.async_client.post(reverse('orders:cart_add', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .inventory import release
+from .models import Order, OrderStatusLog
+
+# Ruxsat etilgan o'tishlar: holat → keyingi holatlar
+TRANSITIONS = {
+    'pending': ('awaiting_confirmation', 'cancelled'),
+    'awaiting_confirmation': ('confirmed_preparing', 'cancelled'),
+    'confirmed_preparing': ('awaiting_delivery', 'cancelled'),
+    'awaiting_delivery': ('delivered',),
+    'delivered': (),
+    'cancelled': (),
+}
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, ())
+
+
+def sources(to_status):
+    return [status for status, targets in TRANSITIONS.items() if to_status in targets]
+
+
+def transition(queryset, to_status, user=None):
+    """
+    Tanlangan buyurtmalardan to_status ga o'ta oladiganlarini bitta UPDATE bilan o'tkazadi.
+    O'tkazilgan buyurtmalar id lari qaytariladi; qolganlari (noto'g'ri holatdagilar) tegilmaydi.
+    """
+    allowed = sources(to_status)
+    if not allowed:
+        raise InvalidTransition(to_status)
+
+    with transaction.atomic():
+        # Qatorlar id tartibida qulflanadi: parallel o'tishlar bir-birini kutadi, deadlock bo'lmaydi
+        rows = list(
+            Order.objects
+            .filter(pk__in=queryset.values('pk'), status__in=allowed)
+            .order_by('pk')
+            .select_for_update()
+            .values_list('pk', 'status')
+        )
+        if not rows:
+            return []
+        ids = [pk for pk, _ in rows]
+        # Shartli yangilash: UPDATE ... WHERE status IN (<oldingi holatlar>)
+        Order.objects.filter(pk__in=ids, status__in=allowed).update(status=to_status, updated_at=timezone.now())
+        OrderStatusLog.objects.bulk_create(
+            [
+                OrderStatusLog(order_id=pk, from_status=from_status, to_status=to_status, changed_by=user)
+                for pk, from_status in rows
+            ],
+            batch_size=1000,
+        )
+        if to_status == 'cancelled':
+            release(ids)
+    return ids
+
+
+def transition_order(order, to_status, user=None):
+    # Bitta buyurtma uchun: o'tish bo'lmasa InvalidTransition
+    if not transition(Order.objects.filter(pk=order.pk), to_status, user):
+        raise InvalidTransition(f"#{order.pk}: {order.status} → {to_status}")
+    order.status = to_status
+    return order
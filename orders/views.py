@@ -1,29 +1,38 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib import messages
 from django.views.generic import View, ListView, DetailView, TemplateView
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from books.models import Book
-from .models import Order, OrderItem, PaymentSettings
+from books.pagination import CursorPaginationMixin
+from .models import Order
 from .cart import Cart
+from .screenshots import InvalidScreenshot, store_screenshot
+from .inventory import OutOfStock
+from .registry import get_payment_settings
+from .services import EmptyCart, place_order
+from .transitions import InvalidTransition, transition_order
 from django.urls import reverse_lazy, reverse
 import logging
+import uuid
 from django import forms
+from django.db import transaction
 from django.http import JsonResponse
 logger = logging.getLogger(__name__)
 from django.views.decorators.http import require_GET
-from django.utils.decorators import method_decorator
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 
 @require_GET
-def cart_items_count_view(request):
-    cart_data = request.session.get('cart', {})
-    total_count = sum(item.get('quantity', 0) for item in cart_data.values())
-    return JsonResponse({'count': total_count})
-
-
-def get_cart(request):
-    cart = request.session.get('cart', {})
-    return cart
+async def cart_items_count_view(request):
+    # Nishonchani so'rov bilan yangilovchi mijozlar uchun: ETag/304 bilan
+    cart = await Cart.aload(request)
+    request.cart_count = await cart.acount()
+    etag = quote_etag(f'cart-{request.cart_count}')
+    response = get_conditional_response(request, etag=etag) or JsonResponse({'count': request.cart_count})
+    response.headers['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 class CartDetailView(TemplateView):
     template_name = 'orders/cart/detail.html'
@@ -31,16 +40,15 @@ class CartDetailView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         cart = Cart(self.request)
-        logger.debug(f"Cart in detail view: {cart.cart}")
         context['cart_items'] = cart
         context['total'] = cart.get_total_price()
         return context
 
 
 class CartAddView(View):
-    def post(self, request, book_id):
-        cart = Cart(request)
-        book = get_object_or_404(Book, id=book_id)
+    async def post(self, request, book_id):
+        cart = await Cart.aload(request)
+        book = await aget_object_or_404(Book, id=book_id)
 
         try:
             quantity = int(request.POST.get('quantity', 1))
@@ -49,13 +57,14 @@ class CartAddView(View):
         except (ValueError, TypeError):
             quantity = 1
 
-        cart.add(book=book, quantity=quantity, update_quantity=False)
+        await cart.aadd(book=book, quantity=quantity)
 
         # AJAX so‘rov bo‘lsa JSON qaytaramiz
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
             return JsonResponse({
                 'message': f'"{book.title}" savatga qo‘shildi.',
-                'book_id': book.id
+                'book_id': book.id,
+                'count': request.cart_count,
             })
 
         # Oddiy POST bo‘lsa redirect
@@ -74,6 +83,7 @@ class CartRemoveView(View):
 class OrderCreateForm(forms.Form):
     address = forms.CharField(label="Manzil", max_length=255, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Manzil (ko\'cha, uy)'}))
     landmark = forms.CharField(label="Mo'ljal", max_length=255, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': "Mo'ljal (yaqin joy)"}))
+    client_token = forms.UUIDField(required=False, widget=forms.HiddenInput)
 
 class OrderCreateView(LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
@@ -81,54 +91,46 @@ class OrderCreateView(LoginRequiredMixin, View):
         if len(cart) == 0:
             messages.error(request, 'Sizning savatingiz bo\'sh.')
             return redirect('books:book_list')
-        form = OrderCreateForm()
+        form = OrderCreateForm(initial={'client_token': uuid.uuid4()})
         return render(request, 'orders/order/create.html', {'form': form, 'cart_items': cart, 'total': cart.get_total_price()})
 
     def post(self, request, *args, **kwargs):
         cart = Cart(request)
-        if len(cart) == 0:
-            messages.error(request, 'Sizning savatingiz bo\'sh.')
-            return redirect('books:book_list')
         form = OrderCreateForm(request.POST)
         if form.is_valid():
-            total_amount = cart.get_total_price()
-            order = Order.objects.create(
-                user=request.user,
-                total_amount=total_amount,
-                address=form.cleaned_data['address'],
-                landmark=form.cleaned_data['landmark']
-            )
-            for item in cart:
-                OrderItem.objects.create(
-                    order=order,
-                    book=item['book'],
-                    price=item['price'],
-                    quantity=item['quantity']
+            try:
+                # Savat ikkinchi yuborishda bo'sh bo'lishi mumkin: token avval tekshiriladi
+                order, created = place_order(
+                    request.user,
+                    cart.quantities(),
+                    form.cleaned_data['address'],
+                    form.cleaned_data['landmark'],
+                    form.cleaned_data['client_token'],
                 )
-            cart.clear()
+            except EmptyCart:
+                messages.error(request, 'Sizning savatingiz bo\'sh.')
+                return redirect('books:book_list')
+            except OutOfStock as e:
+                titles = ', '.join(Book.objects.filter(pk__in=e.book_ids).values_list('title', flat=True))
+                messages.error(request, f"Omborda yetarli emas: {titles}. Savatni o'zgartiring.")
+                return redirect('orders:cart_detail')
+            if created:
+                cart.clear()
+                messages.success(request, 'Buyurtma muvaffaqiyatli yaratildi. Endi to\'lovni amalga oshiring.')
             request.session['order_id'] = order.id
-            messages.success(request, 'Buyurtma muvaffaqiyatli yaratildi. Endi to\'lovni amalga oshiring.')
             return redirect(reverse('orders:payment_process'))
+        if len(cart) == 0:
+            messages.error(request, 'Sizning savatingiz bo\'sh.')
+            return redirect('books:book_list')
         return render(request, 'orders/order/create.html', {'form': form, 'cart_items': cart, 'total': cart.get_total_price()})
 
-    def form_valid(self, form):
-        order = form.save(commit=False)
-        order.user = self.request.user
-        order.save()
-
-        # Savatchani tozalamang
-        # self.request.session['cart'] = {}
-
-        messages.success(self.request, "Buyurtma muvaffaqiyatli yaratildi!")
-        return redirect('orders:payment')
-
 class PaymentProcessView(LoginRequiredMixin, View):
     template_name = 'orders/payment.html'
 
     def get(self, request):
         try:
             order = Order.objects.filter(user=request.user, status='pending').latest('created_at')
-            payment_settings = PaymentSettings.objects.filter(is_active=True).first()
+            payment_settings = get_payment_settings()
             
             if not payment_settings:
                 messages.error(request, "To'lov ma'lumotlari topilmadi. Iltimos, administrator bilan bog'laning.")
@@ -155,9 +157,14 @@ class PaymentProcessView(LoginRequiredMixin, View):
                 messages.error(request, "To'lov skrini yuklanmadi.")
                 return redirect('orders:payment_process')
             
-            order.payment_screenshot = payment_screenshot
-            order.status = 'awaiting_confirmation'
-            order.save()
+            try:
+                order.payment_screenshot.name, order.payment_screenshot_preview.name = store_screenshot(payment_screenshot)
+            except InvalidScreenshot:
+                messages.error(request, "Yuklangan fayl rasm emas.")
+                return redirect('orders:payment_process')
+            with transaction.atomic():
+                order.save(update_fields=['payment_screenshot', 'payment_screenshot_preview', 'updated_at'])
+                transition_order(order, 'awaiting_confirmation', request.user)
             
             messages.success(request, "To'lov skrini muvaffaqiyatli yuklandi. Buyurtmangiz tekshirilmoqda.")
             return redirect('orders:order_history')
@@ -168,7 +175,7 @@ class PaymentProcessView(LoginRequiredMixin, View):
             messages.error(request, f"Xatolik yuz berdi: {str(e)}")
             return redirect('orders:cart_detail')
 
-class OrderHistoryView(LoginRequiredMixin, ListView):
+class OrderHistoryView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     template_name = 'orders/order/history.html'
     context_object_name = 'orders'
     paginate_by = 10
@@ -186,50 +193,36 @@ class OrderDetailView(LoginRequiredMixin, DetailView):
     def get_queryset(self):
         return Order.objects.filter(user=self.request.user).prefetch_related('items__book')
 
-class OrderConfirmView(LoginRequiredMixin, UserPassesTestMixin, View):
-    def test_func(self):
-        return self.request.user.is_staff
+class OrderTransitionView(LoginRequiredMixin, UserPassesTestMixin, View):
+    # Admin ro'yxatidagi tugmalar: POST, holat orders.transitions orqali o'zgaradi
+    to_status = None
+    success_message = ''
 
-    def get(self, request, pk):
-        order = get_object_or_404(Order, pk=pk)
-        if order.status == 'awaiting_confirmation':
-            order.status = 'confirmed_preparing'
-            order.save()
-            messages.success(request, f'Buyurtma #{order.id} tasdiqlandi.')
-        return redirect('admin:orders_order_changelist')
-
-class OrderCancelView(LoginRequiredMixin, UserPassesTestMixin, View):
     def test_func(self):
         return self.request.user.is_staff
 
-    def get(self, request, pk):
-        order = get_object_or_404(Order, pk=pk)
-        if order.status == 'awaiting_confirmation':
-            order.status = 'cancelled'
-            order.save()
-            messages.success(request, f'Buyurtma #{order.id} bekor qilindi.')
+    def post(self, request, pk):
+        order = get_object_or_404(Order.objects.only('pk', 'status'), pk=pk)
+        try:
+            transition_order(order, self.to_status, request.user)
+        except InvalidTransition:
+            messages.error(request, f"Buyurtma #{order.id} holatini o'zgartirib bo'lmaydi ({order.get_status_display()}).")
+        else:
+            messages.success(request, self.success_message.format(id=order.id))
         return redirect('admin:orders_order_changelist')
 
-class OrderSetAwaitingDeliveryView(LoginRequiredMixin, UserPassesTestMixin, View):
-    def test_func(self):
-        return self.request.user.is_staff
+class OrderConfirmView(OrderTransitionView):
+    to_status = 'confirmed_preparing'
+    success_message = 'Buyurtma #{id} tasdiqlandi.'
 
-    def get(self, request, pk):
-        order = get_object_or_404(Order, pk=pk)
-        if order.status == 'confirmed_preparing':
-            order.status = 'awaiting_delivery'
-            order.save()
-            messages.success(request, f'Buyurtma #{order.id} yetkazib berishga tayyor deb belgilandi.')
-        return redirect('admin:orders_order_changelist')
+class OrderCancelView(OrderTransitionView):
+    to_status = 'cancelled'
+    success_message = 'Buyurtma #{id} bekor qilindi.'
 
-class OrderSetDeliveredView(LoginRequiredMixin, UserPassesTestMixin, View):
-    def test_func(self):
-        return self.request.user.is_staff
+class OrderSetAwaitingDeliveryView(OrderTransitionView):
+    to_status = 'awaiting_delivery'
+    success_message = 'Buyurtma #{id} yetkazib berishga tayyor deb belgilandi.'
 
-    def get(self, request, pk):
-        order = get_object_or_404(Order, pk=pk)
-        if order.status == 'awaiting_delivery':
-            order.status = 'delivered'
-            order.save()
-            messages.success(request, f'Buyurtma #{order.id} yetkazib berilgan deb belgilandi.')
-        return redirect('admin:orders_order_changelist')
+class OrderSetDeliveredView(OrderTransitionView):
+    to_status = 'delivered'
+    success_message = 'Buyurtma #{id} yetkazib berilgan deb belgilandi.'
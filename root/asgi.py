@@ -11,6 +11,9 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Kitoblarda_2.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'root.settings')
+# Async view lar ORM ni har so'rovda yangi oqimda chaqiradi: doimiy ulanishlar qayta
+# ishlatilmaydi, faqat yopilmay qoladi. Ulanishlar havzasi uchun PgBouncer (DB_PGBOUNCER=1)
+os.environ['DB_CONN_MAX_AGE'] = '0'
 
 application = get_asgi_application()
@@ -0,0 +1,129 @@
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+
+logger = logging.getLogger('root.db')
+
+# Joriy so'rovning hisoblagichi. ContextVar sync_to_async oqimiga ham ko'chadi:
+# async so'rovda ulanishga event loop dan tegish shart emas
+_current_timer = ContextVar('root_db_timer', default=None)
+
+
+class QueryTimer:
+    # So'rovlar soni, umumiy vaqti va shu so'rovda yangi ulanish ochilgani
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.new_connection = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+    # connection.execute_wrappers da doimiy turadi, so'rovdan tashqarida shunchaki o'tkazadi
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def install_query_timer(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def on_connection_created(sender, connection, **kwargs):
+    install_query_timer(connection)
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.new_connection = True
+
+
+connection_created.connect(on_connection_created)
+
+
+class DatabaseMiddleware:
+    """
+    Har bir so'rov uchun SQL so'rovlar soni va vaqtini, yangi ulanish ochilganini
+    (CONN_MAX_AGE ishlayotganini tekshirish uchun) 'root.db' logiga yozadi. Server-Timing
+    sarlavhasi faqat DEBUG da yoki xodimlarga yuboriladi.
+    Admin so'rovlari tranzaksiyada, statement_timeout DB_ADMIN_STATEMENT_TIMEOUT gacha oshiriladi.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Middleware yuklanishidan oldin ochilgan ulanish uchun
+        install_query_timer(connection)
+        timer = QueryTimer()
+        token = _current_timer.set(timer)
+        try:
+            if self.is_admin(request):
+                response = self.admin_response(request, self.get_response)
+            else:
+                response = self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        user = getattr(request, 'user', None)
+        return self.report(request, response, timer, show=settings.DEBUG or getattr(user, 'is_staff', False))
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        token = _current_timer.set(timer)
+        try:
+            if self.is_admin(request):
+                # Admin view lari sinxron: tranzaksiya view bilan bir oqimda ochiladi
+                response = await sync_to_async(self.admin_response)(request, async_to_sync(self.get_response))
+            else:
+                # Oddiy async so'rov event loop dan chiqmaydi
+                response = await self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        # Foydalanuvchini yuklash bazaga murojaat: async yo'lda sarlavha faqat DEBUG da
+        return self.report(request, response, timer, show=settings.DEBUG)
+
+    def is_admin(self, request):
+        return request.path.startswith(reverse('admin:index'))
+
+    def admin_response(self, request, get_response):
+        # SET LOCAL tranzaksiya bilan tugaydi: PgBouncer transaction rejimida ham chegara
+        # boshqa klientning server ulanishiga o'tib qolmaydi
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL statement_timeout = %s', [settings.DB_ADMIN_STATEMENT_TIMEOUT])
+            return get_response(request)
+
+    def report(self, request, response, timer, show=False):
+        duration = timer.duration * 1000
+        logger.debug(
+            "%s %s: %s so'rov, %.1f ms, yangi ulanish=%s",
+            request.method, request.path, timer.count, duration, timer.new_connection,
+        )
+        if not show:
+            return response
+        entries = [f'db;dur={duration:.1f};desc="{timer.count} queries"']
+        if timer.new_connection:
+            entries.append('db-connect;desc="new connection"')
+        response.headers['Server-Timing'] = ', '.join(
+            filter(None, [response.headers.get('Server-Timing'), *entries])
+        )
+        return response
@@ -0,0 +1,44 @@
+import atexit
+import copy
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+
+class QueueStreamHandler(QueueHandler):
+    """
+    So'rov oqimi yozuvni faqat navbatga qo'yadi; stderr ga yozish alohida oqimda (QueueListener).
+    Sekin konsol yoki log yig'uvchi javob vaqtiga ta'sir qilmaydi.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.listener = QueueListener(self.queue, logging.StreamHandler(stream))
+        self.listener.start()
+        self._stopped = False
+        # Jarayon tugashida navbatdagi yozuvlar yo'qolmaydi
+        atexit.register(self.flush_queue)
+
+    def flush_queue(self):
+        # Navbatni oxirigacha yozib, listener oqimini to'xtatadi (bir marta)
+        if not self._stopped:
+            self._stopped = True
+            self.listener.stop()
+
+    def close(self):
+        self.flush_queue()
+        super().close()
+
+    def prepare(self, record):
+        # Standart prepare() self.format() ni so'rov oqimida chaqiradi. Bu yerda faqat xabar
+        # argumentlar bilan birlashtiriladi (keyin o'zgargan obyektlar yozuvni buzmasin);
+        # Formatter (vaqt, traceback) listener oqimida ishlaydi
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def setFormatter(self, fmt):
+        # Formatter listener oqimidagi handlerga beriladi: prepare() formatlamaydi
+        for handler in self.listener.handlers:
+            handler.setFormatter(fmt)
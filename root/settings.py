@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import sys
 
 from dotenv import load_dotenv
 
@@ -24,6 +25,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'django.contrib.sites',
     'django.contrib.humanize',
+    'django.contrib.postgres',
 
     # Third party apps
     # 'allauth',
@@ -43,12 +45,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'root.db.DatabaseMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'orders.middleware.CartCountCookieMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',  # Add this line
@@ -67,12 +71,19 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'books.context_processors.category_index',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'root.wsgi.application'
+ASGI_APPLICATION = 'root.asgi.application'
+
+# web — veb server (gunicorn/uvicorn/runserver), command — boshqa management buyruqlari
+DB_WORKLOAD = os.getenv("DB_WORKLOAD") or (
+    'command' if Path(sys.argv[0]).name == 'manage.py' and sys.argv[1:2] != ['runserver'] else 'web'
+)
 
 DATABASES = {
     'default': {
@@ -82,9 +93,49 @@ DATABASES = {
         'PASSWORD': os.getenv("DB_PASSWORD", "postgres"),
         'HOST': os.getenv("DB_HOST", "localhost"),
         'PORT': os.getenv("DB_PORT", "5432"),
+        # Doimiy ulanishlar: har so'rovda yangi ulanish ochilmaydi, eskirgani tekshirib almashtiriladi.
+        # Buyruqlarda (ishchi oqimlar, testlar) ulanish ochiq qolib ketmasligi uchun 0;
+        # ASGI da root/asgi.py DB_CONN_MAX_AGE=0 qiladi (ulanish so'rov oqimiga bog'liq)
+        'CONN_MAX_AGE': 0 if DB_WORKLOAD == 'command' else int(os.getenv("DB_CONN_MAX_AGE", 60)),
+        'CONN_HEALTH_CHECKS': True,
+        # PgBouncer transaction rejimida server tomon kursorlari ishlamaydi
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv("DB_PGBOUNCER", "") == "1",
+        'OPTIONS': {},
     }
 }
 
+# Ish turi bo'yicha statement_timeout (ms, 0 — cheklovsiz): veb so'rovlar qisqa,
+# admin (eksport, qidiruv) uzoqroq, management buyruqlari cheklanmaydi
+DB_STATEMENT_TIMEOUTS = {
+    'web': int(os.getenv("DB_STATEMENT_TIMEOUT", 5000)),
+    'command': int(os.getenv("DB_COMMAND_STATEMENT_TIMEOUT", 0)),
+}
+DB_ADMIN_STATEMENT_TIMEOUT = int(os.getenv("DB_ADMIN_STATEMENT_TIMEOUT", 60000))
+# Ulanish ochilganda libpq orqali o'rnatiladi: qo'shimcha so'rov yo'q
+DATABASES['default']['OPTIONS']['options'] = f"-c statement_timeout={DB_STATEMENT_TIMEOUTS[DB_WORKLOAD]}"
+
+# REDIS_URL berilsa umumiy Redis kesh, aks holda jarayon ichidagi LocMem
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv("REDIS_URL"),
+            'KEY_PREFIX': 'kitoblarda',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'kitoblarda',
+        }
+    }
+# LocMem har bir jarayonda alohida: boshqa ishchilar ko'rishi kerak bo'lgan qiymatlar
+# (uzoq TTL, versiyalar, hisoblagichlar) faqat umumiy keshda saqlanadi
+CACHE_IS_SHARED = bool(os.getenv("REDIS_URL"))
+# Umumiy kesh bo'lmaganda ishchilar orasidagi farq shu soniyadan oshmasligi uchun TTL
+LOCAL_CACHE_MAX_AGE = 60
+
 
 AUTH_PASSWORD_VALIDATORS = []
 
@@ -122,8 +173,72 @@ AUTH_USER_MODEL = 'users.CustomUser'
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
-# Cart session ID
+# Cart session ID: savat bazada (orders.ShoppingCart), sessiyada faqat mehmon savati tokeni
 CART_SESSION_ID = 'cart'
+# Savat nishonchasi uchun imzolangan cookie: sahifa uni JS bilan o'qiydi, qo'shimcha so'rov yo'q
+CART_COUNT_COOKIE = 'cart_count'
+# clear_stale_carts: shuncha kun o'zgarmagan mehmon savatlari o'chiriladi
+STALE_CART_DAYS = 30
+
+# uz → ru avtomatik tarjima (translation_worker buyrug'i bajaradi)
+TRANSLATOR_BACKEND = os.getenv("TRANSLATOR_BACKEND", "books.translator.GoogleTranslatorBackend")
+TRANSLATION_JOB_MAX_ATTEMPTS = 5
+TRANSLATION_JOB_RETRY_DELAY = 30  # soniya, har xatodan keyin ikki barobar oshadi
+TRANSLATION_JOB_MAX_RETRY_DELAY = 3600
+TRANSLATION_JOB_TIMEOUT = 600
+TRANSLATION_MEMORY_ENABLED = True
+TRANSLATION_MEMORY_LRU_SIZE = 5000
+TRANSLATION_MEMORY_MAX_AGE_DAYS = 180
+
+# Qidiruv takliflari (books:autocomplete)
+AUTOCOMPLETE_MIN_LENGTH = 2
+AUTOCOMPLETE_LIMIT = 8
+AUTOCOMPLETE_CANDIDATES = 100
+AUTOCOMPLETE_CACHE_TIMEOUT = 60
+
+# O'xshash kitoblar (books.recommendations)
+RELATED_BOOKS_LIMIT = 4
+RELATED_BOOKS_CANDIDATES = 50
+
+# Kategoriyalar va kitoblar soni (books.categories), signallar bilan yangilanadi.
+# Umumiy kesh bo'lmasa LOCAL_CACHE_MAX_AGE ishlatiladi
+CATEGORY_INDEX_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Katalog sahifalari fragmentlari (books.fragments), katalog versiyasi bilan bekor qilinadi.
+# Faqat umumiy keshda (CACHE_IS_SHARED) yoqiladi
+CATALOG_FRAGMENT_CACHE_TIMEOUT = int(os.getenv("CATALOG_FRAGMENT_CACHE_TIMEOUT", 60 * 15))
+
+# Rasm nusxalari (books.renditions): har bir o'lcham uchun srcset kengliklari
+IMAGE_RENDITIONS = {
+    'thumb': {'widths': (60, 120), 'sizes': '60px'},
+    'card': {'widths': (300, 600), 'sizes': '(min-width: 768px) 300px, 100vw'},
+    'detail': {'widths': (320, 640), 'sizes': '320px'},
+}
+IMAGE_RENDITION_FORMATS = ('webp', 'jpeg')
+IMAGE_RENDITION_QUALITY = 80
+
+# To'lov skrinshotlari (orders.screenshots): kichraytiriladi va sha256 bo'yicha saqlanadi
+PAYMENT_SCREENSHOT_MAX_SIZE = (1600, 1600)
+PAYMENT_SCREENSHOT_QUALITY = 85
+PAYMENT_SCREENSHOT_PREVIEW_SIZE = (800, 800)
+PAYMENT_SCREENSHOT_PREVIEW_QUALITY = 70
+
+# Buyurtmalar eksporti (orders.exports): server kursori bo'laklari va fon vazifasi chegarasi
+ORDER_EXPORT_CHUNK_SIZE = 2000
+ORDER_EXPORT_ASYNC_THRESHOLD = 20000
+
+# To'lov skrini shuncha daqiqada yuklanmasa buyurtma bekor qilinadi va zaxira qaytadi
+# (release_expired_orders buyrug'i)
+ORDER_PAYMENT_TIMEOUT_MINUTES = 60
+
+# Faol to'lov sozlamasi (orders.registry): umumiy kesh signal bilan tozalanadi,
+# jarayon xotirasidagi nusxa shuncha soniyadan keyin qayta tekshiriladi.
+# Umumiy kesh bo'lmasa signal faqat o'z jarayonini tozalaydi: kesh ham LOCAL_TIMEOUT yashaydi
+PAYMENT_SETTINGS_CACHE_TIMEOUT = 60 * 60 * 24
+PAYMENT_SETTINGS_LOCAL_TIMEOUT = 30
+
+# Admin ro'yxatlari: bundan katta natijalar uchun COUNT(*) o'rniga EXPLAIN bahosi
+APPROXIMATE_COUNT_THRESHOLD = 10000
 
 # Authentication settings
 AUTHENTICATION_BACKENDS = [
@@ -173,18 +288,29 @@ LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'handlers': {
+        # Yozish alohida oqimda (root.log): so'rov stderr ni kutmaydi
         'console': {
-            'class': 'logging.StreamHandler',
+            'class': 'root.log.QueueStreamHandler',
         },
     },
     'loggers': {
         'orders.cart': {
             'handlers': ['console'],
-            'level': 'DEBUG',
+            # Ishlab chiqarishda WARNING; nosozlikda CART_LOG_LEVEL=DEBUG
+            'level': os.getenv('CART_LOG_LEVEL', 'WARNING'),
+        },
+        'root.db': {
+            'handlers': ['console'],
+            # DEBUG da har bir so'rovning SQL soni va vaqti yoziladi
+            'level': os.getenv('DB_LOG_LEVEL', 'WARNING'),
         },
     },
 }
 
+# Savat hisoblagichlari (orders.metrics, cart_metrics buyrug'i): hodisalarning shu ulushi yoziladi.
+# Faqat umumiy keshda (REDIS_URL) yuritiladi
+CART_METRICS_SAMPLE_RATE = float(os.getenv('CART_METRICS_SAMPLE_RATE', '0.1'))
+
 # Internationalization settings
 LANGUAGES = (
     ('uz', 'Uzbek'),
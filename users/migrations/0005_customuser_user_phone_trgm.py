@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:44
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_book_trigram_indexes'),  # pg_trgm kengaytmasi
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0004_alter_customuser_managers'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('phone'), name='gin_trgm_ops'), name='user_phone_trgm'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db.models.functions import Upper
 from django.utils.translation import gettext_lazy as _
 from phonenumber_field.modelfields import PhoneNumberField
 
@@ -18,6 +20,10 @@ class CustomUser(AbstractUser):
     class Meta:
         verbose_name = _('User')
         verbose_name_plural = _('Users')
+        indexes = [
+            # Admin buyurtmalar qidiruvi raqam bo'lagi bo'yicha (icontains)
+            GinIndex(OpClass(Upper('phone'), name='gin_trgm_ops'), name='user_phone_trgm'),
+        ]
 
     def __str__(self):
         return str(self.phone)